@@ -0,0 +1,180 @@
+"""
+Quota-aware executor for Google API calls.
+
+Every Sheets / Drive request goes through ApiExecutor, which
+- limits the request rate with a token bucket sized to the per-user Sheets
+  quota (60 requests / minute by default),
+- retries 429 and 5xx responses (and dropped connections) with exponential
+  backoff and full jitter, honouring Retry-After when the server sends it;
+  requests marked non-idempotent (appends, batches that add sheets,
+  charts, rules, named ranges or metadata) are retried on 429 only,
+  since after a 5xx or a lost connection the server may already have
+  applied them,
+- runs independent requests concurrently on a thread pool,
+- reports each executed request to an optional tracer (see tracing.py).
+
+googleapiclient service objects share one httplib2.Http, which is not
+thread-safe, so concurrent calls need an http_factory that builds one
+authorized Http per worker thread (see authorized_http_factory).
+Clock, sleep and random source are injectable so the executor can be
+exercised against a local fake service without real waiting (see
+fake_google.FakeGoogle.fail and selfcheck).
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SHEETS_REQUESTS_PER_MINUTE = 60
+BURST = 10
+MAX_WORKERS = 4
+MAX_RETRIES = 6
+BASE_DELAY = 1.0          # seconds
+MAX_DELAY = 64.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Rejected before processing: the only failure safe to retry for any request
+RATE_LIMITED = 429
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `capacity`."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+
+def retry_status(error, idempotent=True):
+    """
+    HTTP status worth retrying, 0 for a dropped connection, None otherwise.
+    Non-idempotent requests are only worth retrying on 429.
+    """
+    resp = getattr(error, "resp", None)
+    if resp is not None:
+        status = int(getattr(resp, "status", 0) or 0)
+        if not idempotent:
+            return status if status == RATE_LIMITED else None
+        return status if status in RETRY_STATUSES else None
+    if isinstance(error, OSError) and idempotent:
+        return 0
+    return None
+
+def authorized_http_factory(creds):
+    """Builds one AuthorizedHttp per call, for per-thread use by the executor."""
+    import google_auth_httplib2
+    import httplib2
+
+    def factory():
+        return google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+    return factory
+
+
+class ApiExecutor:
+
+    def __init__(self, requests_per_minute=SHEETS_REQUESTS_PER_MINUTE, burst=BURST,
+                 max_workers=MAX_WORKERS, max_retries=MAX_RETRIES, base_delay=BASE_DELAY,
+                 max_delay=MAX_DELAY, http_factory=None, tracer=None,
+                 clock=time.monotonic, sleep=time.sleep, rng=random.random):
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst, clock, sleep)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.http_factory = http_factory
+        self.tracer = tracer
+        self.sleep = sleep
+        self.rng = rng
+        self.retries = 0
+        self._local = threading.local()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _http(self):
+        if self.http_factory is None:
+            return None
+        if not hasattr(self._local, "http"):
+            self._local.http = self.http_factory()
+        return self._local.http
+
+    def _backoff(self, attempt, error):
+        retry_after = None
+        resp = getattr(error, "resp", None)
+        if resp is not None and hasattr(resp, "get"):
+            retry_after = resp.get("retry-after")
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.rng() * min(self.max_delay, self.base_delay * 2 ** attempt)
+
+    def run(self, call, rate_limited=True, idempotent=True):
+        """
+        Runs call(http) with rate limiting and retries. `http` is this
+        thread's authorized Http, or None to use the service's own.
+        idempotent=False limits retries to 429 (see retry_status).
+        """
+        attempt = 0
+        while True:
+            if rate_limited:
+                self.bucket.acquire()
+            try:
+                self._local.attempts = attempt
+                return call(self._http())
+            except Exception as e:
+                if retry_status(e, idempotent) is None or attempt >= self.max_retries:
+                    raise
+                self.retries += 1
+                self.sleep(self._backoff(attempt, e))
+                attempt += 1
+
+    def execute(self, request, idempotent=True):
+        """request.execute() through the rate limiter and retry policy."""
+        def call(http):
+            return request.execute(http=http) if http is not None else request.execute()
+        if self.tracer is None:
+            return self.run(call, idempotent=idempotent)
+
+        start = time.perf_counter()
+        response = error = None
+        try:
+            response = self.run(call, idempotent=idempotent)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.tracer.record_call(request, (time.perf_counter() - start) * 1000, response,
+                                    getattr(self._local, "attempts", 0), error)
+
+    def submit(self, request):
+        """Schedules request on the thread pool and returns a Future."""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix="sheets-api")
+        return self._pool.submit(self.execute, request)
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
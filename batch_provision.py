@@ -0,0 +1,169 @@
+"""
+Batch mode: provision or sync many households in one run.
+
+The manifest is a JSON list with one entry per household:
+
+    [
+      {"household": "krishnan", "db": "krishnan.db",
+       "sheet_name": "Krishnan Expenses", "folder_id": "1AbC..."},
+      {"household": "arasan", "db": "arasan.db", "spreadsheet_id": "1XyZ..."}
+    ]
+
+An entry with a spreadsheet_id is synced into that sheet (the mode
+options then name how the sheet was published, so its snapshot KPIs,
+engine budget table, flags and rollup summaries are refreshed); the others
+are published (or upserted) as sheet_name in folder_id, defaulting to the
+tracker's GOOGLE_SHEET_NAME / DRIVE_FOLDER_ID. Relative db paths are
+resolved against the manifest's directory.
+
+Households run concurrently on a thread pool: the work is waiting on the
+network, and threads can share what is expensive to set up – one set of
+credentials, one Drive / Sheets service pair and one ApiExecutor, whose
+token bucket caps the request rate of the whole batch (the per-user
+quota is shared by every household) and which gives each thread its own
+authorized Http. One household failing does not stop the others; each
+gets a row in the report with its outcome and latency.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+import api_executor
+import final_expense_tracker_query_based as tracker
+
+DEFAULT_WORKERS = 8
+
+MANIFEST_KEYS = {"household", "db", "sheet_name", "folder_id", "spreadsheet_id"}
+
+REPORT_COLUMNS = ["household", "mode", "status", "outcome", "spreadsheet_id",
+                  "expenses", "rejected", "ms", "error"]
+
+
+def load_manifest(path):
+    """Manifest entries, with db paths made absolute. Raises ValueError if malformed."""
+    with open(path) as f:
+        households = json.load(f)
+    if not isinstance(households, list):
+        raise ValueError(f"{path}: expected a list of households")
+
+    base = os.path.dirname(os.path.abspath(path))
+    seen = set()
+    for i, household in enumerate(households, start=1):
+        if not isinstance(household, dict) or not household.get("household") or not household.get("db"):
+            raise ValueError(f"{path}: entry {i} needs a household and a db")
+        unknown = set(household) - MANIFEST_KEYS
+        if unknown:
+            raise ValueError(f"{path}: entry {i} has unknown keys {sorted(unknown)}")
+        if household["household"] in seen:
+            raise ValueError(f"{path}: household {household['household']!r} listed twice")
+        seen.add(household["household"])
+        household["db"] = os.path.join(base, household["db"])
+    return households
+
+def provision_household(household, drive, sheets, options):
+    """
+    Publishes / upserts / syncs one household with the shared services.
+    Returns its report row; errors are reported, not raised.
+    """
+    spreadsheet_id = household.get("spreadsheet_id")
+    mode = "sync" if spreadsheet_id else ("upsert" if options.get("upsert") else "publish")
+    row = {"household": household["household"], "mode": mode, "status": "ok", "outcome": "",
+           "spreadsheet_id": spreadsheet_id or "", "expenses": 0, "rejected": 0,
+           "ms": 0.0, "error": ""}
+    start = time.perf_counter()
+    try:
+        # A missing ledger would otherwise be seeded with test data and published
+        if not os.path.exists(household["db"]):
+            raise FileNotFoundError(f"ledger not found: {household['db']}")
+
+        tables, reference, rejects = tracker.prepare_tables(household["db"],
+                                                            options.get("validate", True))
+        row["expenses"], row["rejected"] = len(tables[0]), len(rejects)
+        if len(rejects) and options.get("rejects_dir"):
+            rejects.to_csv(os.path.join(options["rejects_dir"],
+                                        f"{household['household']}.rejects.csv"), index=False)
+
+        if spreadsheet_id:
+            added, updated, months = tracker.sync_spreadsheet(
+                sheets, spreadsheet_id, tables[0], options.get("monthly_sheets", False),
+                options.get("precomputed_flags", False),
+                rollup_summaries=options.get("rollup_summaries", False),
+                snapshot_kpis=options.get("snapshot_kpis", False),
+                budget=tables[4] if options.get("use_budget_engine") else None
+            )
+            row["outcome"] = f"{added} new, {updated} changed"
+            if months:
+                row["outcome"] += f", {len(months)} monthly sheets"
+        else:
+            layout = {"snapshot_kpis": options.get("snapshot_kpis", False),
+                      "use_budget_engine": options.get("use_budget_engine", False),
+                      "monthly_sheets": options.get("monthly_sheets", False),
+                      "reference": reference,
+                      "precomputed_flags": options.get("precomputed_flags", False),
+                      "rollup_summaries": options.get("rollup_summaries", False)}
+            target = tracker.destination(household.get("sheet_name"), household.get("folder_id"))
+            row["spreadsheet_id"], row["outcome"] = tracker.publish(
+                drive, sheets, tables, options.get("chunk_size", tracker.UPLOAD_CHUNK_SIZE),
+                layout, upsert=options.get("upsert", False), target=target
+            )
+    except Exception as e:
+        row["status"] = "failed"
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["ms"] = (time.perf_counter() - start) * 1000
+    return row
+
+def run_batch(households, workers=DEFAULT_WORKERS, requests_per_minute=None, **options):
+    """
+    Runs every household on a pool of `workers` threads and returns the
+    report rows in manifest order. options: upsert, validate, rejects_dir,
+    chunk_size, snapshot_kpis, use_budget_engine, monthly_sheets,
+    precomputed_flags, rollup_summaries.
+    """
+    # One executor for the whole batch: its token bucket is the global cap
+    drive, sheets = tracker.connect(requests_per_minute or api_executor.SHEETS_REQUESTS_PER_MINUTE)
+    if options.get("rejects_dir"):
+        os.makedirs(options["rejects_dir"], exist_ok=True)
+
+    rows = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="household") as pool:
+        futures = {
+            pool.submit(provision_household, household, drive, sheets, options): i
+            for i, household in enumerate(households)
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            row = rows[futures[future]] = future.result()
+            print(f"[{done}/{len(households)}] {row['household']}: {row['status']} "
+                  f"{row['outcome'] or row['error']} ({row['ms'] / 1000:.1f} s)")
+    return [rows[i] for i in range(len(households))]
+
+def report_frame(rows):
+    return pd.DataFrame(rows, columns=REPORT_COLUMNS)
+
+def format_report(rows):
+    """Per-household table plus totals and latency percentiles."""
+    report = report_frame(rows)
+    if report.empty:
+        return "no households"
+    shown = report.assign(ms=report["ms"].round(0).astype(int))
+    lines = [shown.drop(columns=["error"]).to_string(index=False)]
+
+    failed = report[report["status"] != "ok"]
+    for row in failed.itertuples(index=False):
+        lines.append(f"FAILED {row.household}: {row.error}")
+    ms = report["ms"]
+    lines.append(f"{len(report) - len(failed)} ok, {len(failed)} failed; latency "
+                 f"p50 {ms.quantile(0.5) / 1000:.1f} s, p95 {ms.quantile(0.95) / 1000:.1f} s, "
+                 f"max {ms.max() / 1000:.1f} s")
+    return "\n".join(lines)
+
+def write_report(rows, path):
+    """Writes the report as CSV, or JSON for a .json path."""
+    report = report_frame(rows)
+    if path.endswith(".json"):
+        report.to_json(path, orient="records", indent=2)
+    else:
+        report.to_csv(path, index=False)
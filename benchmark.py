@@ -0,0 +1,198 @@
+"""
+Offline benchmarks for the tracker.
+
+Runs against a seeded synthetic ledger (synthetic_ledger) and the
+recording fake Google services (fake_google), so no credentials or
+network are needed and results are comparable between runs:
+
+    python expense_cli.py bench --rows 1000 10000 100000 1000000
+    python expense_cli.py bench --rows 10000 --json bench.json
+
+Benchmarks
+- export_excel      workbook build time and size
+- export_stream     streaming (write-only) export from the ledger, with peak memory
+- publish           main() end to end: ledger load, export, upload, one
+                    RequestPlan; round trips, bytes sent, simulated latency
+- publish_all       publish with --snapshot-kpis --monthly-sheets --budget-engine
+- publish_flags     publish with --precomputed-flags
+- publish_rollup    publish with --rollup-summaries --monthly-sheets
+- upsert_noop       publish --upsert when nothing changed since the last publish
+- read_back         paged batchGet of the published Expenses into a typed frame
+- kpi_snapshot / budget_engine / month_totals / rollup_cube   local aggregations
+"""
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+import budget_engine
+import expense_schema
+import fake_google
+import final_expense_tracker_query_based as tracker
+import ledger_store
+import rollup_cube
+import sheet_reader
+import synthetic_ledger
+
+DEFAULT_ROWS = [1000, 10000]
+
+
+def best_of(fn, repeat):
+    """(best wall time in ms, last result) over `repeat` runs."""
+    times, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000, result
+
+def seeded_store(path, tables):
+    with ledger_store.LedgerStore(path) as store:
+        store.import_tables(*tables)
+
+def bench_export_excel(tables, repeat):
+    ms, workbook = best_of(lambda: tracker.export_excel_buffer(*tables), repeat)
+    return {"ms": ms, "workbook_bytes": workbook.getbuffer().nbytes}
+
+def bench_export_streaming(db_path, tmp, repeat):
+    """
+    export_excel_streaming straight from the ledger's chunk iterator to a
+    file; peak_kib (one extra run under tracemalloc) should not grow with rows.
+    """
+    path = os.path.join(tmp, "stream.xlsx")
+
+    def run():
+        with ledger_store.LedgerStore(db_path) as store:
+            reference = [store.load_reference(title) for title in tracker.REFERENCE_SHEETS]
+            tracker.export_excel_streaming(store.iter_expenses(), *reference, target=path)
+
+    ms, _ = best_of(run, repeat)
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"ms": ms, "workbook_bytes": os.path.getsize(path), "peak_kib": peak / 1024}
+
+def bench_publish(db_path, repeat, **options):
+    fake = fake_google.FakeGoogle()
+
+    def run():
+        fake.reset()
+        with fake.installed(tracker), contextlib.redirect_stdout(io.StringIO()):
+            tracker.main(db_path=db_path, **options)
+        return fake.summary()
+
+    ms, summary = best_of(run, repeat)
+    return {"ms": ms, **summary}
+
+def bench_upsert_noop(db_path, state_dir):
+    """Second of two --upsert publishes of the same ledger."""
+    fake = fake_google.FakeGoogle()
+    saved, tracker.PUBLISH_STATE_FILE = (tracker.PUBLISH_STATE_FILE,
+                                         os.path.join(state_dir, "publish_state.json"))
+    try:
+        with fake.installed(tracker), contextlib.redirect_stdout(io.StringIO()):
+            tracker.main(db_path=db_path, upsert=True)
+            fake.reset()
+            # A real no-op run starts in a new process with nothing cached
+            tracker.invalidate_sheet_metadata()
+            start = time.perf_counter()
+            tracker.main(db_path=db_path, upsert=True)
+            ms = (time.perf_counter() - start) * 1000
+    finally:
+        tracker.PUBLISH_STATE_FILE = saved
+    return {"ms": ms, **fake.summary()}
+
+def bench_read_back(tables, repeat):
+    """sheet_reader.read_back of a fake spreadsheet holding the ledger."""
+    fake = fake_google.FakeGoogle()
+    spreadsheet_id = fake._files_create({})["id"]
+    expenses = tables[0]
+    serial = (pd.to_datetime(expenses["Date"]) - pd.Timestamp(expense_schema.SHEETS_EPOCH)).dt.days
+    fake.load_grid(spreadsheet_id, "Expenses", [list(expenses.columns)]
+                   + expenses.assign(Date=serial).astype(object).values.tolist())
+    for title, frame in zip(tracker.REFERENCE_SHEETS, tables[1:]):
+        fake.load_grid(spreadsheet_id, title, [list(frame.columns)]
+                       + frame.astype(object).values.tolist())
+
+    def run():
+        fake.reset()
+        with fake.installed(tracker):
+            typed, _ = sheet_reader.read_back(fake.service(), spreadsheet_id)
+        return len(typed), fake.summary()
+
+    ms, (rows, summary) = best_of(run, repeat)
+    return {"ms": ms, "rows": rows, **summary}
+
+def bench_aggregations(db_path, tables, repeat):
+    expenses, budget = tables[0], tables[4]
+    results = {}
+
+    ms, _ = best_of(lambda: tracker.compute_kpi_snapshot(expenses), repeat)
+    results["kpi_snapshot"] = {"ms": ms}
+
+    ms, table = best_of(
+        lambda: budget_engine.BudgetEngine.from_expenses(expenses).variance_table(budget), repeat
+    )
+    results["budget_engine"] = {"ms": ms, "rows": len(table)}
+
+    with ledger_store.LedgerStore(db_path) as store:
+        months = store.months()
+        ms, _ = best_of(lambda: [store.month_totals(m) for m in months], repeat)
+    results["month_totals"] = {"ms": ms, "months": len(months)}
+
+    # Cube built once, then every month summary as range queries on it
+    ms, cube = best_of(lambda: rollup_cube.RollupCube.from_expenses(expenses), repeat)
+    query_ms, _ = best_of(lambda: [cube.month_summary(m) for m in cube.months()], repeat)
+    results["rollup_cube"] = {"ms": ms, "query_ms": query_ms, "series": len(cube.totals)}
+    return results
+
+def run(rows_list=DEFAULT_ROWS, seed=0, repeat=3):
+    """Runs every benchmark for each ledger size; returns {rows: {name: metrics}}."""
+    results = {}
+    for rows in rows_list:
+        tables = synthetic_ledger.generate(rows, seed)
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "bench.db")
+            seeded_store(db_path, tables)
+            results[rows] = {
+                "export_excel": bench_export_excel(tables, repeat),
+                "export_stream": bench_export_streaming(db_path, tmp, repeat),
+                "publish": bench_publish(db_path, 1),
+                "publish_all": bench_publish(db_path, 1, snapshot_kpis=True,
+                                             monthly_sheets=True, use_budget_engine=True),
+                "publish_flags": bench_publish(db_path, 1, precomputed_flags=True),
+                "publish_rollup": bench_publish(db_path, 1, rollup_summaries=True,
+                                                monthly_sheets=True),
+                "upsert_noop": bench_upsert_noop(db_path, tmp),
+                "read_back": bench_read_back(tables, repeat),
+                **bench_aggregations(db_path, tables, repeat),
+            }
+    return results
+
+def format_results(results):
+    lines = [f"{'rows':>8}  {'benchmark':<14} {'ms':>10}  details"]
+    for rows, benches in results.items():
+        for name, metrics in benches.items():
+            details = ", ".join(
+                f"{k}={v:,.0f}" if isinstance(v, (int, float)) else f"{k}={v}"
+                for k, v in metrics.items() if k != "ms" and not isinstance(v, dict)
+            )
+            lines.append(f"{rows:>8,}  {name:<14} {metrics['ms']:>10,.1f}  {details}")
+    return "\n".join(lines)
+
+def main(rows_list=DEFAULT_ROWS, seed=0, repeat=3, json_path=None):
+    results = run(rows_list, seed, repeat)
+    print(format_results(results))
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    return results
@@ -0,0 +1,81 @@
+"""
+Budget-vs-actual engine.
+
+Keeps actual totals in a dict keyed by (Month, Category), in integer
+paise, filled from the ledger with one group-by (from_expenses;
+add_expenses folds in further batches). variance_table() joins the totals
+with Monthly_Budget for every month at once. The Dashboard then receives
+plain values instead of the LOOKUP(2,1/...) / VLOOKUP formulas, which only
+covered the latest month.
+"""
+
+from collections import defaultdict
+
+import pandas as pd
+
+import expense_schema
+
+VARIANCE_COLUMNS = ["Month", "Category", "Budget", "Actual", "Variance"]
+
+
+class BudgetEngine:
+
+    def __init__(self):
+        self.actuals = defaultdict(int)     # (month, category) -> paise
+
+    # ----- updates -----
+    def add(self, month, category, paise):
+        self.actuals[(month, category)] += paise
+
+    def add_expenses(self, expenses):
+        """Folds a batch of expenses (sheet layout) into the running totals."""
+        typed = expense_schema.to_typed(expenses)
+        grouped = (
+            pd.DataFrame({
+                "month": expense_schema.month_of(typed),
+                "category": typed["Category"].astype(object),
+                "paise": typed[expense_schema.AMOUNT_PAISE],
+            })
+            .dropna(subset=["month", "paise"])
+            .groupby(["month", "category"], sort=False)["paise"].sum()
+        )
+        for (month, category), paise in grouped.items():
+            self.add(month, category, int(paise))
+        return self
+
+    @classmethod
+    def from_expenses(cls, expenses):
+        return cls().add_expenses(expenses)
+
+    # ----- queries -----
+    def variance_table(self, budget):
+        """
+        Budget vs Actual for every month: one row per budgeted (Month,
+        Category), plus actual spend that has no budget (Budget 0).
+        Variance = Budget - Actual, so a negative value is an overrun.
+        """
+        # Blank budget cells (a nullable REAL in the ledger) are no budget
+        paise = expense_schema.to_paise(budget["Budget Amount"])
+        totals = (
+            pd.DataFrame({"month": budget["Month"], "category": budget["Category"], "paise": paise})
+            [paise.notna().to_numpy()]
+            .groupby(["month", "category"], sort=False, dropna=False)["paise"].sum()
+        )
+        budgets = {key: int(total) for key, total in totals.items()}
+
+        rows = []
+        for key in budgets.keys() | self.actuals.keys():
+            planned = budgets.get(key, 0)
+            spent = self.actuals.get(key, 0)
+            rows.append((*key, planned / 100, spent / 100, (planned - spent) / 100))
+
+        table = pd.DataFrame(rows, columns=VARIANCE_COLUMNS)
+        if table.empty:
+            return table
+        order = pd.to_datetime(table["Month"], format=expense_schema.MONTH_FORMAT, errors="coerce")
+        return (
+            table.assign(_order=order)
+            .sort_values(["_order", "Category"], na_position="last")
+            .drop(columns="_order")
+            .reset_index(drop=True)
+        )
@@ -0,0 +1,122 @@
+"""
+Duplicate detection for incoming expenses.
+
+Exact mode: every row gets a stable 64-bit content hash of
+Date | Amount (paise) | Account | normalized Description. The ledger keeps
+these hashes, so a new row is checked with one set lookup.
+
+Fuzzy mode: rows with the same Account and Amount whose dates fall within
+a small window and whose descriptions are similar are treated as the same
+expense. Candidates are found by sorting once: a new row is compared with
+every row of its (Account, Amount) group inside its date window, never
+with the whole ledger.
+"""
+
+import difflib
+
+import numpy as np
+import pandas as pd
+
+import expense_schema
+
+FUZZY_WINDOW_DAYS = 3
+FUZZY_SIMILARITY = 0.8
+
+
+def normalize_description(descriptions):
+    """Lower-case, drop reference numbers / punctuation, collapse spaces."""
+    return (
+        descriptions.fillna("").astype(str).str.lower()
+        .str.replace(r"\d{6,}", " ", regex=True)
+        .str.replace(r"[^a-z0-9]+", " ", regex=True)
+        .str.strip()
+    )
+
+def _hash_frame(expenses):
+    return pd.DataFrame({
+        "date": expense_schema.parse_dates(expenses["Date"]).dt.strftime("%Y-%m-%d").fillna(""),
+        "paise": expense_schema.to_paise(expenses["Amount"]).astype("Int64").astype(str),
+        "account": expenses["Account"].fillna("").astype(str).str.strip().str.lower(),
+        "description": normalize_description(expenses["Description"]),
+    }, index=expenses.index)
+
+def row_hashes(expenses):
+    """Stable signed 64-bit content hash per row (SQLite INTEGER friendly)."""
+    if expenses.empty:
+        return pd.Series([], dtype="int64", index=expenses.index)
+    hashed = pd.util.hash_pandas_object(_hash_frame(expenses), index=False)
+    return pd.Series(hashed.values.view(np.int64), index=expenses.index)
+
+
+class DedupIndex:
+    """
+    Persistent hash set backed by the ledger store's content_hash column.
+    Loaded once; every check afterwards is an O(1) set lookup.
+    """
+
+    def __init__(self, store, fuzzy=False, window_days=FUZZY_WINDOW_DAYS,
+                 similarity=FUZZY_SIMILARITY):
+        self.store = store
+        self.fuzzy = fuzzy
+        self.window = pd.Timedelta(days=window_days)
+        self.similarity = similarity
+        self.hashes = store.content_hashes()
+
+    def filter(self, expenses):
+        """
+        Splits a chunk into (new_rows, duplicates). Repeats inside the chunk
+        count as duplicates too. Accepted rows are added to the hash set.
+        """
+        hashes = row_hashes(expenses)
+        seen = hashes.isin(self.hashes) | hashes.duplicated()
+        if self.fuzzy:
+            seen |= self._near_duplicates(expenses[~seen]).reindex(seen.index, fill_value=False)
+        self.hashes.update(hashes[~seen].tolist())
+        return expenses[~seen], expenses[seen]
+
+    def _near_duplicates(self, expenses):
+        flags = pd.Series(False, index=expenses.index)
+        dates = expense_schema.parse_dates(expenses["Date"])
+        if dates.isna().all():
+            return flags
+
+        existing = self.store.load_expenses_between(
+            (dates.min() - self.window).strftime("%Y-%m-%d"),
+            (dates.max() + self.window).strftime("%Y-%m-%d")
+        )
+        existing = existing.assign(is_new=False, row=None)
+        incoming = expenses.assign(is_new=True, row=expenses.index)
+        candidates = pd.concat([existing, incoming], ignore_index=True)
+
+        candidates["date"] = expense_schema.parse_dates(candidates["Date"])
+        candidates["paise"] = expense_schema.to_paise(candidates["Amount"])
+        candidates["account"] = candidates["Account"].fillna("").astype(str).str.strip().str.lower()
+        candidates["description"] = normalize_description(candidates["Description"])
+        candidates = candidates.dropna(subset=["date", "paise"]).sort_values(
+            ["account", "paise", "date", "is_new"], kind="mergesort"
+        ).reset_index(drop=True)
+        if candidates.empty:
+            return flags
+
+        # Sorted by (account, paise, date), each group's rows inside a new
+        # row's date window are one contiguous slice, found by binary search
+        # on a (group, day) key. A new row is compared with every row in its
+        # slice that is already in the ledger or came before it in the chunk.
+        group = candidates.groupby(["account", "paise"], sort=False).ngroup().to_numpy(np.int64)
+        day = candidates["date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+        key = group * (1 << 32) + (day - day.min())
+        window = self.window // pd.Timedelta(days=1)
+        lo = np.searchsorted(key, key - window, side="left")
+        hi = np.searchsorted(key, key + window, side="right")
+
+        is_new = candidates["is_new"].to_numpy(dtype=bool)
+        descriptions = candidates["description"].tolist()
+        for i in np.flatnonzero(is_new):
+            for j in range(lo[i], hi[i]):
+                if j == i or (is_new[j] and j > i):
+                    continue
+                ratio = difflib.SequenceMatcher(None, descriptions[i], descriptions[j]).ratio()
+                if ratio >= self.similarity:
+                    flags.at[candidates.at[i, "row"]] = True
+                    break
+        return flags
@@ -0,0 +1,328 @@
+"""
+Startup-optimized command line for the Family Expense Tracker.
+
+Only argparse / sqlite3 are imported up front; every subcommand imports
+the heavy modules (pandas, googleapiclient, google_auth_oauthlib) it
+actually needs. Offline commands such as `report` therefore never pay for
+them, which matters when the tool runs from cron or shell hooks.
+
+    python expense_cli.py                      # publish (default)
+    python expense_cli.py publish --upsert     # update the existing sheet in place
+    python expense_cli.py sync SPREADSHEET_ID
+    python expense_cli.py batch households.json --upsert --workers 8
+    python expense_cli.py pull SPREADSHEET_ID --out live.csv
+    python expense_cli.py import sbi.csv --account SBI --paid-by Chandru
+    python expense_cli.py report Jan-2026
+    python expense_cli.py startup-check
+    python expense_cli.py bench --rows 1000 10000
+    python expense_cli.py self-check
+
+`startup-check` measures cold import time of each entry path in a fresh
+interpreter and fails if any exceeds STARTUP_BUDGET_MS (time on top of a
+bare `python -c pass`).
+"""
+
+import argparse
+import sys
+
+DEFAULT_DB = "expenses.db"              # same as ledger_store.DEFAULT_DB
+DEFAULT_CHUNK_KB = 5 * 1024             # same as UPLOAD_CHUNK_SIZE
+DEFAULT_BENCH_ROWS = [1000, 10000]      # same as benchmark.DEFAULT_ROWS
+DEFAULT_BATCH_WORKERS = 8               # same as batch_provision.DEFAULT_WORKERS
+DEFAULT_PAGE_ROWS = 20000               # same as sheet_reader.PAGE_ROWS
+
+# Extra cold-start time allowed per entry path, in milliseconds
+STARTUP_BUDGET_MS = {
+    "expense_cli": 40,                  # argument parsing only
+    "ledger_store": 60,                 # offline `report`
+    "final_expense_tracker_query_based": 900,   # publish / sync (pandas + ledger)
+}
+
+
+def make_tracer(args):
+    """tracing.Tracer when --trace / --profile / --trace-memory was given, else None."""
+    if not (args.trace or args.profile or args.trace_memory):
+        return None
+    import tracing
+    return tracing.Tracer(profile=bool(args.profile), memory=args.trace_memory)
+
+def report_trace(tracer, args):
+    if tracer is None:
+        return
+    tracer.close()
+    print(tracer.summary())
+    if args.trace:
+        tracer.to_json(args.trace)
+    if args.profile:
+        tracer.dump_profile(args.profile)
+
+def cmd_publish(args):
+    import final_expense_tracker_query_based as tracker
+    tracer = make_tracer(args)
+    try:
+        tracker.main(chunk_size=args.chunk_size_kb * 1024, snapshot_kpis=args.snapshot_kpis,
+                     db_path=args.db, monthly_sheets=args.monthly_sheets,
+                     use_budget_engine=args.budget_engine, tracer=tracer, upsert=args.upsert,
+                     validate=args.validate, rejects_path=args.rejects,
+                     precomputed_flags=args.precomputed_flags,
+                     rollup_summaries=args.rollup_summaries)
+    finally:
+        report_trace(tracer, args)
+
+def cmd_sync(args):
+    import final_expense_tracker_query_based as tracker
+    tracer = make_tracer(args)
+    try:
+        tracker.main(sync_spreadsheet_id=args.spreadsheet_id, db_path=args.db,
+                     monthly_sheets=args.monthly_sheets, snapshot_kpis=args.snapshot_kpis,
+                     use_budget_engine=args.budget_engine, tracer=tracer,
+                     validate=args.validate, rejects_path=args.rejects,
+                     precomputed_flags=args.precomputed_flags,
+                     rollup_summaries=args.rollup_summaries)
+    finally:
+        report_trace(tracer, args)
+
+def cmd_batch(args):
+    import time
+    import batch_provision
+    households = batch_provision.load_manifest(args.manifest)
+    start = time.perf_counter()
+    rows = batch_provision.run_batch(
+        households, workers=args.workers, requests_per_minute=args.requests_per_minute,
+        upsert=args.upsert, validate=args.validate, rejects_dir=args.rejects_dir,
+        chunk_size=args.chunk_size_kb * 1024, snapshot_kpis=args.snapshot_kpis,
+        use_budget_engine=args.budget_engine, monthly_sheets=args.monthly_sheets,
+        precomputed_flags=args.precomputed_flags, rollup_summaries=args.rollup_summaries
+    )
+    print(batch_provision.format_report(rows))
+    print(f"{len(rows)} households in {time.perf_counter() - start:.1f} s")
+    if args.report:
+        batch_provision.write_report(rows, args.report)
+    if any(row["status"] != "ok" for row in rows):
+        sys.exit(1)
+
+def cmd_pull(args):
+    import time
+    import expense_schema
+    import final_expense_tracker_query_based as tracker
+    import sheet_reader
+    _, sheets = tracker.connect()
+    start = time.perf_counter()
+    expenses, reference = sheet_reader.read_back(sheets, args.spreadsheet_id,
+                                                 page_rows=args.page_rows)
+    elapsed = time.perf_counter() - start
+    dates = expenses["Date"].dropna()
+    span = f" ({dates.min():%Y-%m-%d} .. {dates.max():%Y-%m-%d})" if len(dates) else ""
+    print(f"PULLED: {len(expenses)} expenses{span}, "
+          + ", ".join(f"{len(frame)} {title}" for title, frame in reference.items())
+          + f" in {elapsed:.1f} s")
+    if args.out:
+        # .pkl keeps the typed schema; anything else is CSV in the sheet layout
+        if args.out.endswith(".pkl"):
+            expenses.to_pickle(args.out)
+        else:
+            expense_schema.to_sheet_layout(expenses).to_csv(args.out)
+        print(f"  saved: {args.out}")
+
+def cmd_import(args):
+    import ledger_store
+    import statement_importer
+
+    with ledger_store.LedgerStore(args.db) as store:
+        mode = statement_importer.register_account(store, args.account)
+        if mode is not None:
+            print(f"ADDED ACCOUNT: {args.account} ({mode or 'no payment mode'}) to Payment_Modes")
+        rejects = []
+        count, skipped, rejected = statement_importer.import_statement(
+            store, args.file, args.account, args.paid_by, fuzzy=args.fuzzy_dedup,
+            rejects=rejects
+        )
+    print(f"IMPORTED: {count} expenses from {args.file} ({skipped} duplicates skipped)")
+    if rejects:
+        import pandas as pd
+
+        import expense_validation
+        expense_validation.print_report(pd.concat(rejects, ignore_index=True), args.rejects)
+
+def cmd_report(args):
+    import ledger_store
+
+    with ledger_store.LedgerStore(args.db) as store:
+        rows = store.month_totals(args.month)
+    if not rows:
+        print(f"No expenses for {args.month}")
+        return
+    width = max(len(str(c or "")) for c, _ in rows + [("Category", 0)])
+    print(f"{'Category':<{width}}  {'Total Amount':>14}")
+    for category, paise in rows:
+        print(f"{str(category or ''):<{width}}  {(paise or 0) / 100:>14,.2f}")
+    print(f"{'TOTAL':<{width}}  {sum(p or 0 for _, p in rows) / 100:>14,.2f}")
+
+def measure_import_ms(module, runs=5):
+    """Best-of-N cold import time of `module` in a fresh interpreter, minus bare startup."""
+    import os
+    import subprocess
+    import time
+
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def best(code):
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], check=True, cwd=here)
+            times.append(time.perf_counter() - start)
+        return min(times) * 1000
+
+    return best(f"import {module}") - best("pass")
+
+def cmd_startup_check(args):
+    over = 0
+    for module, budget in STARTUP_BUDGET_MS.items():
+        ms = measure_import_ms(module, args.runs)
+        status = "ok" if ms <= budget else "OVER"
+        over += status == "OVER"
+        print(f"{module:<36} {ms:7.1f} ms  (budget {budget} ms)  {status}")
+    if over:
+        sys.exit(1)
+
+def cmd_bench(args):
+    import benchmark
+    benchmark.main(args.rows, seed=args.seed, repeat=args.repeat, json_path=args.json)
+
+def cmd_self_check(args):
+    import selfcheck
+    if not selfcheck.main(args.checks):
+        sys.exit(1)
+
+def chunk_size_kb(value):
+    """argparse type: Drive resumable chunks must be a positive multiple of 256 KiB."""
+    size = int(value)
+    if size <= 0 or size % 256:
+        raise argparse.ArgumentTypeError(f"{value} is not a positive multiple of 256")
+    return size
+
+def add_validation_arguments(parser):
+    parser.add_argument("--no-validate", dest="validate", action="store_false",
+                        help="publish every ledger row, even ones that fail validation")
+    parser.add_argument("--rejects", metavar="CSV", help="write rows that failed validation here")
+
+def add_trace_arguments(parser):
+    parser.add_argument("--trace", metavar="JSON",
+                        help="time every step and API call; print a summary and save it as JSON")
+    parser.add_argument("--profile", metavar="PROF",
+                        help="cProfile the local (pandas) steps and save the stats here")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also record peak memory per step (tracemalloc)")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Family Expense Tracker")
+    parser.add_argument("--db", default=DEFAULT_DB, help="local SQLite ledger (source of truth)")
+    parser.set_defaults(func=cmd_publish, chunk_size_kb=DEFAULT_CHUNK_KB, snapshot_kpis=False,
+                        monthly_sheets=False, budget_engine=False, upsert=False,
+                        trace=None, profile=None, trace_memory=False,
+                        validate=True, rejects=None, precomputed_flags=False,
+                        rollup_summaries=False)
+    sub = parser.add_subparsers(dest="command")
+
+    publish = sub.add_parser("publish", help="build a new Google Sheet from the ledger (default)")
+    publish.add_argument("--chunk-size-kb", type=chunk_size_kb, default=DEFAULT_CHUNK_KB,
+                         help="resumable upload chunk size (multiple of 256)")
+    publish.add_argument("--snapshot-kpis", action="store_true",
+                         help="write KPI cards as precomputed values instead of formulas")
+    publish.add_argument("--monthly-sheets", action="store_true",
+                         help="add a QUERY summary tab for every month in the ledger")
+    publish.add_argument("--budget-engine", action="store_true",
+                         help="write Budget vs Actual for every month as values computed locally")
+    publish.add_argument("--upsert", action="store_true",
+                         help="update the existing spreadsheet, sending only what changed")
+    publish.add_argument("--precomputed-flags", action="store_true",
+                         help="colour highest / overspend / incomplete rows directly "
+                              "instead of per-cell formula rules")
+    publish.add_argument("--rollup-summaries", action="store_true",
+                         help="write Dashboard and monthly summaries as values from a local "
+                              "rollup cube instead of QUERY formulas")
+    add_validation_arguments(publish)
+    add_trace_arguments(publish)
+    publish.set_defaults(func=cmd_publish)
+
+    sync = sub.add_parser("sync", help="push only new / changed expenses to an existing sheet")
+    sync.add_argument("spreadsheet_id")
+    sync.add_argument("--monthly-sheets", action="store_true",
+                      help="also add summary tabs for months that do not have one yet")
+    sync.add_argument("--precomputed-flags", action="store_true",
+                      help="recolour flagged rows (for sheets published with --precomputed-flags)")
+    sync.add_argument("--rollup-summaries", action="store_true",
+                      help="refresh the value summaries (for sheets published with --rollup-summaries)")
+    sync.add_argument("--snapshot-kpis", action="store_true",
+                      help="refresh the KPI values (for sheets published with --snapshot-kpis)")
+    sync.add_argument("--budget-engine", action="store_true",
+                      help="rewrite Budget vs Actual (for sheets published with --budget-engine)")
+    add_validation_arguments(sync)
+    add_trace_arguments(sync)
+    sync.set_defaults(func=cmd_sync)
+
+    batch = sub.add_parser("batch", help="publish / sync every household in a manifest in parallel")
+    batch.add_argument("manifest", help="JSON list of households (see batch_provision.py)")
+    batch.add_argument("--workers", type=int, default=DEFAULT_BATCH_WORKERS,
+                       help="households provisioned at the same time")
+    batch.add_argument("--requests-per-minute", type=int,
+                       help="Sheets request cap for the whole batch (default: the per-user quota)")
+    batch.add_argument("--upsert", action="store_true",
+                       help="update each household's existing spreadsheet instead of a new copy")
+    batch.add_argument("--chunk-size-kb", type=chunk_size_kb, default=DEFAULT_CHUNK_KB,
+                       help="resumable upload chunk size (multiple of 256)")
+    batch.add_argument("--snapshot-kpis", action="store_true")
+    batch.add_argument("--monthly-sheets", action="store_true")
+    batch.add_argument("--budget-engine", action="store_true")
+    batch.add_argument("--precomputed-flags", action="store_true")
+    batch.add_argument("--rollup-summaries", action="store_true")
+    batch.add_argument("--no-validate", dest="validate", action="store_false")
+    batch.add_argument("--rejects-dir", help="write each household's rejected rows here")
+    batch.add_argument("--report", metavar="CSV|JSON", help="also save the per-household report")
+    batch.set_defaults(func=cmd_batch)
+
+    pull = sub.add_parser("pull", help="read the live Expenses sheet back into a typed DataFrame")
+    pull.add_argument("spreadsheet_id")
+    pull.add_argument("--out", help="save as CSV (sheet layout) or .pkl (typed schema)")
+    pull.add_argument("--page-rows", type=int, default=DEFAULT_PAGE_ROWS,
+                      help="rows per concurrently fetched page")
+    pull.set_defaults(func=cmd_pull)
+
+    imp = sub.add_parser("import", help="stream a bank / UPI statement (CSV or XLSX) into the ledger")
+    imp.add_argument("file")
+    imp.add_argument("--account", required=True,
+                     help="account the statement belongs to (e.g. SBI); added to Payment_Modes if new")
+    imp.add_argument("--paid-by", default="", help="family member who owns the account")
+    imp.add_argument("--fuzzy-dedup", action="store_true",
+                     help="also skip near-duplicates (same account and amount within a few days)")
+    imp.add_argument("--rejects", metavar="CSV", help="write rows that failed validation here")
+    imp.set_defaults(func=cmd_import)
+
+    report = sub.add_parser("report", help="offline category summary for a month (e.g. Jan-2026)")
+    report.add_argument("month")
+    report.set_defaults(func=cmd_report)
+
+    check = sub.add_parser("startup-check", help="measure import times against the startup budget")
+    check.add_argument("--runs", type=int, default=5)
+    check.set_defaults(func=cmd_startup_check)
+
+    bench = sub.add_parser("bench", help="offline benchmarks on synthetic ledgers (fake Google APIs)")
+    bench.add_argument("--rows", type=int, nargs="+", default=DEFAULT_BENCH_ROWS)
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--repeat", type=int, default=3)
+    bench.add_argument("--json", help="also write the results to this file")
+    bench.set_defaults(func=cmd_bench)
+
+    selfcheck = sub.add_parser("self-check", help="offline behaviour checks (fake Google APIs)")
+    selfcheck.add_argument("checks", nargs="*", help="run only these (see selfcheck.CHECKS)")
+    selfcheck.set_defaults(func=cmd_self_check)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Precomputed row flags for the Expenses sheet.
+
+The sheet's CUSTOM_FORMULA rules (=G2=MAX($G$2:$G...) for the highest
+expense, =OR($A2="", $D2="", $G2="") for missing fields) are evaluated by
+Sheets for every cell in their range on every render; the MAX one scans
+the whole column per cell. compute_flags() works out the same flags in
+one vectorized pass over the ledger, and flag_formats() turns them into
+plain cell formats for only the flagged rows, so viewing the sheet costs
+nothing extra.
+
+Precedence matches the rule order the sheet used: top expense over
+overspend over missing fields.
+"""
+
+import numpy as np
+import pandas as pd
+
+import expense_schema
+import expense_validation
+
+TOP_N = 1                   # rows highlighted as the highest expenses (ties included)
+OVERSPEND_AMOUNT = 5000     # same threshold as the Amount > 5000 rule
+
+FLAG_COLUMNS = ["top", "overspend", "missing"]
+
+# flag -> (A1 columns, background) – the colours of the original rules
+FLAG_STYLES = {
+    "missing": ("A", "G", {"red": 1.0, "green": 0.95, "blue": 0.8}),
+    "overspend": ("G", "G", {"red": 1.0, "green": 0.85, "blue": 0.85}),
+    "top": ("A", "R", {"red": 1.0, "green": 0.9, "blue": 0.9}),
+}
+
+
+def compute_flags(expenses, top_n=TOP_N, overspend=OVERSPEND_AMOUNT):
+    """Boolean top / overspend / missing flags per expense row."""
+    paise = expense_schema.to_paise(expenses["Amount"]).astype("Float64")
+    # rank 1 = largest amount; ties share the rank, like =G2=MAX(...)
+    rank = paise.rank(method="min", ascending=False)
+    missing = expense_validation.blank
+    return pd.DataFrame({
+        "top": (rank <= top_n).fillna(False).astype(bool),
+        "overspend": (paise > overspend * 100).fillna(False).astype(bool),
+        "missing": missing(expenses["Date"]) | missing(expenses["Category"]) | missing(expenses["Amount"]),
+    }, index=expenses.index)[FLAG_COLUMNS]
+
+def flag_formats(flags, sheet_rows=None):
+    """
+    {A1 range: format} for the flagged rows. sheet_rows gives the sheet row
+    of every expense (default: ledger order from row 2).
+    """
+    if sheet_rows is None:
+        sheet_rows = np.arange(2, len(flags) + 2)
+    sheet_rows = np.asarray(sheet_rows)
+
+    formats = {}
+    # lowest precedence first; later entries win on shared cells
+    for flag in ("missing", "overspend", "top"):
+        first, last, colour = FLAG_STYLES[flag]
+        for row in sheet_rows[flags[flag].to_numpy(dtype=bool)]:
+            formats[f"{first}{row}:{last}{row}"] = {"backgroundColor": colour}
+    return formats
@@ -0,0 +1,181 @@
+"""
+Formula builder for the Family Expense Tracker.
+
+Every formula references the Expenses (and Monthly_Budget) data through
+named ranges sized to the real data extent plus a growth margin, instead
+of open columns like G:G. Sheets then only scans rows that can hold data.
+When the ledger grows past the margin, resize_requests() returns the
+updateNamedRange requests that stretch the names; the formula text itself
+never changes.
+"""
+
+GROWTH_MARGIN = 1000          # spare rows kept below the last expense
+HEADER_ROWS = 1
+
+TABLE_RANGE = "Expenses_Table"          # Expenses!A1:R<last>
+COLUMN_RANGES = {
+    "Expenses_Date": 0,                 # A
+    "Expenses_Month": 1,                # B
+    "Expenses_Category": 3,             # D
+    "Expenses_Amount": 6,               # G
+}
+EXPENSE_COLUMNS = 18                    # A:R
+
+# Monthly_Budget columns, sized like the Expenses ranges
+BUDGET_MARGIN = 120                     # a year of budgets for ten categories
+BUDGET_RANGES = {
+    "Budget_Category": 1,               # B
+    "Budget_Amount": 2,                 # C
+}
+# Dashboard!J21:K<...>: the rows budget_actual_helper() spills into below J20
+ACTUAL_RANGE = "Budget_Actual"
+ACTUAL_FIRST_ROW = 21
+ACTUAL_ROWS = 100
+
+
+def extent_for(row_count, margin=GROWTH_MARGIN):
+    """Last sheet row (1-based) the formulas should cover for row_count expenses."""
+    return HEADER_ROWS + row_count + margin
+
+def needs_resize(row_count, last_row):
+    return HEADER_ROWS + row_count > last_row
+
+def _grid_ranges(sheet_id, last_row):
+    ranges = {
+        TABLE_RANGE: {
+            "sheetId": sheet_id,
+            "startRowIndex": 0,
+            "endRowIndex": last_row,
+            "startColumnIndex": 0,
+            "endColumnIndex": EXPENSE_COLUMNS
+        }
+    }
+    for name, col in COLUMN_RANGES.items():
+        ranges[name] = {
+            "sheetId": sheet_id,
+            "startRowIndex": HEADER_ROWS,
+            "endRowIndex": last_row,
+            "startColumnIndex": col,
+            "endColumnIndex": col + 1
+        }
+    return ranges
+
+def budget_named_range_requests(budget_id, dashboard_id, budget_last_row):
+    """addNamedRange requests for the Budget vs Actual formula."""
+    ranges = {
+        name: {
+            "sheetId": budget_id,
+            "startRowIndex": HEADER_ROWS,
+            "endRowIndex": budget_last_row,
+            "startColumnIndex": col,
+            "endColumnIndex": col + 1
+        }
+        for name, col in BUDGET_RANGES.items()
+    }
+    ranges[ACTUAL_RANGE] = {
+        "sheetId": dashboard_id,
+        "startRowIndex": ACTUAL_FIRST_ROW - 1,
+        "endRowIndex": ACTUAL_FIRST_ROW - 1 + ACTUAL_ROWS,
+        "startColumnIndex": 9,          # J
+        "endColumnIndex": 11            # K
+    }
+    return [{"addNamedRange": {"namedRange": {"name": name, "range": grid}}}
+            for name, grid in ranges.items()]
+
+def named_range_requests(sheet_id, last_row):
+    """addNamedRange requests for a freshly uploaded Expenses sheet."""
+    return [
+        {"addNamedRange": {"namedRange": {"name": name, "range": grid}}}
+        for name, grid in _grid_ranges(sheet_id, last_row).items()
+    ]
+
+def resize_requests(sheet_id, last_row, existing):
+    """
+    updateNamedRange requests that move the named ranges to last_row.
+    existing maps range name -> namedRangeId (as returned by spreadsheets.get).
+    """
+    return [
+        {
+            "updateNamedRange": {
+                "namedRange": {
+                    "namedRangeId": existing[name],
+                    "name": name,
+                    "range": grid
+                },
+                "fields": "range"
+            }
+        }
+        for name, grid in _grid_ranges(sheet_id, last_row).items()
+        if name in existing
+    ]
+
+# ----- Expenses helper columns -----
+def month_formula():
+    return '=ARRAYFORMULA(IF(Expenses_Date="","",TEXT(Expenses_Date,"mmm-yyyy")))'
+
+def year_formula():
+    return '=ARRAYFORMULA(IF(Expenses_Date="","",YEAR(Expenses_Date)))'
+
+# ----- Dashboard KPIs -----
+def total_expense():
+    return "=SUM(Expenses_Amount)"
+
+def highest_expense():
+    return "=MAX(Expenses_Amount)"
+
+def current_month_total():
+    return (
+        '=SUM('
+        'ARRAYFORMULA('
+        'IF('
+        'TEXT(IF(Expenses_Date="",,DATEVALUE(Expenses_Date)),"mmm-yyyy") = '
+        'TEXT(MAX(IF(Expenses_Date="",,DATEVALUE(Expenses_Date))),"mmm-yyyy"),'
+        'Expenses_Amount*1,'
+        '0'
+        ')'
+        ')'
+        ')'
+    )
+
+# ----- QUERY summaries -----
+def summary_query(column, label):
+    """Group-by summary of Amount (G) over one Expenses column letter."""
+    return (
+        f'=QUERY({TABLE_RANGE},'
+        f'"select {column},sum(G) where A is not null '
+        f'group by {column} order by sum(G) desc '
+        f'label {column} \'{label}\', sum(G) \'Amount\'")'
+    )
+
+def monthly_summary(month):
+    return (
+        f'=QUERY({TABLE_RANGE},"select D,sum(G) where B=\'{month}\' '
+        f'group by D label sum(G) \'Total Amount\'")'
+    )
+
+def budget_actual_helper():
+    return (
+        '=QUERY({Expenses_Category, '
+        'ARRAYFORMULA(IF(Expenses_Month = LOOKUP(2,1/(Expenses_Month<>""),Expenses_Month), '
+        'Expenses_Amount, 0))},'
+        '"select Col1, sum(Col2) '
+        'where Col2 > 0 '
+        'group by Col1 '
+        'label Col1 \'Category\', sum(Col2) \'Actual\'", 0)'
+    )
+
+def budget_vs_actual():
+    """Budget, Actual and Variance per Monthly_Budget row (Actual from the helper at J20)."""
+    actual = f"IFERROR(VLOOKUP(Budget_Category, {ACTUAL_RANGE}, 2, FALSE), 0)"
+    return (
+        '=ARRAYFORMULA(IF(LEN(Budget_Category), '
+        f'{{Budget_Category, Budget_Amount, {actual}, Budget_Amount - {actual}}}, '
+        '""))'
+    )
+
+# ----- Conditional formatting (named ranges are not allowed here) -----
+def highest_expense_rule(last_row):
+    return f"=G2=MAX($G$2:$G${last_row})"
+
+def missing_fields_rule():
+    return '=OR($A2="", $D2="", $G2="")'
@@ -0,0 +1,125 @@
+"""
+Compact, typed schema for the 18-column Expenses ledger.
+
+The sheet layout (EXPENSE_COLUMNS) stores dates as text, Month / Year as
+redundant copies and every label as a Python string per row. to_typed()
+turns any ledger into:
+- Date as datetime64
+- Amount as integer paise (AMOUNT_PAISE) for exact, fast sums
+- low-cardinality labels as pandas categoricals
+- no stored Month / Year (use month_of / year_of)
+
+to_sheet_layout() converts a typed frame back to the 18 sheet columns.
+"""
+
+import pandas as pd
+
+EXPENSE_COLUMNS = [
+    "Date", "Month", "Year", "Category", "Sub-Category", "Description", "Amount",
+    "Payment Mode", "Account", "Paid By", "For Whom", "Expense Type", "Frequency",
+    "Vendor", "Bill?", "Reimbursable", "Tags", "Notes"
+]
+
+CATEGORICAL_COLUMNS = [
+    "Category", "Sub-Category", "Payment Mode", "Account", "Paid By", "For Whom",
+    "Expense Type", "Frequency", "Bill?", "Reimbursable", "Tags"
+]
+
+TEXT_COLUMNS = ["Description", "Vendor", "Notes"]
+
+DERIVED_COLUMNS = ["Month", "Year"]
+
+AMOUNT_PAISE = "Amount Paise"
+
+MONTH_FORMAT = "%b-%Y"     # Jan-2026, same as TEXT(date,"mmm-yyyy")
+
+# Non-ISO dates are read day first (13/01/2026), like the bank statements
+# and the sheet's locale; ISO dates (2026-01-13) are unambiguous either way
+DAYFIRST = True
+SHEETS_EPOCH = "1899-12-30"     # day 0 of Sheets serial dates
+
+
+def to_paise(amounts):
+    """Rupee amounts (numbers or numeric strings) -> integer paise."""
+    paise = (pd.to_numeric(amounts, errors="coerce") * 100).round()
+    if paise.isna().any():
+        return paise.astype("Int64")
+    return paise.astype("int64")
+
+def parse_dates(values, dayfirst=DAYFIRST):
+    """
+    Date column -> datetime64 (NaT for blanks and unparseable text). ISO
+    dates go through one vectorized pass; the rest are parsed value by
+    value, so one dd/mm/yyyy row does not fix the format of the others.
+    """
+    values = pd.Series(values)
+    dates = pd.to_datetime(values, format="%Y-%m-%d", errors="coerce")
+    rest = values[dates.isna() & values.notna()].astype(str).str.strip()
+    rest = rest[rest != ""]
+    if not rest.empty:
+        dates[rest.index] = pd.to_datetime(rest, format="mixed", dayfirst=dayfirst,
+                                           errors="coerce")
+    return dates
+
+def sheet_dates(values):
+    """Sheets serial numbers (or date text a user typed) -> datetime64."""
+    values = pd.Series(values, dtype=object)
+    serial = pd.to_numeric(values, errors="coerce")
+    dates = pd.to_datetime(serial, unit="D", origin=SHEETS_EPOCH)
+    text = serial.isna() & (values != "")
+    if text.any():
+        dates[text] = parse_dates(values[text].astype(str))
+    return dates
+
+def to_typed(expenses):
+    """Converts a ledger in sheet layout into the compact typed schema."""
+    typed = pd.DataFrame(index=expenses.index)
+    typed["Date"] = parse_dates(expenses["Date"])
+    typed[AMOUNT_PAISE] = to_paise(expenses["Amount"])
+
+    for col in CATEGORICAL_COLUMNS:
+        if col in expenses:
+            typed[col] = expenses[col].astype("category")
+    for col in TEXT_COLUMNS:
+        if col in expenses:
+            typed[col] = expenses[col]
+
+    order = ["Date", AMOUNT_PAISE] + [
+        c for c in EXPENSE_COLUMNS if c in typed and c not in ("Date", "Amount")
+    ]
+    return typed[order]
+
+# ----- Derived views -----
+def month_of(typed):
+    """Month label per row (Jan-2026), computed from Date."""
+    return typed["Date"].dt.strftime(MONTH_FORMAT)
+
+def month_period(typed):
+    """Month as a sortable monthly Period, cheaper than labels for grouping."""
+    return typed["Date"].dt.to_period("M")
+
+def year_of(typed):
+    return typed["Date"].dt.year
+
+def amount_rupees(typed):
+    return typed[AMOUNT_PAISE] / 100
+
+def to_sheet_layout(typed):
+    """Converts a typed frame back into the 18 Expenses sheet columns."""
+    ledger = pd.DataFrame(index=typed.index)
+    for col in EXPENSE_COLUMNS:
+        if col == "Date":
+            ledger[col] = typed["Date"].dt.strftime("%Y-%m-%d")
+        elif col == "Month":
+            ledger[col] = month_of(typed)
+        elif col == "Year":
+            ledger[col] = year_of(typed)
+        elif col == "Amount":
+            rupees = amount_rupees(typed)
+            whole = rupees.dropna()
+            ledger[col] = rupees.astype("Int64") if (whole % 1 == 0).all() else rupees
+        elif col in typed:
+            ledger[col] = typed[col].astype(object)
+        else:
+            ledger[col] = ""
+    return ledger
@@ -0,0 +1,145 @@
+"""
+Pre-upload validation of expenses against the reference tables.
+
+ReferenceIndex holds hashed lookup sets (pandas Index) built once from the
+Categories, Family and Payment_Modes tables. validate_expenses() checks a
+whole ledger or import chunk in one vectorized pass:
+- required fields present (Date, Category, Amount – the same fields the
+  sheet's "missing mandatory fields" rule flags; the ledger itself only
+  needs Date and Amount, see LEDGER_REQUIRED_COLUMNS),
+- Date parses as a date (ISO, or day first – see expense_schema.parse_dates),
+  Amount as a number,
+- Category, Sub-Category, Payment Mode, Account and Paid By, when filled
+  in, exist in the reference tables – every column whose strict dropdown
+  is built from them (skipped while a reference table is still empty).
+
+It returns the valid rows and a rejection report (one row per rejected
+expense, all reasons joined), so bad rows are caught before any network
+call. The Expenses dropdowns are built from the same index.
+"""
+
+import numpy as np
+import pandas as pd
+
+import expense_schema
+
+REQUIRED_COLUMNS = ["Date", "Category", "Amount"]
+
+# Import and publish keep rows without a Category: statement rows arrive
+# uncategorised and are categorised in the sheet, where the missing-fields
+# rule highlights them (see missing_counts for the warning)
+LEDGER_REQUIRED_COLUMNS = ["Date", "Amount"]
+
+# Row: 1-based row number in the source (ledger order, or statement data row)
+REPORT_COLUMNS = ["Row", "Date", "Description", "Amount", "Reason"]
+
+
+def _labels(values):
+    """Distinct non-blank labels, stripped, in first-seen order."""
+    labels = pd.Series(values, dtype=object).dropna().astype(str).str.strip()
+    return pd.Index(labels[labels != ""].unique())
+
+def blank(series):
+    """True where a cell is empty: NaN / None or only whitespace."""
+    return series.isna() | (series.astype(str).str.strip() == "")
+
+
+class ReferenceIndex:
+
+    def __init__(self, categories, family, payment):
+        self.categories = _labels(categories["Category"])
+        self.sub_categories = _labels(categories["Sub-Category"])
+        self.members = _labels(family["Member Name"])
+        self.payment_modes = _labels(payment["Payment Mode"])
+        self.accounts = _labels(payment["Account"])
+
+    # Expenses column -> allowed values, for the checks and the dropdowns
+    def lookups(self):
+        return {
+            "Category": self.categories,
+            "Sub-Category": self.sub_categories,
+            "Payment Mode": self.payment_modes,
+            "Account": self.accounts,
+            "Paid By": self.members,
+        }
+
+    def dropdown_values(self, column):
+        return list(self.lookups()[column])
+
+
+# Reference checks: Expenses column -> reason. One per lookups() column, so
+# nothing that passes here falls outside its dropdown in the sheet.
+REFERENCE_CHECKS = {
+    "Category": "unknown category",
+    "Sub-Category": "unknown sub-category",
+    "Payment Mode": "unknown payment mode",
+    "Account": "unknown account",
+    "Paid By": "unknown family member",
+}
+
+def _row_numbers(index):
+    if pd.api.types.is_integer_dtype(index):
+        return np.asarray(index) + 1
+    return np.arange(1, len(index) + 1)
+
+def validate_expenses(expenses, reference, required=REQUIRED_COLUMNS):
+    """
+    Returns (valid rows, rejection report). `reference` may be None to
+    run only the field checks (e.g. before reference tables exist).
+    """
+    failures = {}
+    for column in required:
+        failures[f"missing {column}"] = blank(expenses[column])
+
+    dates = expense_schema.parse_dates(expenses["Date"])
+    failures["bad date"] = dates.isna() & ~blank(expenses["Date"])
+    amounts = pd.to_numeric(expenses["Amount"], errors="coerce")
+    failures["non-numeric amount"] = amounts.isna() & ~blank(expenses["Amount"])
+
+    if reference is not None:
+        lookups = reference.lookups()
+        for column, reason in REFERENCE_CHECKS.items():
+            if lookups[column].empty:
+                continue            # no reference table yet: nothing to check against
+            values = expenses[column].astype(object).where(~blank(expenses[column]))
+            labels = values.dropna().astype(str).str.strip().reindex(values.index)
+            failures[reason] = labels.notna() & ~labels.isin(lookups[column])
+
+    failed = pd.DataFrame(failures, index=expenses.index)
+    rejected = failed.any(axis=1).to_numpy()
+    if not rejected.any():
+        return expenses, pd.DataFrame(columns=REPORT_COLUMNS)
+
+    # All reasons of a row in one string, without a Python loop over rows
+    reasons = failed[rejected].dot(pd.Series([r + "; " for r in failed.columns],
+                                             index=failed.columns)).str.rstrip("; ")
+    bad = expenses[rejected]
+    report = pd.DataFrame({
+        "Row": _row_numbers(expenses.index)[rejected],
+        "Date": bad["Date"].to_numpy(),
+        "Description": bad["Description"].to_numpy() if "Description" in bad else "",
+        "Amount": bad["Amount"].to_numpy(),
+        "Reason": reasons.to_numpy(),
+    }, columns=REPORT_COLUMNS)
+    return expenses[~rejected], report
+
+def missing_counts(expenses, columns=("Category",)):
+    """{column: rows left blank} for fields that are wanted but not required."""
+    counts = {column: int(blank(expenses[column]).sum()) for column in columns}
+    return {column: count for column, count in counts.items() if count}
+
+def print_report(report, path=None, limit=10):
+    """Prints a short rejection summary; writes the full report as CSV to `path`."""
+    if report.empty:
+        return
+    print(f"REJECTED: {len(report)} rows")
+    counts = report["Reason"].str.split("; ").explode().value_counts()
+    for reason, count in counts.items():
+        print(f"  {count:>6}  {reason}")
+    shown = report.head(limit).to_string(index=False)
+    print("\n".join("  " + line for line in shown.splitlines()))
+    if len(report) > limit:
+        print(f"  ... {len(report) - limit} more")
+    if path:
+        report.to_csv(path, index=False)
+        print(f"  full report: {path}")
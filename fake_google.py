@@ -0,0 +1,476 @@
+"""
+In-process fake of the Drive v3 and Sheets v4 service objects.
+
+Records every call the tracker makes (method, payload bytes, simulated
+latency) without any network access, so the publish / sync pipeline can
+be benchmarked offline and round trips counted exactly:
+
+    fake = FakeGoogle()
+    with fake.installed(tracker):
+        tracker.main()
+    fake.summary()
+
+Only the surface the tracker uses is implemented: files().create with a
+resumable media upload, files().list by name, spreadsheets().get /
+batchUpdate (sheets, named ranges, conditional-format rules, charts, data
+validation, clearing cell values and spreadsheet-level developer
+metadata; get with ranges returns the rules and cell validations of those
+rows, get asking for conditionalFormats / charts in `fields` adds them) and
+spreadsheets().values().get / batchGet / batchUpdate / append. Values
+are kept per sheet in grids, seeded with load_grid() (the uploaded
+workbook is not parsed) and updated by every values write; ISO dates
+entered USER_ENTERED become serial dates, read back as serial numbers or
+as dd/mm/yyyy text depending on the render options. Unknown spreadsheet
+IDs fail with a 404 like the real API. Latency is simulated (added up,
+never slept) as a fixed cost per round trip plus a transfer cost per KiB.
+
+fail() injects errors – 429 / 5xx with an optional Retry-After, dropped
+connections, and failures after the call took effect (lost responses) –
+so the executor's retry policy can be checked offline.
+"""
+
+import contextlib
+import datetime
+import json
+import re
+import threading
+from collections import Counter, defaultdict, deque, namedtuple
+
+import api_executor
+
+ROUND_TRIP_MS = 120.0       # typical Sheets API request from a home connection
+MS_PER_KIB = 0.08           # ~12 MiB/s upstream
+
+WORKBOOK_SHEETS = ["Expenses", "Categories", "Family", "Payment_Modes", "Monthly_Budget"]
+
+DATE_FORMAT = "%d/%m/%Y"    # dates as FORMATTED_STRING shows them (a dd/mm locale)
+
+Call = namedtuple("Call", "method request_bytes response_bytes latency_ms")
+
+_A1_RANGE = re.compile(r"^([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?$")
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_EPOCH = datetime.date(1899, 12, 30)
+
+
+class SerialDate(int):
+    """A cell holding a date: its serial number, displayed as DATE_FORMAT."""
+
+    def formatted(self):
+        return (_EPOCH + datetime.timedelta(days=int(self))).strftime(DATE_FORMAT)
+
+
+class FakeResponse(dict):
+    def __init__(self, status, retry_after=None):
+        super().__init__(status=str(status))
+        if retry_after is not None:
+            self["retry-after"] = str(retry_after)
+        self.status = status
+
+
+class FakeHttpError(Exception):
+    """Mimics googleapiclient.errors.HttpError (status and headers on .resp)."""
+
+    def __init__(self, status, message="", retry_after=None):
+        super().__init__(f"{status} {message}".strip())
+        self.resp = FakeResponse(status, retry_after)
+
+Failure = namedtuple("Failure", "status retry_after applied")
+
+def _raise(failure):
+    if failure.status == 0:
+        raise ConnectionResetError("connection dropped")
+    raise FakeHttpError(failure.status, "injected", failure.retry_after)
+
+
+def _column_index(letters):
+    col = 0
+    for ch in letters:
+        col = col * 26 + ord(ch) - ord("A") + 1
+    return col - 1
+
+def _chart_sheet(chart):
+    return chart.get("position", {}).get("overlayPosition", {}).get("anchorCell", {}).get("sheetId")
+
+def _covers(grid, row, col):
+    """Whether a GridRange (open ends = unbounded) contains the 0-based cell."""
+    return (grid.get("startRowIndex", 0) <= row < grid.get("endRowIndex", float("inf"))
+            and grid.get("startColumnIndex", 0) <= col < grid.get("endColumnIndex", float("inf")))
+
+def _entered(value, input_option):
+    """What the sheet stores for a written value (USER_ENTERED parses dates)."""
+    if input_option == "USER_ENTERED" and isinstance(value, str) and _ISO_DATE.match(value):
+        return SerialDate((datetime.date.fromisoformat(value) - _EPOCH).days)
+    return value
+
+def _rendered(value, options):
+    """A stored value as values().get / batchGet return it."""
+    if not isinstance(value, SerialDate):
+        return value
+    if (options.get("valueRenderOption", "FORMATTED_VALUE") == "FORMATTED_VALUE"
+            or options.get("dateTimeRenderOption") == "FORMATTED_STRING"):
+        return value.formatted()
+    return int(value)
+
+def payload_bytes(obj):
+    return len(json.dumps(obj, default=str, separators=(",", ":")).encode("utf-8"))
+
+
+class FakeRequest:
+    """Stands in for googleapiclient.http.HttpRequest."""
+
+    def __init__(self, google, method, kwargs):
+        self.google = google
+        self.method = method
+        self.kwargs = kwargs
+        self.offset = 0
+
+    def execute(self, http=None):
+        body = {k: v for k, v in self.kwargs.items() if k != "media_body"}
+        response = None
+        failure = self.google.next_failure(self.method)
+        try:
+            if failure and not failure.applied:
+                _raise(failure)
+            response = self.google.respond(self.method, self.kwargs)
+            if failure:
+                _raise(failure)         # applied, but the response is lost
+            return response
+        finally:
+            self.google.record(self.method, payload_bytes(body), payload_bytes(response))
+
+    def next_chunk(self, http=None):
+        """Resumable upload: one recorded round trip per media chunk."""
+        media = self.kwargs["media_body"]
+        size = media.size()
+        chunk = media.getbytes(self.offset, media.chunksize())
+        self.offset += len(chunk)
+        if self.offset < size:
+            self.google.record(self.method + "[chunk]", len(chunk), 0)
+            return None, None
+        response = self.google.respond(self.method, self.kwargs)
+        self.google.record(self.method + "[chunk]", len(chunk), payload_bytes(response))
+        return None, response
+
+
+class FakeResource:
+
+    def __init__(self, google, path):
+        self._google = google
+        self._path = path
+
+    def __getattr__(self, name):
+        def method(**kwargs):
+            if not kwargs and name in ("files", "spreadsheets", "values"):
+                return FakeResource(self._google, self._path + [name])
+            return FakeRequest(self._google, ".".join(self._path + [name]), kwargs)
+        return method
+
+
+class FakeGoogle:
+    """
+    One fake backend shared by the drive and sheets services, so a
+    spreadsheet uploaded through Drive is visible to Sheets afterwards.
+    """
+
+    def __init__(self, round_trip_ms=ROUND_TRIP_MS, ms_per_kib=MS_PER_KIB):
+        self.round_trip_ms = round_trip_ms
+        self.ms_per_kib = ms_per_kib
+        self.calls = []
+        self.spreadsheets = {}      # id -> {"sheets": [properties], "grids": {title: rows}, ...}
+        self.applied = Counter()    # method -> calls that took effect
+        self._failures = defaultdict(deque)     # method -> injected Failures, in order
+        self._lock = threading.Lock()   # batch runs call in from several threads
+
+    # ----- services -----
+    def service(self, name="sheets", version="v4"):
+        return FakeResource(self, [])
+
+    @contextlib.contextmanager
+    def installed(self, tracker):
+        """
+        Points the tracker at this fake for the duration of the block: no
+        OAuth, fake services, and an executor without rate limiting.
+        """
+        saved = (tracker.get_credentials, tracker.build_service,
+                 tracker.configure_executor, tracker.get_executor())
+        tracker.get_credentials = lambda: None
+        tracker.build_service = lambda name, version, creds: self.service(name, version)
+        tracker.configure_executor(api_executor.ApiExecutor(requests_per_minute=10 ** 9,
+                                                            burst=10 ** 9))
+        tracker.configure_executor = lambda executor: None
+        try:
+            yield self
+        finally:
+            (tracker.get_credentials, tracker.build_service,
+             tracker.configure_executor, executor) = saved
+            tracker.configure_executor(executor)
+            tracker.invalidate_sheet_metadata()
+
+    def load_grid(self, spreadsheet_id, title, rows):
+        """Seeds a sheet's cell values (list of rows, header included)."""
+        spreadsheet = self.spreadsheets[spreadsheet_id]
+        spreadsheet["grids"][title] = rows
+        for properties in spreadsheet["sheets"]:
+            if properties["title"] == title:
+                properties["gridProperties"] = {"rowCount": len(rows),
+                                                "columnCount": max(map(len, rows), default=0)}
+
+    # ----- failure injection -----
+    def fail(self, method, status, times=1, retry_after=None, applied=False):
+        """
+        Makes the next `times` calls of method (e.g. "spreadsheets.values.append")
+        fail with an HTTP status, or 0 for a dropped connection. applied=True
+        lets the call take effect first and loses only the response.
+        """
+        with self._lock:
+            self._failures[method].extend([Failure(status, retry_after, applied)] * times)
+
+    def next_failure(self, method):
+        with self._lock:
+            queue = self._failures.get(method)
+            return queue.popleft() if queue else None
+
+    # ----- recording -----
+    def record(self, method, request_bytes, response_bytes):
+        latency = self.round_trip_ms + (request_bytes + response_bytes) / 1024 * self.ms_per_kib
+        with self._lock:
+            self.calls.append(Call(method, request_bytes, response_bytes, latency))
+
+    def reset(self):
+        self.calls = []
+        self.applied = Counter()
+        self._failures.clear()
+
+    def summary(self):
+        return {
+            "round_trips": len(self.calls),
+            "request_bytes": sum(c.request_bytes for c in self.calls),
+            "response_bytes": sum(c.response_bytes for c in self.calls),
+            "simulated_ms": sum(c.latency_ms for c in self.calls),
+            "by_method": dict(Counter(c.method for c in self.calls)),
+        }
+
+    # ----- responses -----
+    def respond(self, method, kwargs):
+        handler = getattr(self, "_" + method.replace(".", "_"), None)
+        with self._lock:
+            response = handler(kwargs) if handler else {}
+            self.applied[method] += 1
+            return response
+
+    def _spreadsheet(self, kwargs):
+        spreadsheet = self.spreadsheets.get(kwargs["spreadsheetId"])
+        if spreadsheet is None:
+            raise FakeHttpError(404, "Requested entity was not found.")
+        return spreadsheet
+
+    def _files_create(self, kwargs):
+        spreadsheet_id = f"fake-{len(self.spreadsheets) + 1}"
+        self.spreadsheets[spreadsheet_id] = {
+            "name": kwargs.get("body", {}).get("name"),
+            "sheets": [{"title": t, "sheetId": i} for i, t in enumerate(WORKBOOK_SHEETS)],
+            "namedRanges": [],
+            "developerMetadata": [],
+            "conditionalFormats": {},   # sheetId -> rules, in priority order
+            "charts": [],
+            "validations": [],          # (GridRange, rule), later ones win
+            "grids": {},                # title -> rows of cell values, row 1 first
+        }
+        return {"id": spreadsheet_id}
+
+    def _files_list(self, kwargs):
+        # Newest first, matched on the name = '...' clause of the query only
+        query = kwargs.get("q", "")
+        name = query.split("name = '", 1)[1].split("'", 1)[0] if "name = '" in query else None
+        return {"files": [
+            {"id": sid} for sid, spreadsheet in reversed(self.spreadsheets.items())
+            if name is None or spreadsheet["name"] == name
+        ][:kwargs.get("pageSize", 100)]}
+
+    def _spreadsheets_get(self, kwargs):
+        spreadsheet = self._spreadsheet(kwargs)
+        if kwargs.get("ranges"):
+            return {"sheets": [self._sheet_with_rows(spreadsheet, a1) for a1 in kwargs["ranges"]]}
+        sheets = [{"properties": p} for p in spreadsheet["sheets"]]
+        fields = kwargs.get("fields", "")
+        for sheet in sheets:
+            sheet_id = sheet["properties"]["sheetId"]
+            if "conditionalFormats" in fields:
+                sheet["conditionalFormats"] = spreadsheet["conditionalFormats"].get(sheet_id, [])
+            if "charts" in fields:
+                sheet["charts"] = [c for c in spreadsheet["charts"] if _chart_sheet(c) == sheet_id]
+        return {
+            "sheets": sheets,
+            "namedRanges": spreadsheet["namedRanges"],
+            "developerMetadata": spreadsheet["developerMetadata"],
+        }
+
+    def _sheet_with_rows(self, spreadsheet, a1):
+        """A sheet's rules plus the data validation of every cell in the A1 range."""
+        title, _, cells = a1.rpartition("!")
+        properties = next(p for p in spreadsheet["sheets"] if p["title"] == title)
+        sheet_id = properties["sheetId"]
+        c0, r0, c1, r1 = _A1_RANGE.match(cells).groups()
+        rows = []
+        for row in range(int(r0) - 1, int(r1 or r0)):
+            values = []
+            for col in range(_column_index(c0), _column_index(c1 or c0) + 1):
+                cell = {}
+                for grid, rule in spreadsheet["validations"]:
+                    if grid["sheetId"] == sheet_id and _covers(grid, row, col):
+                        cell = {"dataValidation": rule}
+                values.append(cell)
+            rows.append({"values": values})
+        return {"properties": properties,
+                "conditionalFormats": spreadsheet["conditionalFormats"].get(sheet_id, []),
+                "data": [{"rowData": rows}]}
+
+    def _spreadsheets_batchUpdate(self, kwargs):
+        spreadsheet = self._spreadsheet(kwargs)
+        replies = []
+        for request in kwargs["body"]["requests"]:
+            reply = {}
+            if "addSheet" in request:
+                properties = dict(request["addSheet"]["properties"])
+                properties.setdefault("sheetId", 1000 + len(spreadsheet["sheets"]))
+                spreadsheet["sheets"].append(properties)
+                reply = {"addSheet": {"properties": properties}}
+            elif "addNamedRange" in request:
+                named = dict(request["addNamedRange"]["namedRange"])
+                named.setdefault("namedRangeId", f"nr-{len(spreadsheet['namedRanges'])}")
+                spreadsheet["namedRanges"].append(named)
+                reply = {"addNamedRange": {"namedRange": named}}
+            elif "updateNamedRange" in request:
+                update = request["updateNamedRange"]["namedRange"]
+                for named in spreadsheet["namedRanges"]:
+                    if named["namedRangeId"] == update["namedRangeId"]:
+                        named["range"] = update["range"]
+            elif "deleteNamedRange" in request:
+                named_id = request["deleteNamedRange"]["namedRangeId"]
+                spreadsheet["namedRanges"] = [
+                    n for n in spreadsheet["namedRanges"] if n["namedRangeId"] != named_id
+                ]
+            elif "addConditionalFormatRule" in request:
+                add = request["addConditionalFormatRule"]
+                sheet_id = add["rule"]["ranges"][0]["sheetId"]
+                rules = spreadsheet["conditionalFormats"].setdefault(sheet_id, [])
+                rules.insert(add.get("index", 0), add["rule"])
+            elif "updateConditionalFormatRule" in request:
+                update = request["updateConditionalFormatRule"]
+                spreadsheet["conditionalFormats"][update["sheetId"]][update["index"]] = update["rule"]
+            elif "deleteConditionalFormatRule" in request:
+                delete = request["deleteConditionalFormatRule"]
+                del spreadsheet["conditionalFormats"][delete["sheetId"]][delete["index"]]
+            elif "addChart" in request:
+                chart = dict(request["addChart"]["chart"])
+                chart.setdefault("chartId", len(spreadsheet["charts"]) + 1)
+                spreadsheet["charts"].append(chart)
+                reply = {"addChart": {"chart": chart}}
+            elif "deleteEmbeddedObject" in request:
+                object_id = request["deleteEmbeddedObject"]["objectId"]
+                spreadsheet["charts"] = [c for c in spreadsheet["charts"]
+                                         if c["chartId"] != object_id]
+            elif "updateCells" in request:
+                update = request["updateCells"]
+                if "rows" not in update and "userEnteredValue" in update["fields"]:
+                    self._clear(spreadsheet, update["range"])
+            elif "setDataValidation" in request:
+                validation = request["setDataValidation"]
+                spreadsheet["validations"].append((validation["range"], validation.get("rule")))
+            elif "createDeveloperMetadata" in request:
+                meta = dict(request["createDeveloperMetadata"]["developerMetadata"])
+                meta.setdefault("metadataId", len(spreadsheet["developerMetadata"]) + 1)
+                spreadsheet["developerMetadata"].append(meta)
+                reply = {"createDeveloperMetadata": {"developerMetadata": meta}}
+            elif "deleteDeveloperMetadata" in request:
+                lookup = request["deleteDeveloperMetadata"]["dataFilter"]["developerMetadataLookup"]
+                spreadsheet["developerMetadata"] = [
+                    m for m in spreadsheet["developerMetadata"]
+                    if m["metadataKey"] != lookup.get("metadataKey")
+                ]
+            replies.append(reply)
+        return {"replies": replies}
+
+    def _read(self, spreadsheet, a1, options):
+        title, _, cells = a1.rpartition("!")
+        c0, r0, c1, r1 = _A1_RANGE.match(cells).groups()
+        rows = spreadsheet["grids"].get(title, [])
+        r0 = int(r0) - 1 if r0 else 0
+        rows = rows[r0:int(r1) if r1 else len(rows)]
+        c0, c1 = _column_index(c0), _column_index(c1 or c0) + 1
+        rows = [[_rendered(v, options) for v in row[c0:c1]] for row in rows]
+        if options.get("majorDimension") == "COLUMNS":
+            width = max(map(len, rows), default=0)
+            rows = [[row[c] if c < len(row) else "" for row in rows] for c in range(width)]
+        # like the API: trailing blanks and empty trailing lines are left out
+        values = []
+        for line in rows:
+            while line and line[-1] in ("", None):
+                line.pop()
+            values.append(line)
+        while values and not values[-1]:
+            values.pop()
+        return {"range": a1, "majorDimension": options.get("majorDimension", "ROWS"),
+                "values": values}
+
+    def _write(self, spreadsheet, a1, rows, input_option):
+        """Stores rows from the range's top-left cell on; None leaves a cell as it is."""
+        title, _, cells = a1.rpartition("!")
+        c0, r0, _, _ = _A1_RANGE.match(cells).groups()
+        grid = spreadsheet["grids"].setdefault(title, [])
+        c0 = _column_index(c0)
+        for r, row in enumerate(rows, int(r0 or 1) - 1):
+            grid.extend([] for _ in range(r + 1 - len(grid)))
+            line = grid[r] = list(grid[r])
+            for c, value in enumerate(row, c0):
+                if value is None:
+                    continue
+                line.extend([""] * (c + 1 - len(line)))
+                line[c] = _entered(value, input_option)
+        for properties in spreadsheet["sheets"]:
+            grid_properties = properties.get("gridProperties")
+            if properties["title"] == title and grid_properties:
+                grid_properties["rowCount"] = max(grid_properties["rowCount"], len(grid))
+        return sum(len(row) for row in rows)
+
+    def _clear(self, spreadsheet, grid_range):
+        """Blanks the stored values inside a GridRange (open sides run to the edge)."""
+        title = next(p["title"] for p in spreadsheet["sheets"]
+                     if p["sheetId"] == grid_range["sheetId"])
+        grid = spreadsheet["grids"].get(title, [])
+        rows = range(grid_range.get("startRowIndex", 0), grid_range.get("endRowIndex", len(grid)))
+        for r in rows[:max(0, len(grid) - rows.start)]:
+            line = grid[r] = list(grid[r])
+            end = min(grid_range.get("endColumnIndex", len(line)), len(line))
+            for c in range(grid_range.get("startColumnIndex", 0), end):
+                line[c] = ""
+
+    def _spreadsheets_values_get(self, kwargs):
+        spreadsheet = self._spreadsheet(kwargs)
+        value_range = self._read(spreadsheet, kwargs["range"], kwargs)
+        return {"values": value_range["values"]}
+
+    def _spreadsheets_values_batchGet(self, kwargs):
+        spreadsheet = self._spreadsheet(kwargs)
+        return {"valueRanges": [self._read(spreadsheet, a1, kwargs) for a1 in kwargs["ranges"]]}
+
+    def _spreadsheets_values_batchUpdate(self, kwargs):
+        spreadsheet = self._spreadsheet(kwargs)
+        body = kwargs["body"]
+        return {"totalUpdatedCells": sum(
+            self._write(spreadsheet, d["range"], d["values"], body.get("valueInputOption"))
+            for d in body["data"]
+        )}
+
+    def _spreadsheets_values_append(self, kwargs):
+        # Below the last row holding anything (no table detection)
+        spreadsheet = self._spreadsheet(kwargs)
+        title, _, cells = kwargs["range"].rpartition("!")
+        column = _A1_RANGE.match(cells).group(1)
+        grid = spreadsheet["grids"].get(title, [])
+        last = max((r + 1 for r, row in enumerate(grid) if any(v not in ("", None) for v in row)),
+                   default=0)
+        rows = kwargs["body"]["values"]
+        self._write(spreadsheet, f"{title}!{column}{last + 1}", rows,
+                    kwargs.get("valueInputOption"))
+        return {"updates": {"updatedRows": len(rows)}}
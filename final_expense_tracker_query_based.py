@@ -5,17 +5,42 @@ Author: Kodi Arasan M
 
 This script:
 - OAuth2 authentication (no service account)
+- Local SQLite ledger as source of truth
 - Uploads Excel to Google Sheets
-- Dashboard + Monthly summaries via QUERY
+- Dashboard + Monthly summaries via QUERY (or values from a local rollup cube)
+- Incremental sync of new / changed expenses
 - Prints Google Sheet link
+
+Command line: see expense_cli.py (this file runs its default "publish").
 """
 
+import contextlib
+import copy
+import hashlib
+import io
+import json
 import os
 import pickle
+import re
+import tempfile
+import threading
+import time
+import zlib
+from collections import namedtuple
 import pandas as pd
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.http import MediaFileUpload
+import api_executor
+import budget_engine
+import expense_flags
+import expense_formulas
+import expense_schema
+import expense_validation
+import ledger_store
+import rollup_cube
+import sheet_styles
+import tracing
+
+# googleapiclient / google_auth_oauthlib are imported inside the functions
+# that need them, so commands that never touch the network start fast.
 
 CLIENT_SECRET_FILE = "client_secret.json"
 TOKEN_PICKLE = "token.pickle"
@@ -28,41 +53,142 @@ SCOPES = [
 GOOGLE_SHEET_NAME = "Family Expense Tracker"
 DRIVE_FOLDER_ID = "1gB27vvJbdolhvkAp8h-LPRx8e5C0bO8i"
 
+# Where a spreadsheet is published: its name and Drive folder
+Destination = namedtuple("Destination", "name folder_id")
+
+def destination(name=None, folder_id=None):
+    """Destination, defaulting to GOOGLE_SHEET_NAME in DRIVE_FOLDER_ID."""
+    return Destination(name or GOOGLE_SHEET_NAME, folder_id or DRIVE_FOLDER_ID)
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024   # must be a multiple of 256 KiB
+
+DISCOVERY_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "family-expense-tracker")
+
+# Every Sheets / Drive call goes through this executor (rate limit + retries)
+_EXECUTOR = api_executor.ApiExecutor()
+
+def configure_executor(executor):
+    global _EXECUTOR
+    _EXECUTOR = executor
+
+def get_executor():
+    return _EXECUTOR
+
+def execute(request, idempotent=True):
+    # idempotent=False: the request must not run twice (retried on 429 only)
+    return _EXECUTOR.execute(request, idempotent)
+
+# Credentials are loaded / refreshed once per process and reused
+_CREDENTIALS = None
+_CREDENTIALS_LOCK = threading.Lock()
+
+def _save_token(creds):
+    """Writes token.pickle atomically so a crash never leaves it half-written."""
+    tmp = f"{TOKEN_PICKLE}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(creds, f)
+    os.replace(tmp, TOKEN_PICKLE)
+
 def get_credentials():
-    creds = None
-    if os.path.exists(TOKEN_PICKLE):
-        with open(TOKEN_PICKLE, "rb") as f:
-            creds = pickle.load(f)
-    if not creds or not creds.valid:
-        flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_FILE, SCOPES)
-        creds = flow.run_local_server(port=0)
-        with open(TOKEN_PICKLE, "wb") as f:
-            pickle.dump(creds, f)
-    return creds
+    """
+    Returns valid OAuth credentials:
+    1. the copy already cached in this process
+    2. token.pickle, refreshed in place if only the access token expired
+    3. the interactive browser flow, only when there is no refresh token
+    """
+    global _CREDENTIALS
+    with _CREDENTIALS_LOCK:
+        creds = _CREDENTIALS
+        if creds is None and os.path.exists(TOKEN_PICKLE):
+            with open(TOKEN_PICKLE, "rb") as f:
+                creds = pickle.load(f)
+
+        if creds and not creds.valid and creds.refresh_token:
+            from google.auth.exceptions import RefreshError
+            from google.auth.transport.requests import Request
+            try:
+                creds.refresh(Request())
+                _save_token(creds)
+            except RefreshError:
+                creds = None      # revoked / expired refresh token
+
+        if not creds or not creds.valid:
+            from google_auth_oauthlib.flow import InstalledAppFlow
+            flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_FILE, SCOPES)
+            creds = flow.run_local_server(port=0)
+            _save_token(creds)
+
+        _CREDENTIALS = creds
+        return creds
+
+# ================= SERVICES =================
+# (name, version) -> parsed discovery document
+_DISCOVERY_DOCS = {}
+
+def _discovery_document(name, version):
+    """
+    Parsed discovery document, cached in memory and as a pickle on disk
+    (keyed by googleapiclient version) so it is not re-parsed every run.
+    """
+    key = (name, version)
+    if key not in _DISCOVERY_DOCS:
+        from googleapiclient.version import __version__ as client_version
+        path = os.path.join(
+            DISCOVERY_CACHE_DIR, f"{name}.{version}.{client_version}.pickle"
+        )
+        try:
+            with open(path, "rb") as f:
+                doc = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            from googleapiclient.discovery_cache import get_static_doc
+            doc = json.loads(get_static_doc(name, version))
+            os.makedirs(DISCOVERY_CACHE_DIR, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(doc, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        _DISCOVERY_DOCS[key] = doc
+    return _DISCOVERY_DOCS[key]
+
+def build_service(name, version, creds):
+    """googleapiclient build() from the cached discovery document."""
+    from googleapiclient.discovery import build_from_document
+    return build_from_document(_discovery_document(name, version), credentials=creds)
+
+def connect(requests_per_minute=api_executor.SHEETS_REQUESTS_PER_MINUTE):
+    """
+    Returns (drive, sheets) services and installs the executor every call
+    goes through (one authorized Http per worker thread).
+    """
+    creds = get_credentials()
+    drive = build_service("drive","v3",creds)
+    sheets = build_service("sheets","v4",creds)
+    configure_executor(api_executor.ApiExecutor(
+        requests_per_minute=requests_per_minute,
+        http_factory=api_executor.authorized_http_factory(creds)
+    ))
+    return drive, sheets
 
 def create_test_data():
     expenses = pd.DataFrame([
     ["2026-01-04","Jan-2026",2026,"Loans","EMI","Apty Kalanchiam",5000,"Cash","Cash","Deiva","Mother","Loan","Monthly","Veni Anni Sangam","Yes","No","Family","Note3"],
     ["2026-01-05","Jan-2026",2026,"Loans","EMI","Kotak Due",4313,"Bank Transfer","Kotak811","Chandru","Anna","Loan","Monthly","Vendor1","Yes","No","Family","PAID"],
     ["2026-01-09","Jan-2026",2026,"Loans","EMI","Kalanchiam Kmpty",7000,"Cash","Cash","Chandru","Family","Loan","Monthly","Vendor2","Yes","No","Family","Note2"]
-    ], columns=[
-    "Date","Month","Year","Category","Sub-Category","Description","Amount",
-    "Payment Mode","Account","Paid By","For Whom","Expense Type","Frequency",
-    "Vendor","Bill?","Reimbursable","Tags","Notes"
-    ])
+    ], columns=expense_schema.EXPENSE_COLUMNS)
     categories = pd.DataFrame({
-        "Category":["Food","Food","Transport","Health","Loans"],
-        "Sub-Category":["Groceries","Dining","Fuel","Medicines","Repayments"]
+        "Category":["Food","Food","Transport","Health","Loans","Loans"],
+        "Sub-Category":["Groceries","Dining","Fuel","Medicines","Repayments","EMI"]
     })
 
     family = pd.DataFrame({
-        "Member Name":["Chandru","Karthi","Appa","Amma","Pothu"],
-        "Role":["Self","Brother","Father","Mother","Anni"]
+        "Member Name":["Chandru","Karthi","Appa","Amma","Pothu","Deiva"],
+        "Role":["Self","Brother","Father","Mother","Anni","Mother"]
     })
 
     payment = pd.DataFrame({
-        "Payment Mode":["Cash","UPI","Card"],
-        "Account":["Cash","GPay","Credit Card"]
+        "Payment Mode":["Cash","UPI","Card","Bank Transfer"],
+        "Account":["Cash","GPay","Credit Card","Kotak811"]
     })
 
     budget = pd.DataFrame({
@@ -73,36 +199,344 @@ def create_test_data():
 
     return expenses, categories, family, payment, budget
 
-def export_excel(expenses, categories, family, payment, budget):
-    with pd.ExcelWriter("temp.xlsx", engine="openpyxl") as writer:
+# Workbook tabs, in the order of the 5 ledger tables
+WORKBOOK_SHEETS = ["Expenses", "Categories", "Family", "Payment_Modes", "Monthly_Budget"]
+# Ledgers from this size on are exported in streaming mode to a temp file
+STREAMING_EXPORT_ROWS = 50000
+STREAMING_CHUNK_ROWS = 10000
+
+def export_excel(expenses, categories, family, payment, budget, target="temp.xlsx",
+                 streaming=False):
+    """
+    Writes the workbook to a path or a binary buffer (e.g. io.BytesIO).
+    streaming=True writes it with export_excel_streaming instead.
+    """
+    if streaming:
+        return export_excel_streaming(expenses, categories, family, payment, budget, target)
+    with pd.ExcelWriter(target, engine="openpyxl") as writer:
         expenses.to_excel(writer, sheet_name="Expenses", index=False)
         categories.to_excel(writer, sheet_name="Categories", index=False)
         family.to_excel(writer, sheet_name="Family", index=False)
         payment.to_excel(writer, sheet_name="Payment_Modes", index=False)
         budget.to_excel(writer, sheet_name="Monthly_Budget", index=False)
-
-def upload_sheet(drive):
+    return target
+
+def _header_cells(sheet, columns):
+    # Same header style as DataFrame.to_excel: bold, thin border, centred
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+
+    thin = Side(style="thin")
+    cells = []
+    for name in columns:
+        cell = WriteOnlyCell(sheet, value=str(name))
+        cell.font = Font(bold=True)
+        cell.border = Border(left=thin, right=thin, top=thin, bottom=thin)
+        cell.alignment = Alignment(horizontal="center", vertical="top")
+        cells.append(cell)
+    return cells
+
+def _chunks(table, chunk_rows):
+    """A DataFrame sliced into chunks, or an iterable of chunks as is."""
+    if isinstance(table, pd.DataFrame):
+        return (table.iloc[i:i + chunk_rows] for i in range(0, max(len(table), 1), chunk_rows))
+    return table
+
+def export_excel_streaming(expenses, categories, family, payment, budget, target="temp.xlsx",
+                           chunk_rows=STREAMING_CHUNK_ROWS):
+    """
+    Same workbook as export_excel, written in openpyxl's write-only mode:
+    rows are streamed out chunk by chunk instead of being built as cell
+    objects first, so the writer's memory stays flat whatever the ledger
+    size. Each table may be a DataFrame or an iterable of DataFrame chunks.
+    A DataFrame is of course already in memory; only chunks from
+    LedgerStore.iter_expenses() keep the whole export flat (the
+    export_stream benchmark measures that case).
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    for title, table in zip(WORKBOOK_SHEETS, (expenses, categories, family, payment, budget)):
+        sheet = workbook.create_sheet(title)
+        header = False
+        for chunk in _chunks(table, chunk_rows):
+            if not header:
+                sheet.append(_header_cells(sheet, chunk.columns))
+                header = True
+            # NaN / NA -> empty cell, numpy scalars -> Python values
+            for row in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False,
+                                                                                  name=None):
+                sheet.append(row)
+    workbook.save(target)
+    return target
+
+def export_excel_buffer(expenses, categories, family, payment, budget):
+    """Same workbook as export_excel, kept in memory instead of temp.xlsx."""
+    buffer = export_excel(expenses, categories, family, payment, budget, target=io.BytesIO())
+    buffer.seek(0)
+    return buffer
+
+def upload_sheet(drive, workbook="temp.xlsx", chunk_size=UPLOAD_CHUNK_SIZE, target=None):
+    """
+    Uploads the workbook (file path or binary buffer) as a Google Sheet using
+    a chunked, resumable upload. A failed chunk is retried from the last byte
+    the server acknowledged instead of restarting the whole transfer.
+    target: Destination (default: destination()).
+    """
+    target = target or destination()
     metadata = {
-        "name": GOOGLE_SHEET_NAME,
-        "parents": [DRIVE_FOLDER_ID],
+        "name": target.name,
+        "parents": [target.folder_id],
         "mimeType": "application/vnd.google-apps.spreadsheet"
     }
-    media = MediaFileUpload(
-        "temp.xlsx",
-        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-    file = drive.files().create(body=metadata, media_body=media, fields="id").execute()
-    return file["id"]
+    from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload
+
+    if isinstance(workbook, str):
+        media = MediaFileUpload(workbook, mimetype=XLSX_MIMETYPE,
+                                chunksize=chunk_size, resumable=True)
+    else:
+        media = MediaIoBaseUpload(workbook, mimetype=XLSX_MIMETYPE,
+                                  chunksize=chunk_size, resumable=True)
+
+    request = drive.files().create(body=metadata, media_body=media, fields="id")
+
+    def next_chunk(http):
+        # After a failure next_chunk() asks the server for the committed
+        # offset and resumes there
+        if http is None:
+            return request.next_chunk()
+        return request.next_chunk(http=http)
+
+    size = media.size()
+    sent = 0
+    response = None
+    while response is None:
+        # Drive chunks are not part of the Sheets quota
+        start = time.perf_counter()
+        _, response = _EXECUTOR.run(next_chunk, rate_limited=False)
+        if _EXECUTOR.tracer is not None:
+            chunk = min(chunk_size, size - sent)
+            _EXECUTOR.tracer.record_call(request, (time.perf_counter() - start) * 1000, response,
+                                         request_bytes=chunk)
+            sent += chunk
+    return response["id"]
+
+# ================= SHEET METADATA =================
+# spreadsheet_id -> {sheet title -> sheet properties}
+_SHEET_METADATA = {}
+# spreadsheet_id -> {range name -> namedRange}
+_NAMED_RANGES = {}
+# spreadsheet_id -> {metadataKey -> metadataValue} (spreadsheet-level only)
+_DEVELOPER_METADATA = {}
+
+def load_sheet_metadata(service, spreadsheet_id):
+    """
+    Returns the title -> properties map for a spreadsheet.
+    Fetched once (sheet properties, named ranges and developer metadata
+    only) and then served from memory.
+    """
+    if spreadsheet_id not in _SHEET_METADATA:
+        spreadsheet = execute(service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields="sheets.properties,namedRanges,developerMetadata"
+        ))
+        _SHEET_METADATA[spreadsheet_id] = {
+            s["properties"]["title"]: s["properties"]
+            for s in spreadsheet.get("sheets", [])
+        }
+        _NAMED_RANGES[spreadsheet_id] = {
+            r["name"]: r for r in spreadsheet.get("namedRanges", [])
+        }
+        _DEVELOPER_METADATA[spreadsheet_id] = {
+            m["metadataKey"]: m.get("metadataValue")
+            for m in spreadsheet.get("developerMetadata", [])
+        }
+    return _SHEET_METADATA[spreadsheet_id]
+
+def get_named_ranges(service, spreadsheet_id):
+    load_sheet_metadata(service, spreadsheet_id)
+    return _NAMED_RANGES[spreadsheet_id]
+
+def get_developer_metadata(service, spreadsheet_id):
+    load_sheet_metadata(service, spreadsheet_id)
+    return _DEVELOPER_METADATA[spreadsheet_id]
+
+def record_batch_replies(spreadsheet_id, replies):
+    """
+    Keeps the cached metadata current after a batchUpdate, from its
+    addSheet, addNamedRange and createDeveloperMetadata replies.
+    """
+    if spreadsheet_id not in _SHEET_METADATA:
+        return
+    for reply in replies:
+        if "addSheet" in reply:
+            props = reply["addSheet"]["properties"]
+            _SHEET_METADATA[spreadsheet_id][props["title"]] = props
+        elif "addNamedRange" in reply:
+            named = reply["addNamedRange"]["namedRange"]
+            _NAMED_RANGES[spreadsheet_id][named["name"]] = named
+        elif "createDeveloperMetadata" in reply:
+            meta = reply["createDeveloperMetadata"]["developerMetadata"]
+            _DEVELOPER_METADATA[spreadsheet_id][meta["metadataKey"]] = meta.get("metadataValue")
+
+def invalidate_sheet_metadata(spreadsheet_id=None):
+    """Drops cached metadata for one spreadsheet, or for all of them."""
+    if spreadsheet_id is None:
+        _SHEET_METADATA.clear()
+        _NAMED_RANGES.clear()
+        _DEVELOPER_METADATA.clear()
+    else:
+        _SHEET_METADATA.pop(spreadsheet_id, None)
+        _NAMED_RANGES.pop(spreadsheet_id, None)
+        _DEVELOPER_METADATA.pop(spreadsheet_id, None)
 
 def get_sheet_id(service, spreadsheet_id, title):
-    spreadsheet = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-    for s in spreadsheet["sheets"]:
-        if s["properties"]["title"] == title:
-            return s["properties"]["sheetId"]
-    raise ValueError("Sheet not found")
+    sheets = load_sheet_metadata(service, spreadsheet_id)
+    if title not in sheets:
+        raise ValueError("Sheet not found")
+    return sheets[title]["sheetId"]
+
+# ================= REQUEST PLAN =================
+# Requests that create something new each time they are applied: a batch
+# holding one is not re-sent after a 5xx or a lost response (see
+# api_executor.retry_status), and an upsert cannot simply replay it
+NON_IDEMPOTENT_REQUESTS = {"addSheet", "addConditionalFormatRule", "addChart", "addNamedRange",
+                           "createDeveloperMetadata"}
+class RequestPlan:
+    """
+    Collects the writes of every dashboard builder and sends them in as few
+    round trips as possible:
+    1. one spreadsheets().batchUpdate for addSheet + all format/rule/chart requests
+    2. one values().batchUpdate for all cell values and formulas
 
-def apply_month_year_formula(service, spreadsheet_id):
-    expenses_id = get_sheet_id(service, spreadsheet_id, "Expenses")
+    Cell formats queued with format() are compacted per sheet (see
+    sheet_styles) and sent with the first batchUpdate.
+
+    Everything queued inside `with plan.section(name):` is also recorded per
+    section, so section_hashes() can tell which parts of the layout changed
+    and replay() can send only those (see upsert_spreadsheet).
+
+    Sheets added through the plan get a client-side sheetId, so later
+    requests in the same batch can reference them before they exist.
+    """
+
+    def __init__(self, service, spreadsheet_id):
+        self.service = service
+        self.spreadsheet_id = spreadsheet_id
+        self.new_sheets = {}     # title -> sheetId assigned by the plan
+        self.structure = []      # addSheet requests, always sent first
+        self.requests = []       # format / rule / chart / validation requests
+        self.values = {}         # A1 range -> values (last write wins)
+        self.formats = {}        # sheet title -> sheet_styles.FormatMap
+        self.sections = {}       # section name -> queued items, in order
+        self._section = None
+
+    @contextlib.contextmanager
+    def section(self, name):
+        outer, self._section = self._section, name
+        self.sections.setdefault(name, [])
+        try:
+            yield self
+        finally:
+            self._section = outer
+
+    def _record(self, *item):
+        if self._section is not None:
+            self.sections[self._section].append(item)
+
+    def add_sheet(self, title):
+        self._record("add_sheet", title)
+        existing = _SHEET_METADATA.get(self.spreadsheet_id, {})
+        if title in existing:
+            # Re-publishing into a workbook that already has the sheet
+            return existing[title]["sheetId"]
+        taken = {p["sheetId"] for p in existing.values()}
+        taken.update(self.new_sheets.values())
+        sheet_id = zlib.crc32(title.encode("utf-8")) & 0x7FFFFFFF
+        while sheet_id in taken:
+            sheet_id = (sheet_id + 1) & 0x7FFFFFFF
+        self.new_sheets[title] = sheet_id
+        self.structure.append(
+            {"addSheet": {"properties": {"title": title, "sheetId": sheet_id}}}
+        )
+        return sheet_id
+
+    def sheet_id(self, title):
+        if title in self.new_sheets:
+            return self.new_sheets[title]
+        return get_sheet_id(self.service, self.spreadsheet_id, title)
+
+    def write(self, range_name, values):
+        self._record("write", range_name, values)
+        self.values[range_name] = values
+
+    def request(self, *requests):
+        for request in requests:
+            self._record("request", request)
+        self.requests.extend(requests)
+
+    def format(self, title, formats):
+        """Queues a declarative {A1 range: userEnteredFormat} map for a sheet."""
+        self._record("format", title, formats)
+        self.formats.setdefault(title, sheet_styles.FormatMap()).update(formats)
+
+    def section_hashes(self):
+        return {
+            name: hashlib.sha1(
+                json.dumps(items, sort_keys=True, default=str).encode("utf-8")
+            ).hexdigest()[:12]
+            for name, items in self.sections.items()
+        }
+
+    def replay(self, names):
+        """A new plan holding only what the given sections queued."""
+        plan = RequestPlan(self.service, self.spreadsheet_id)
+        for name, items in self.sections.items():
+            if name not in names:
+                continue
+            with plan.section(name):
+                for kind, *args in items:
+                    if kind == "add_sheet":
+                        plan.add_sheet(*args)
+                    elif kind == "write":
+                        plan.write(*args)
+                    elif kind == "request":
+                        plan.request(*args)
+                    else:
+                        plan.format(*args)
+        return plan
+
+    def execute(self):
+        requests = self.structure + self.requests
+        for title, formats in self.formats.items():
+            requests += formats.requests(self.sheet_id(title))
+        if requests:
+            # A batch that adds sheets, charts, rules, ... must not be re-sent
+            response = execute(self.service.spreadsheets().batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body={"requests": requests}
+            ), idempotent=not any(NON_IDEMPOTENT_REQUESTS & set(r) for r in requests))
+            record_batch_replies(self.spreadsheet_id, response.get("replies", []))
+
+        if self.values:
+            execute(self.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body={
+                    "valueInputOption": "USER_ENTERED",
+                    "data": [
+                        {"range": r, "values": v} for r, v in self.values.items()
+                    ]
+                }
+            ))
+
+        self.structure, self.requests, self.values, self.formats = [], [], {}, {}
+        self.sections = {}
+
+def apply_month_year_formula(plan, last_row):
+    expenses_id = plan.sheet_id("Expenses")
+
+    # Named ranges (Expenses_Table, Expenses_Amount, ...) sized to the data
+    plan.request(*expense_formulas.named_range_requests(expenses_id, last_row))
 
     requests = [
         # Ensure headers are correct
@@ -136,8 +570,7 @@ def apply_month_year_formula(service, spreadsheet_id):
                 "rows": [{
                     "values": [{
                         "userEnteredValue": {
-                            "formulaValue":
-                            '=ARRAYFORMULA(IF(A2:A="","",TEXT(A2:A,"mmm-yyyy")))'
+                            "formulaValue": expense_formulas.month_formula()
                         }
                     }]
                 }],
@@ -157,8 +590,7 @@ def apply_month_year_formula(service, spreadsheet_id):
                 "rows": [{
                     "values": [{
                         "userEnteredValue": {
-                            "formulaValue":
-                            '=ARRAYFORMULA(IF(A2:A="","",YEAR(A2:A)))'
+                            "formulaValue": expense_formulas.year_formula()
                         }
                     }]
                 }],
@@ -167,128 +599,158 @@ def apply_month_year_formula(service, spreadsheet_id):
         }
     ]
 
-    service.spreadsheets().batchUpdate(
-        spreadsheetId=spreadsheet_id,
-        body={"requests": requests}
-    ).execute()
+    plan.request(*requests)
 
     #service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body={"requests": requests}).execute()
 
-def create_dashboard(service, spreadsheet_id):
-    dashboard_id = None
+def data_version(expenses):
+    """Short content hash of the ledger; changes whenever any row changes."""
+    row_hashes = pd.util.hash_pandas_object(expenses, index=False).values
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()[:12]
 
+def compute_kpi_snapshot(expenses, cube=None):
+    """
+    Computes the three KPI cards locally in one vectorized pass, with the
+    same meaning as the live formulas (current month = month of latest date).
+    Total sums every row, dated or not, like =SUM(Expenses_Amount); the cube
+    is keyed by day, so with one it only answers the current-month range.
+    """
+    typed = expense_schema.to_typed(expenses)
+    paise = typed[expense_schema.AMOUNT_PAISE]
+    dates = typed["Date"]
+
+    if cube is not None:
+        latest = cube.last_day()
+        current_month = cube.total(*rollup_cube.month_bounds(pd.Period(latest, freq="M"))) \
+            if latest else 0
+    else:
+        latest = dates.max()
+        if pd.isna(latest):
+            in_current_month = pd.Series(False, index=typed.index)
+        else:
+            in_current_month = expense_schema.month_period(typed) == latest.to_period("M")
+        current_month = paise[in_current_month].sum()
+    highest = paise.max()
+
+    return {
+        "total": rollup_cube.rupees(paise.sum()),
+        "current_month": rollup_cube.rupees(current_month),
+        "highest": rollup_cube.rupees(0 if pd.isna(highest) else highest),
+        "version": data_version(expenses),
+        "rows": len(expenses)
+    }
+
+# Rollup mode: dimension -> (block the summary is written to, rows incl. header).
+# The blocks are the space the QUERY results had; longer lists end in "Other".
+SUMMARY_BLOCKS = {
+    "Category": ("Dashboard!A5:B18", 14),
+    "Payment Mode": ("Dashboard!D5:E18", 14),
+    "For Whom": ("Dashboard!M20:N35", 16),
+}
+
+def write_summary_block(plan, cube, dimension):
+    """Writes one summary table from the cube, blank-padded over stale rows."""
+    range_name, rows = SUMMARY_BLOCKS[dimension]
+    table = cube.summary(dimension, limit=rows - 1)
+    plan.write(range_name, table + [["", ""]] * (rows - len(table)))
+
+def write_kpi_snapshot(plan, snapshot):
+    """KPI card values (see compute_kpi_snapshot) and the data version they came from."""
+    plan.write("Dashboard!A2:C2", [[
+        snapshot["total"], snapshot["current_month"], snapshot["highest"]
+    ]])
+    plan.write("Dashboard!D1:D2", [
+        ["Snapshot Version"],
+        [f'{snapshot["version"]} ({snapshot["rows"]} rows)']
+    ])
+
+def create_dashboard(plan, snapshot=None, cube=None):
+    """
+    Builds the Dashboard sheet. With a snapshot (see compute_kpi_snapshot)
+    the KPI cards are written as plain values instead of live formulas, and
+    the data version they were computed from is recorded in D1:D2. With a
+    rollup cube the summaries are values too, instead of QUERY rescans.
+    """
     # Create Dashboard sheet
-    service.spreadsheets().batchUpdate(
-        spreadsheetId=spreadsheet_id,
-        body={"requests": [{"addSheet": {"properties": {"title": "Dashboard"}}}]}
-    ).execute()
+    plan.add_sheet("Dashboard")
 
     # ----- KPI: Total Expense -----
-    service.spreadsheets().values().update(
-        spreadsheetId=spreadsheet_id,
-        range="Dashboard!A1",
-        valueInputOption="USER_ENTERED",
-        body={"values": [["Total Expense"]]}
-    ).execute()
-
-    service.spreadsheets().values().update(
-        spreadsheetId=spreadsheet_id,
-        range="Dashboard!A2",
-        valueInputOption="USER_ENTERED",
-        body={"values": [["=SUM(Expenses!G:G)"]]}
-    ).execute()
+    plan.write("Dashboard!A1", [["Total Expense"]])
 
     # ----- KPI: Current Month Total (robust) -----
-    service.spreadsheets().values().update(
-        spreadsheetId=spreadsheet_id,
-        range="Dashboard!B1",
-        valueInputOption="USER_ENTERED",
-        body={"values": [["Current Month Total"]]}
-    ).execute()
-
-    current_month_formula = (
-        '=SUM('
-        'ARRAYFORMULA('
-        'IF('
-        'TEXT(IF(Expenses!A2:A="",,DATEVALUE(Expenses!A2:A)),"mmm-yyyy") = '
-        'TEXT(MAX(IF(Expenses!A2:A="",,DATEVALUE(Expenses!A2:A))),"mmm-yyyy"),'
-        'Expenses!G2:G*1,'
-        '0'
-        ')'
-        ')'
-        ')'
-    )
-
-    service.spreadsheets().values().update(
-        spreadsheetId=spreadsheet_id,
-        range="Dashboard!B2",
-        valueInputOption="USER_ENTERED",
-        body={"values":[[current_month_formula]]}
-    ).execute()
+    plan.write("Dashboard!B1", [["Current Month Total"]])
 
     # ----- KPI: Highest Expense -----
-    service.spreadsheets().values().update(
-        spreadsheetId=spreadsheet_id,
-        range="Dashboard!C1",
-        valueInputOption="USER_ENTERED",
-        body={"values": [["Highest Expense"]]}
-    ).execute()
+    plan.write("Dashboard!C1", [["Highest Expense"]])
 
-    service.spreadsheets().values().update(
-        spreadsheetId=spreadsheet_id,
-        range="Dashboard!C2",
-        valueInputOption="USER_ENTERED",
-        body={"values": [["=MAX(Expenses!G:G)"]]}
-    ).execute()
+    if snapshot:
+        write_kpi_snapshot(plan, snapshot)
+    else:
+        plan.write("Dashboard!A2", [[expense_formulas.total_expense()]])
+        plan.write("Dashboard!B2", [[expense_formulas.current_month_total()]])
+        plan.write("Dashboard!C2", [[expense_formulas.highest_expense()]])
 
-    # ----- Category Summary -----
-    service.spreadsheets().values().update(
-        spreadsheetId=spreadsheet_id,
-        range="Dashboard!A5",
-        valueInputOption="USER_ENTERED",
-        body={"values": [[
-            '=QUERY(Expenses!A:R,'
-            '"select D,sum(G) where A is not null '
-            'group by D order by sum(G) desc '
-            'label D \'Category\', sum(G) \'Amount\'")'
+    if cube is not None:
+        write_summary_block(plan, cube, "Category")
+        write_summary_block(plan, cube, "Payment Mode")
+        return
 
-        ]]}
-    ).execute()
+    # ----- Category Summary -----
+    plan.write("Dashboard!A5", [[expense_formulas.summary_query("D", "Category")]])
 
     # ----- Payment Mode Summary -----
-    service.spreadsheets().values().update(
-        spreadsheetId=spreadsheet_id,
-        range="Dashboard!D5",
-        valueInputOption="USER_ENTERED",
-        body={"values": [[
-            '=QUERY(Expenses!A:R,'
-            '"select H,sum(G) where A is not null '
-            'group by H order by sum(G) desc '
-            'label H \'Payment Mode\', sum(G) \'Amount\'")'
+    plan.write("Dashboard!D5", [[expense_formulas.summary_query("H", "Payment Mode")]])
 
-        ]]}
-    ).execute()
 
 
+def create_monthly_sheet(plan, month, formula=True):
+    plan.add_sheet(month)
 
-def create_monthly_sheet(service, spreadsheet_id, month):
-    service.spreadsheets().batchUpdate(
-        spreadsheetId=spreadsheet_id,
-        body={"requests":[{"addSheet":{"properties":{"title":month}}}]}
-    ).execute()
+    if formula:
+        plan.write(f"{month}!A1", [[expense_formulas.monthly_summary(month)]])
 
-    service.spreadsheets().values().update(
-        spreadsheetId=spreadsheet_id,
-        range=f"{month}!A1",
-        valueInputOption="USER_ENTERED",
-        body={"values":[[
-        f'=QUERY(Expenses!A:R,"select D,sum(G) where B=\'{month}\' group by D label sum(G) \'Total Amount\'")'
-        ]]}
+def ledger_months(expenses):
+    """Month labels (Jan-2026) of the ledger, oldest first."""
+    typed = expense_schema.to_typed(expenses)
+    periods = expense_schema.month_period(typed).dropna().unique()
+    return [p.strftime(expense_schema.MONTH_FORMAT) for p in sorted(periods)]
 
-    ).execute()
+def create_monthly_sheets(plan, expenses, formula=True):
+    """
+    Queues a summary tab for every month in the ledger that does not have
+    one yet, so all of them go out in the plan's single batchUpdate and
+    single values().batchUpdate. Returns the months added. formula=False
+    adds bare tabs for write_monthly_summaries to fill.
+    """
+    existing = set(load_sheet_metadata(plan.service, plan.spreadsheet_id)) | set(plan.new_sheets)
+    missing = [m for m in ledger_months(expenses) if m not in existing]
+    for month in missing:
+        create_monthly_sheet(plan, month, formula)
+    return missing
+
+def write_monthly_summaries(plan, cube, months):
+    """Rollup mode: each month tab cleared and rewritten with its category totals."""
+    for month in months:
+        plan.request({"updateCells": {"range": {"sheetId": plan.sheet_id(month)},
+                                      "fields": "userEnteredValue"}})
+        plan.write(f"{month}!A1", cube.month_summary(month))
+
+def write_rollup_summaries(plan, cube, monthly_sheets=False, expenses=None):
+    """
+    Sync mode: refreshes every summary written from the cube (the Dashboard
+    blocks and, with monthly_sheets, all month tabs, adding missing ones).
+    Returns the months added.
+    """
+    for dimension in SUMMARY_BLOCKS:
+        write_summary_block(plan, cube, dimension)
+    if not monthly_sheets:
+        return []
+    months = create_monthly_sheets(plan, expenses, formula=False)
+    write_monthly_summaries(plan, cube, ledger_months(expenses))
+    return months
 
-def highlight_highest_expense(service, spreadsheet_id):
-    expenses_id = get_sheet_id(service, spreadsheet_id, "Expenses")
+def highlight_highest_expense(plan, last_row):
+    expenses_id = plan.sheet_id("Expenses")
 
     request = {
         "addConditionalFormatRule": {
@@ -296,13 +758,14 @@ def highlight_highest_expense(service, spreadsheet_id):
                 "ranges": [{
                     "sheetId": expenses_id,
                     "startRowIndex": 1,
+                    "endRowIndex": last_row,
                     "endColumnIndex": 18
                 }],
                 "booleanRule": {
                     "condition": {
                         "type": "CUSTOM_FORMULA",
                         "values": [{
-                            "userEnteredValue": '=G2=MAX($G$2:$G)'
+                            "userEnteredValue": expense_formulas.highest_expense_rule(last_row)
                         }]
                     },
                     "format": {
@@ -318,54 +781,128 @@ def highlight_highest_expense(service, spreadsheet_id):
         }
     }
 
-    service.spreadsheets().batchUpdate(
-        spreadsheetId=spreadsheet_id,
-        body={"requests":[request]}
-    ).execute()
+    plan.request(request)
 
+def reset_backgrounds(grid_range):
+    """repeatCell request that removes the background colour of a range."""
+    return {
+        "repeatCell": {
+            "range": grid_range,
+            "cell": {"userEnteredFormat": {}},
+            "fields": "userEnteredFormat.backgroundColor"
+        }
+    }
 
-# ================= BUDGET =================
-def add_budget_actual_helper(service, spreadsheet_id):
-    formula = (
-        '=QUERY({Expenses!D2:D, '
-        'ARRAYFORMULA(IF(Expenses!B2:B = LOOKUP(2,1/(Expenses!B2:B<>""),Expenses!B2:B), '
-        'Expenses!G2:G, 0))},'
-        '"select Col1, sum(Col2) '
-        'where Col2 > 0 '
-        'group by Col1 '
-        'label Col1 \'Category\', sum(Col2) \'Actual\'", 0)'
-    )
+def expense_rows_range(expenses_id):
+    """Every Expenses row below the header, A:R, open-ended."""
+    return {"sheetId": expenses_id, "startRowIndex": 1, "endColumnIndex": 18}
 
-    service.spreadsheets().values().update(
-        spreadsheetId=spreadsheet_id,
-        range="Dashboard!J20",
-        valueInputOption="USER_ENTERED",
-        body={"values": [[formula]]}
-    ).execute()
+def apply_expense_flags(plan, flags, sheet_rows=None, clear=False):
+    """
+    Precomputed-flags mode: colours only the flagged Expenses rows (see
+    expense_flags) instead of adding the per-cell custom-formula rules.
+    `clear` first resets the row backgrounds, so a refresh drops old flags.
+    """
+    expenses_id = plan.sheet_id("Expenses")
+    if clear:
+        plan.request(reset_backgrounds(expense_rows_range(expenses_id)))
+    plan.format("Expenses", expense_flags.flag_formats(flags, sheet_rows))
 
 
-def add_budget_vs_actual(service, spreadsheet_id):
+# ================= BUDGET =================
+def clear_budget_tables(plan):
+    """
+    Clears the Budget vs Actual table (Dashboard!A20:E) and the actuals
+    helper (J20:K) before they are rewritten, so a shorter table or a
+    switch between formula and engine mode leaves no stale rows behind.
+    """
+    dashboard_id = plan.sheet_id("Dashboard")
+    for first, last in ((0, 5), (9, 11)):
+        plan.request({
+            "updateCells": {
+                "range": {
+                    "sheetId": dashboard_id,
+                    "startRowIndex": 19,
+                    "startColumnIndex": first,
+                    "endColumnIndex": last
+                },
+                "fields": "userEnteredValue"
+            }
+        })
+
+def add_budget_actual_helper(plan, cube=None):
+    """
+    The current month's actual per category at Dashboard!J20, looked up by
+    the Budget vs Actual formula (Budget_Actual). With a rollup cube they
+    are values (current month = month of the latest date, as in the KPI
+    snapshot), blank-padded over the named range; otherwise a QUERY.
+    """
+    if cube is None:
+        plan.write("Dashboard!J20", [[expense_formulas.budget_actual_helper()]])
+        return
+
+    rows = []
+    latest = cube.last_day()
+    if latest:
+        month = rollup_cube.month_bounds(pd.Period(latest, freq="M"))
+        rows = [[category, rollup_cube.rupees(paise)]
+                for category, paise in sorted(cube.breakdown("Category", *month).items())
+                if paise > 0][:expense_formulas.ACTUAL_ROWS]
+    last = expense_formulas.ACTUAL_FIRST_ROW + expense_formulas.ACTUAL_ROWS - 1
+    plan.write(f"Dashboard!J20:K{last}", [["Category", "Actual"]] + rows
+               + [["", ""]] * (expense_formulas.ACTUAL_ROWS - len(rows)))
+
+
+def add_budget_vs_actual(plan, budget_last_row):
     """
     Adds a Budget vs Actual table in Dashboard!A20:E
     Automatically calculates Variance
     """
-    formula = (
-        '=ARRAYFORMULA(IF(LEN(Monthly_Budget!B2:B), '
-        ' {Monthly_Budget!B2:B, Monthly_Budget!C2:C, '
-        ' IFERROR(VLOOKUP(Monthly_Budget!B2:B, J20:I, 2, FALSE), 0), '
-        ' Monthly_Budget!C2:C - IFERROR(VLOOKUP(Monthly_Budget!B2:B, J20:I, 2, FALSE), 0)}, '
-        ' ""))'
-    )
+    # Named ranges sized to the Monthly_Budget rows, like the Expenses ones
+    plan.request(*expense_formulas.budget_named_range_requests(
+        plan.sheet_id("Monthly_Budget"), plan.sheet_id("Dashboard"), budget_last_row
+    ))
+    plan.write("Dashboard!A20", [[expense_formulas.budget_vs_actual()]])
 
-    service.spreadsheets().values().update(
-        spreadsheetId=spreadsheet_id,
-        range="Dashboard!A20",
-        valueInputOption="USER_ENTERED",
-        body={"values": [[formula]]}
-    ).execute()
-    
-def highlight_budget_overrun(service, spreadsheet_id):
-    dashboard_id = get_sheet_id(service, spreadsheet_id, "Dashboard")
+def add_budget_variance_table(plan, table):
+    """
+    Writes the engine's Budget vs Actual table (every month, see
+    budget_engine.variance_table) as plain values at Dashboard!A20:E.
+    """
+    values = [budget_engine.VARIANCE_COLUMNS] + [
+        [_cell_value(v) for v in row] for row in table.itertuples(index=False, name=None)
+    ]
+    plan.write("Dashboard!A20", values)
+
+def highlight_budget_overrun(plan, table=None):
+    dashboard_id = plan.sheet_id("Dashboard")
+
+    overrun_format = {
+        "backgroundColor": {
+            "red": 1.0,
+            "green": 0.85,
+            "blue": 0.85
+        }
+    }
+
+    # The engine table's Variance column (E21:E) is reset in both modes, so
+    # a re-publish drops old overruns, also below a table that shrank or
+    # after a switch back to the formula table
+    plan.request(reset_backgrounds({
+        "sheetId": dashboard_id,
+        "startRowIndex": 20,
+        "startColumnIndex": 4,
+        "endColumnIndex": 5
+    }))
+
+    # Engine mode: the overruns are already known, format just those cells
+    # (consecutive overruns are merged into one request by the plan)
+    if table is not None:
+        plan.format("Dashboard", {
+            f"E{21 + i}": overrun_format        # Variance column, below the row 20 header
+            for i in table.index[table["Variance"] < 0]
+        })
+        return
 
     rule = {
         "addConditionalFormatRule": {
@@ -381,139 +918,42 @@ def highlight_budget_overrun(service, spreadsheet_id):
                         "type": "NUMBER_LESS",
                         "values": [{"userEnteredValue": "0"}]
                     },
-                    "format": {
-                        "backgroundColor": {
-                            "red": 1.0,
-                            "green": 0.85,
-                            "blue": 0.85
-                        }
-                    }
+                    "format": overrun_format
                 }
             },
             "index": 3
         }
     }
 
-    service.spreadsheets().batchUpdate(
-        spreadsheetId=spreadsheet_id,
-        body={"requests":[rule]}
-    ).execute()
+    plan.request(rule)
 
-def add_dashboard_section_titles(service, spreadsheet_id):
-    dashboard_id = get_sheet_id(service, spreadsheet_id, "Dashboard")
-
-    requests = [
+SECTION_TITLE_FORMAT = {"textFormat": {"bold": True, "fontSize": 13}}
 
-        # ===== Category Summary Title =====
-        {
-            "repeatCell": {
-                "range": {
-                    "sheetId": dashboard_id,
-                    "startRowIndex": 3,   # A4
-                    "endRowIndex": 4,
-                    "startColumnIndex": 0,
-                    "endColumnIndex": 2
-                },
-                "cell": {
-                    "userEnteredFormat": {
-                        "textFormat": {
-                            "bold": True,
-                            "fontSize": 13
-                        }
-                    }
-                },
-                "fields": "userEnteredFormat.textFormat"
-            }
-        },
-
-        # ===== Payment Mode Summary Title =====
-        {
-            "repeatCell": {
-                "range": {
-                    "sheetId": dashboard_id,
-                    "startRowIndex": 3,   # D4
-                    "endRowIndex": 4,
-                    "startColumnIndex": 3,
-                    "endColumnIndex": 5
-                },
-                "cell": {
-                    "userEnteredFormat": {
-                        "textFormat": {
-                            "bold": True,
-                            "fontSize": 13
-                        }
-                    }
-                },
-                "fields": "userEnteredFormat.textFormat"
-            }
-        },
+DASHBOARD_TITLE_FORMATS = {
+    "A4:B4": SECTION_TITLE_FORMAT,      # Category Summary Title
+    "D4:E4": SECTION_TITLE_FORMAT,      # Payment Mode Summary Title
+    "A19:D19": SECTION_TITLE_FORMAT,    # Budget vs Actual Title
+}
 
-        # ===== Budget vs Actual Title =====
-        {
-            "repeatCell": {
-                "range": {
-                    "sheetId": dashboard_id,
-                    "startRowIndex": 18,  # A19
-                    "endRowIndex": 19,
-                    "startColumnIndex": 0,
-                    "endColumnIndex": 4
-                },
-                "cell": {
-                    "userEnteredFormat": {
-                        "textFormat": {
-                            "bold": True,
-                            "fontSize": 13
-                        }
-                    }
-                },
-                "fields": "userEnteredFormat.textFormat"
-            }
-        }
-    ]
+def add_dashboard_section_titles(plan, all_months=False):
+    plan.format("Dashboard", DASHBOARD_TITLE_FORMATS)
 
     # Write the actual title text
-    service.spreadsheets().values().batchUpdate(
-        spreadsheetId=spreadsheet_id,
-        body={
-            "valueInputOption": "USER_ENTERED",
-            "data": [
-                {
-                    "range": "Dashboard!A4",
-                    "values": [["Expense by Category"]]
-                },
-                {
-                    "range": "Dashboard!D4",
-                    "values": [["Expense by Payment Mode"]]
-                },
-                {
-                    "range": "Dashboard!A19",
-                    "values": [["Budget vs Actual (Current Month)"]]
-                }
-            ]
-        }
-    ).execute()
-
-    service.spreadsheets().batchUpdate(
-        spreadsheetId=spreadsheet_id,
-        body={"requests": requests}
-    ).execute()
-
-def add_for_whom_summary(service, spreadsheet_id):
-    service.spreadsheets().values().update(
-        spreadsheetId=spreadsheet_id,
-        range="Dashboard!M20",
-        valueInputOption="USER_ENTERED",
-        body={"values":[[
-            '=QUERY(Expenses!A:R,'
-            '"select K, sum(G) where A is not null '
-            'group by K order by sum(G) desc '
-            'label K \'For Whom\', sum(G) \'Amount\'")'
-
-        ]]}
-    ).execute()
-
-def add_dashboard_charts(service, spreadsheet_id):
-    dashboard_id = get_sheet_id(service, spreadsheet_id, "Dashboard")
+    plan.write("Dashboard!A4", [["Expense by Category"]])
+    plan.write("Dashboard!D4", [["Expense by Payment Mode"]])
+    if all_months:
+        plan.write("Dashboard!A19", [["Budget vs Actual (All Months)"]])
+    else:
+        plan.write("Dashboard!A19", [["Budget vs Actual (Current Month)"]])
+
+def add_for_whom_summary(plan, cube=None):
+    if cube is not None:
+        write_summary_block(plan, cube, "For Whom")
+    else:
+        plan.write("Dashboard!M20", [[expense_formulas.summary_query("K", "For Whom")]])
+
+def add_dashboard_charts(plan):
+    dashboard_id = plan.sheet_id("Dashboard")
 
     requests = [
 
@@ -662,31 +1102,24 @@ def add_dashboard_charts(service, spreadsheet_id):
         }
     ]
 
-    service.spreadsheets().batchUpdate(
-        spreadsheetId=spreadsheet_id,
-        body={"requests": requests}
-    ).execute()
+    # Fixed ids, derived from the title like the plan's sheetIds, so an
+    # upsert can delete and re-add the charts (see section_objects)
+    for request in requests:
+        chart = request["addChart"]["chart"]
+        chart["chartId"] = zlib.crc32(chart["spec"]["title"].encode("utf-8")) & 0x7FFFFFFF
 
-def add_highest_expense_value(service, spreadsheet_id):
+    plan.request(*requests)
+
+def add_highest_expense_value(plan):
     # Label
-    service.spreadsheets().values().update(
-        spreadsheetId=spreadsheet_id,
-        range="Dashboard!C1",
-        valueInputOption="USER_ENTERED",
-        body={"values":[["Highest Expense"]]}
-    ).execute()
+    plan.write("Dashboard!C1", [["Highest Expense"]])
 
     # Value
-    service.spreadsheets().values().update(
-        spreadsheetId=spreadsheet_id,
-        range="Dashboard!C2",
-        valueInputOption="USER_ENTERED",
-        body={"values":[["=MAX(Expenses!G:G)"]]}
-    ).execute()
+    plan.write("Dashboard!C2", [[expense_formulas.highest_expense()]])
 
 
-def apply_conditional_formatting(service, spreadsheet_id):
-    expenses_id = get_sheet_id(service, spreadsheet_id, "Expenses")
+def apply_conditional_formatting(plan, last_row):
+    expenses_id = plan.sheet_id("Expenses")
 
     requests = [
         # Overspend highlight (Amount > 5000)
@@ -696,6 +1129,7 @@ def apply_conditional_formatting(service, spreadsheet_id):
                     "ranges": [{
                         "sheetId": expenses_id,
                         "startRowIndex": 1,
+                        "endRowIndex": last_row,
                         "startColumnIndex": 6,
                         "endColumnIndex": 7
                     }],
@@ -724,14 +1158,14 @@ def apply_conditional_formatting(service, spreadsheet_id):
                     "ranges": [{
                         "sheetId": expenses_id,
                         "startRowIndex": 1,
+                        "endRowIndex": last_row,
                         "endColumnIndex": 7
                     }],
                     "booleanRule": {
                         "condition": {
                             "type": "CUSTOM_FORMULA",
                             "values": [{
-                                "userEnteredValue":
-                                '=OR($A2="", $D2="", $G2="")'
+                                "userEnteredValue": expense_formulas.missing_fields_rule()
                             }]
                         },
                         "format": {
@@ -748,13 +1182,16 @@ def apply_conditional_formatting(service, spreadsheet_id):
         }
     ]
 
-    service.spreadsheets().batchUpdate(
-        spreadsheetId=spreadsheet_id,
-        body={"requests": requests}
-    ).execute()
+    plan.request(*requests)
 
-def add_dropdowns(service, spreadsheet_id):
-    expenses_id = get_sheet_id(service, spreadsheet_id, "Expenses")
+def add_dropdowns(plan, last_row, reference=None):
+    """
+    Dropdowns on the Expenses columns. With a reference index
+    (expense_validation.ReferenceIndex) the Category, Sub-Category,
+    Payment Mode, Account and Paid By lists come from the reference tables,
+    the same values the pre-upload validation accepts.
+    """
+    expenses_id = plan.sheet_id("Expenses")
 
     def list_dropdown(col_index, values):
         return {
@@ -762,6 +1199,7 @@ def add_dropdowns(service, spreadsheet_id):
                 "range": {
                     "sheetId": expenses_id,
                     "startRowIndex": 1,
+                    "endRowIndex": last_row,
                     "startColumnIndex": col_index,
                     "endColumnIndex": col_index + 1
                 },
@@ -776,12 +1214,17 @@ def add_dropdowns(service, spreadsheet_id):
             }
         }
 
+    def values_for(column, default):
+        if reference is None:
+            return default
+        return reference.dropdown_values(column) or default
+
     requests = [
-        list_dropdown(3,  ["Food","Transport","Health","Utilities","Rent","Education","Loans","Shopping","Travel","Entertainment","Savings","Investment"]),
-        list_dropdown(4,  ["Groceries","Dining","Fuel","Medicines","Electricity","Internet","EMI","Fees","Flight","Hotel","Shopping","Insurance"]),
-        list_dropdown(7,  ["Cash","UPI","Credit Card","Debit Card","Bank Transfer"]),
-        list_dropdown(8,  ["Cash","Navi","PhonePe","Paytm","SBI","Kotak811","CRED","Imobile"]),
-        list_dropdown(9,  ["Chandru","Karthi","Appa","Amma","Pothu"]),
+        list_dropdown(3,  values_for("Category", ["Food","Transport","Health","Utilities","Rent","Education","Loans","Shopping","Travel","Entertainment","Savings","Investment"])),
+        list_dropdown(4,  values_for("Sub-Category", ["Groceries","Dining","Fuel","Medicines","Electricity","Internet","EMI","Fees","Flight","Hotel","Shopping","Insurance"])),
+        list_dropdown(7,  values_for("Payment Mode", ["Cash","UPI","Credit Card","Debit Card","Bank Transfer"])),
+        list_dropdown(8,  values_for("Account", ["Cash","Navi","PhonePe","Paytm","SBI","Kotak811","CRED","Imobile"])),
+        list_dropdown(9,  values_for("Paid By", ["Chandru","Karthi","Appa","Amma","Pothu"])),
         list_dropdown(10, ["Self","Appa","Amma","Thambi","Anna","Anni","Family","Friends"]),
         list_dropdown(11, ["Essential","Discretionary","Savings","Investment","Loan"]),
         list_dropdown(12, ["One-time","Daily","Weekly","Monthly","Quarterly","Yearly"]),
@@ -791,205 +1234,819 @@ def add_dropdowns(service, spreadsheet_id):
         list_dropdown(16, ["Personal","Family","Office","Medical","Travel","Emergency","Education","Tax"])
     ]
 
-    service.spreadsheets().batchUpdate(
+    plan.request(*requests)
+
+TOTAL_EXPENSE_CARD_FORMATS = {
+    # ===== TOTAL EXPENSE (A1:A2) =====
+    "A1": {"textFormat": {"bold": True, "fontSize": 14}},
+    "A2": {
+        "textFormat": {"bold": True, "fontSize": 18},
+        "backgroundColor": {"red": 0.90, "green": 0.96, "blue": 0.90}
+    },
+
+    # ===== CURRENT MONTH TOTAL (B1:B2) – STRONG HIGHLIGHT =====
+    "B1": {"textFormat": {"bold": True, "fontSize": 15}},
+    "B2": {
+        "textFormat": {"bold": True, "fontSize": 26},
+        "backgroundColor": {"red": 0.98, "green": 0.90, "blue": 0.80}
+    },
+
+    # ===== HIGHEST EXPENSE (C1:C2) – WARNING STYLE =====
+    "C1": {"textFormat": {"bold": True, "fontSize": 14}},
+    "C2": {
+        "textFormat": {"bold": True, "fontSize": 18},
+        "backgroundColor": {"red": 0.98, "green": 0.88, "blue": 0.88}
+    },
+}
+
+def format_total_expense_card(plan):
+    # Six cells, two requests: one updateCells per row of the card
+    plan.format("Dashboard", TOTAL_EXPENSE_CARD_FORMATS)
+
+
+
+# ================= INCREMENTAL SYNC =================
+# Columns that identify an expense row. Month / Year (B, C) are derived by
+# the ARRAYFORMULAs in row 2, so they are never compared or written.
+SYNC_KEY_COLUMNS = ["Date", "Description", "Account", "Paid By"]
+
+def _cell_text(value):
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return ""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+def _cell_value(value):
+    """Converts a DataFrame cell into a JSON-safe value for the Sheets API."""
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return ""
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+def _row_fingerprints(rows, columns, sheet_values=False):
+    """
+    Yields (key, content) for each row. The key repeats SYNC_KEY_COLUMNS plus
+    an occurrence counter, so two identical EMIs on the same day stay distinct.
+    Dates compare as yyyy-mm-dd; sheet_values=True for rows read from the
+    sheet, whose dates are serial numbers (read_remote_expenses).
+    """
+    key_idx = [columns.index(c) for c in SYNC_KEY_COLUMNS]
+    date_idx = columns.index("Date")
+    skip = {columns.index(c) for c in expense_schema.DERIVED_COLUMNS}
+    rows = [list(row[:len(columns)]) + [""] * (len(columns) - len(row)) for row in rows]
+    raw_dates = [row[date_idx] for row in rows]
+    parse = expense_schema.sheet_dates if sheet_values else expense_schema.parse_dates
+    dates = parse(raw_dates).dt.strftime("%Y-%m-%d") if rows else []
+    seen = {}
+    for row, date in zip(rows, dates):
+        texts = [_cell_text(v) for v in row]
+        if isinstance(date, str):       # unparseable dates compare as typed
+            texts[date_idx] = date
+        base = tuple(texts[i] for i in key_idx)
+        seen[base] = seen.get(base, 0) + 1
+        content = tuple(t for i, t in enumerate(texts) if i not in skip)
+        yield base + (seen[base],), content
+
+def read_remote_expenses(service, spreadsheet_id):
+    """
+    Expenses rows below the header, dates as serial numbers so the sheet's
+    locale (dd/mm or mm/dd display) cannot change how they are read. Trailing
+    rows holding nothing but the Month / Year formula output are dropped, so
+    len(rows) + 2 is the first free sheet row.
+    """
+    result = execute(service.spreadsheets().values().get(
         spreadsheetId=spreadsheet_id,
-        body={"requests": requests}
-    ).execute()
-
-def format_total_expense_card(service, spreadsheet_id):
-    dashboard_id = get_sheet_id(service, spreadsheet_id, "Dashboard")
-
-    requests = [
-
-        # ===== TOTAL EXPENSE (A1:A2) =====
-        {
-            "repeatCell": {
-                "range": {
-                    "sheetId": dashboard_id,
-                    "startRowIndex": 0,
-                    "endRowIndex": 1,
-                    "startColumnIndex": 0,
-                    "endColumnIndex": 1
-                },
-                "cell": {
-                    "userEnteredFormat": {
-                        "textFormat": {
-                            "bold": True,
-                            "fontSize": 14
-                        }
-                    }
-                },
-                "fields": "userEnteredFormat.textFormat"
-            }
-        },
-        {
-            "repeatCell": {
-                "range": {
-                    "sheetId": dashboard_id,
-                    "startRowIndex": 1,
-                    "endRowIndex": 2,
-                    "startColumnIndex": 0,
-                    "endColumnIndex": 1
-                },
-                "cell": {
-                    "userEnteredFormat": {
-                        "textFormat": {
-                            "bold": True,
-                            "fontSize": 18
-                        },
-                        "backgroundColor": {
-                            "red": 0.90,
-                            "green": 0.96,
-                            "blue": 0.90
-                        }
-                    }
-                },
-                "fields": "userEnteredFormat(textFormat,backgroundColor)"
-            }
-        },
-
-        # ===== CURRENT MONTH TOTAL (B1:B2) – STRONG HIGHLIGHT =====
-        {
-            "repeatCell": {
-                "range": {
-                    "sheetId": dashboard_id,
-                    "startRowIndex": 0,
-                    "endRowIndex": 1,
-                    "startColumnIndex": 1,
-                    "endColumnIndex": 2
-                },
-                "cell": {
-                    "userEnteredFormat": {
-                        "textFormat": {
-                            "bold": True,
-                            "fontSize": 15
-                        }
-                    }
-                },
-                "fields": "userEnteredFormat.textFormat"
-            }
-        },
-        {
-            "repeatCell": {
-                "range": {
-                    "sheetId": dashboard_id,
-                    "startRowIndex": 1,
-                    "endRowIndex": 2,
-                    "startColumnIndex": 1,
-                    "endColumnIndex": 2
-                },
-                "cell": {
-                    "userEnteredFormat": {
-                        "textFormat": {
-                            "bold": True,
-                            "fontSize": 26
-                        },
-                        "backgroundColor": {
-                            "red": 0.98,
-                            "green": 0.90,
-                            "blue": 0.80
-                        }
-                    }
-                },
-                "fields": "userEnteredFormat(textFormat,backgroundColor)"
-            }
-        },
+        range="Expenses!A2:R",
+        valueRenderOption="UNFORMATTED_VALUE",
+        dateTimeRenderOption="SERIAL_NUMBER"
+    ))
+    rows = result.get("values", [])
+    derived = {expense_schema.EXPENSE_COLUMNS.index(c) for c in expense_schema.DERIVED_COLUMNS}
+    while rows and all(v in ("", None) for i, v in enumerate(rows[-1]) if i not in derived):
+        rows.pop()
+    return rows
+
+def diff_expenses(expenses, remote_rows):
+    """
+    Compares the local DataFrame with the rows already in the sheet.
+    Returns (new_rows, changed) where changed maps sheet row number -> row.
+    Rows that only exist remotely are left alone.
+    """
+    columns = list(expenses.columns)
+    remote = {}
+    for offset, (key, content) in enumerate(_row_fingerprints(remote_rows, columns, True)):
+        remote[key] = (offset + 2, content)      # data starts at sheet row 2
+
+    derived = {columns.index(c) for c in expense_schema.DERIVED_COLUMNS}
+    local_rows = expenses.astype(object).values.tolist()
+
+    new_rows, changed = [], {}
+    for row, (key, content) in zip(local_rows, _row_fingerprints(local_rows, columns)):
+        # None cells are skipped by the API, keeping the Month/Year formulas intact
+        values = [None if i in derived else _cell_value(v) for i, v in enumerate(row)]
+        if key not in remote:
+            new_rows.append(values)
+        elif remote[key][1] != content:
+            changed[remote[key][0]] = values
+    return new_rows, changed
+
+def regrow_expense_rules(service, spreadsheet_id, expenses_id, old_last_row, last_row):
+    """
+    Requests that move the Expenses dropdowns and conditional-format rules
+    from old_last_row to last_row. Both are read back from the sheet (the
+    rules, and the validations of row 2), so the sheet keeps whatever it
+    was published with; the highest-expense rule also gets its literal
+    $G$2:$G$<last_row> rewritten.
+    """
+    spreadsheet = execute(service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        ranges=["Expenses!A2:R2"],
+        fields="sheets(properties.sheetId,conditionalFormats,data.rowData.values.dataValidation)"
+    ))
+    sheet = next((s for s in spreadsheet.get("sheets", [])
+                  if s.get("properties", {}).get("sheetId") == expenses_id), {})
+
+    requests = []
+    old_highest = expense_formulas.highest_expense_rule(old_last_row)
+    for index, rule in enumerate(sheet.get("conditionalFormats", [])):
+        ranges = [r for r in rule.get("ranges", []) if "endRowIndex" in r]
+        if not ranges:
+            continue        # open-ended rules already cover new rows
+        rule = copy.deepcopy(rule)
+        for grid in rule["ranges"]:
+            if "endRowIndex" in grid:
+                grid["endRowIndex"] = last_row
+        for value in rule.get("booleanRule", {}).get("condition", {}).get("values", []):
+            if value.get("userEnteredValue") == old_highest:
+                value["userEnteredValue"] = expense_formulas.highest_expense_rule(last_row)
+        requests.append({"updateConditionalFormatRule": {
+            "index": index, "sheetId": expenses_id, "rule": rule
+        }})
+
+    rows = (sheet.get("data") or [{}])[0].get("rowData") or [{}]
+    for column, cell in enumerate(rows[0].get("values", [])):
+        if "dataValidation" in cell:
+            requests.append({"setDataValidation": {
+                "range": {"sheetId": expenses_id, "startRowIndex": 1, "endRowIndex": last_row,
+                          "startColumnIndex": column, "endColumnIndex": column + 1},
+                "rule": cell["dataValidation"]
+            }})
+    return requests
+
+def resize_expense_ranges(service, spreadsheet_id, row_count):
+    """
+    Once the ledger outgrows the margin, moves everything sized to the old
+    extent in one batchUpdate: the Expenses named ranges, and the dropdowns
+    and rules (see regrow_expense_rules), so new rows are validated,
+    highlighted and counted in the MAX.
+    """
+    named = get_named_ranges(service, spreadsheet_id)
+    table = named.get(expense_formulas.TABLE_RANGE)
+    if not table:
+        return
+    old_last_row = table["range"].get("endRowIndex", 0)
+    if not expense_formulas.needs_resize(row_count, old_last_row):
+        return
 
-        # ===== HIGHEST EXPENSE (C1:C2) – WARNING STYLE =====
-        {
-            "repeatCell": {
-                "range": {
-                    "sheetId": dashboard_id,
-                    "startRowIndex": 0,
-                    "endRowIndex": 1,
-                    "startColumnIndex": 2,
-                    "endColumnIndex": 3
-                },
-                "cell": {
-                    "userEnteredFormat": {
-                        "textFormat": {
-                            "bold": True,
-                            "fontSize": 14
-                        }
-                    }
-                },
-                "fields": "userEnteredFormat.textFormat"
+    expenses_id = get_sheet_id(service, spreadsheet_id, "Expenses")
+    last_row = expense_formulas.extent_for(row_count)
+    requests = expense_formulas.resize_requests(
+        expenses_id,
+        last_row,
+        {name: r["namedRangeId"] for name, r in named.items()}
+    )
+    requests += regrow_expense_rules(service, spreadsheet_id, expenses_id, old_last_row, last_row)
+    execute(service.spreadsheets().batchUpdate(
+        spreadsheetId=spreadsheet_id,
+        body={"requests": requests}
+    ))
+    invalidate_sheet_metadata(spreadsheet_id)
+
+def sheet_rows_after_sync(expenses, remote_rows):
+    """Sheet row of every local expense once sync_expenses has written the new ones."""
+    columns = list(expenses.columns)
+    remote = {key: offset + 2 for offset, (key, _) in
+              enumerate(_row_fingerprints(remote_rows, columns, True))}
+    next_row = len(remote_rows) + 2
+    rows = []
+    for key, _ in _row_fingerprints(expenses.astype(object).values.tolist(), columns):
+        if key not in remote:
+            remote[key] = next_row
+            next_row += 1
+        rows.append(remote[key])
+    return rows
+
+def sync_expenses(service, spreadsheet_id, expenses, remote_rows=None):
+    """
+    Sends only new or changed Expenses rows to an existing spreadsheet in
+    one values.batchUpdate: changed rows as targeted range updates, new rows
+    written below the last remote row (the rows sheet_rows_after_sync
+    assumes). Writing to explicit rows rather than appending keeps the call
+    idempotent and does not depend on the API's table detection, which the
+    Month / Year formula output can throw off. remote_rows (from
+    read_remote_expenses) saves the read when known.
+    """
+    if remote_rows is None:
+        remote_rows = read_remote_expenses(service, spreadsheet_id)
+    new_rows, changed = diff_expenses(expenses, remote_rows)
+
+    data = [{"range": f"Expenses!A{n}:R{n}", "values": [row]}
+            for n, row in sorted(changed.items())]
+    if new_rows:
+        first = len(remote_rows) + 2
+        data.append({"range": f"Expenses!A{first}:R{first + len(new_rows) - 1}",
+                     "values": new_rows})
+    if data:
+        execute(service.spreadsheets().values().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={"valueInputOption": "USER_ENTERED", "data": data}
+        ))
+
+    if new_rows:
+        resize_expense_ranges(service, spreadsheet_id, len(remote_rows) + len(new_rows))
+
+    return len(new_rows), len(changed)
+
+
+# ================= UPSERT =================
+# Local cache of the published spreadsheet per (name, folder)
+PUBLISH_STATE_FILE = "publish_state.json"
+# Developer metadata on the spreadsheet: content hashes of what was published
+PUBLISH_METADATA_KEY = "family_expense_tracker.publish"
+# Sections that only queue what is missing, so they always run
+INCREMENTAL_SECTIONS = {"monthly_sheets"}
+# Sections derived from the expense rows alone: re-sent when the rows change
+DATA_SECTIONS = {"flags", "monthly_values"}
+
+REFERENCE_SHEETS = ["Categories", "Family", "Payment_Modes", "Monthly_Budget"]
+
+# Batch runs update the state file from several threads
+_STATE_LOCK = threading.Lock()
+
+def _state_key(target=None):
+    target = target or destination()
+    return f"{target.name}|{target.folder_id}"
+
+def load_cached_spreadsheet_id(target=None):
+    if not os.path.exists(PUBLISH_STATE_FILE):
+        return None
+    try:
+        with open(PUBLISH_STATE_FILE) as f:
+            return json.load(f).get(_state_key(target))
+    except (OSError, ValueError):
+        return None
+
+def save_cached_spreadsheet_id(spreadsheet_id, target=None):
+    with _STATE_LOCK:
+        state = {}
+        if os.path.exists(PUBLISH_STATE_FILE):
+            try:
+                with open(PUBLISH_STATE_FILE) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {}
+        state[_state_key(target)] = spreadsheet_id
+        tmp = PUBLISH_STATE_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp, PUBLISH_STATE_FILE)
+
+def find_spreadsheet(drive, target=None):
+    """Newest spreadsheet with the target's name in its folder, or None."""
+    target = target or destination()
+    name = target.name.replace("\\", "\\\\").replace("'", "\\'")
+    result = execute(drive.files().list(
+        q=(f"name = '{name}' and '{target.folder_id}' in parents and "
+           "mimeType = 'application/vnd.google-apps.spreadsheet' and trashed = false"),
+        orderBy="modifiedTime desc",
+        pageSize=1,
+        fields="files(id)"
+    ))
+    files = result.get("files", [])
+    return files[0]["id"] if files else None
+
+def ledger_hashes(expenses, categories, family, payment, budget):
+    references = hashlib.sha1()
+    for frame in (categories, family, payment, budget):
+        references.update(data_version(frame).encode("ascii"))
+    return {"expenses": data_version(expenses), "reference": references.hexdigest()[:12]}
+
+def publish_metadata_requests(hashes, replace):
+    """Stores the publish hashes on the spreadsheet (one developer metadata entry)."""
+    requests = []
+    if replace:
+        requests.append({
+            "deleteDeveloperMetadata": {
+                "dataFilter": {"developerMetadataLookup": {"metadataKey": PUBLISH_METADATA_KEY}}
             }
-        },
-        {
-            "repeatCell": {
-                "range": {
-                    "sheetId": dashboard_id,
-                    "startRowIndex": 1,
-                    "endRowIndex": 2,
-                    "startColumnIndex": 2,
-                    "endColumnIndex": 3
-                },
-                "cell": {
-                    "userEnteredFormat": {
-                        "textFormat": {
-                            "bold": True,
-                            "fontSize": 18
-                        },
-                        "backgroundColor": {
-                            "red": 0.98,
-                            "green": 0.88,
-                            "blue": 0.88
-                        }
-                    }
-                },
-                "fields": "userEnteredFormat(textFormat,backgroundColor)"
+        })
+    requests.append({
+        "createDeveloperMetadata": {
+            "developerMetadata": {
+                "metadataKey": PUBLISH_METADATA_KEY,
+                "metadataValue": json.dumps(hashes, sort_keys=True),
+                "location": {"spreadsheet": True},
+                "visibility": "DOCUMENT"
             }
         }
-    ]
-
-    service.spreadsheets().batchUpdate(
-        spreadsheetId=spreadsheet_id,
-        body={"requests": requests}
-    ).execute()
-
-
-
-def main():
-    expenses, categories, family, payment, budget = create_test_data()
-    export_excel(expenses, categories, family, payment, budget)
+    })
+    return requests
+
+def published_hashes(service, spreadsheet_id):
+    value = get_developer_metadata(service, spreadsheet_id).get(PUBLISH_METADATA_KEY)
+    try:
+        return json.loads(value) if value else None
+    except ValueError:
+        return None
+
+def rewrite_reference_sheets(plan, tables):
+    """Clears and rewrites Categories, Family, Payment_Modes and Monthly_Budget."""
+    for title, frame in zip(REFERENCE_SHEETS, tables):
+        plan.request({
+            "updateCells": {
+                "range": {"sheetId": plan.sheet_id(title)},
+                "fields": "userEnteredValue"
+            }
+        })
+        plan.write(f"{title}!A1", [list(frame.columns)] + [
+            [_cell_value(v) for v in row] for row in frame.itertuples(index=False, name=None)
+        ])
 
-    creds = get_credentials()
-    drive = build("drive","v3",credentials=creds)
-    sheets = build("sheets","v4",credentials=creds)
+def _rule_key(rule):
+    """
+    Identifies a conditional-format rule among a sheet's rules: its sheet,
+    condition type and values. Row numbers are left out, as
+    regrow_expense_rules moves the $G$2:$G$<last_row> of the highest rule.
+    """
+    condition = rule.get("booleanRule", {}).get("condition", {})
+    values = [re.sub(r"\$\d+", "$#", v.get("userEnteredValue", ""))
+              for v in condition.get("values", [])]
+    return [rule["ranges"][0]["sheetId"], condition.get("type"), values]
 
-    # 1️ Create Google Sheet
-    spreadsheet_id = upload_sheet(drive)
+def section_objects(plan):
+    """
+    What each layout section adds to the spreadsheet (rule keys, chart ids,
+    named ranges), stored with the publish hashes so an upsert can remove
+    them before the section is re-sent.
+    """
+    objects = {}
+    for name, items in plan.sections.items():
+        found = {}
+        for kind, *args in items:
+            request = args[0] if kind == "request" else {}
+            if "addConditionalFormatRule" in request:
+                rule = request["addConditionalFormatRule"]["rule"]
+                found.setdefault("rules", []).append(_rule_key(rule))
+            elif "addChart" in request:
+                found.setdefault("charts", []).append(request["addChart"]["chart"]["chartId"])
+            elif "addNamedRange" in request:
+                found.setdefault("names", []).append(request["addNamedRange"]["namedRange"]["name"])
+        if found:
+            objects[name] = found
+    return objects
+
+def remove_section_objects(service, spreadsheet_id, objects, keep_names=()):
+    """
+    Requests deleting what sections added on their last publish (objects
+    as stored by section_objects): their rules, found by _rule_key among the
+    sheet's current rules so rules added by hand stay, their charts, and
+    their named ranges except keep_names. One spreadsheets.get when there
+    are rules or charts to find.
+    """
+    requests = []
+    rule_keys = [key for found in objects.values() for key in found.get("rules", [])]
+    chart_ids = {chart for found in objects.values() for chart in found.get("charts", [])}
+    if rule_keys or chart_ids:
+        spreadsheet = execute(service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields="sheets(properties.sheetId,conditionalFormats,charts.chartId)"
+        ))
+        for sheet in spreadsheet.get("sheets", []):
+            sheet_id = sheet["properties"]["sheetId"]
+            indexes = []
+            for index, rule in enumerate(sheet.get("conditionalFormats", [])):
+                key = _rule_key(rule)
+                if key in rule_keys:
+                    rule_keys.remove(key)
+                    indexes.append(index)
+            # Highest index first, so the ones still to delete do not move
+            requests += [{"deleteConditionalFormatRule": {"sheetId": sheet_id, "index": index}}
+                         for index in reversed(indexes)]
+            requests += [{"deleteEmbeddedObject": {"objectId": chart["chartId"]}}
+                         for chart in sheet.get("charts", []) if chart["chartId"] in chart_ids]
+
+    named = get_named_ranges(service, spreadsheet_id)
+    names = {name for found in objects.values() for name in found.get("names", [])}
+    for name in sorted(names - set(keep_names)):
+        if name in named:
+            requests.append({"deleteNamedRange": {"namedRangeId": named[name]["namedRangeId"]}})
+    return requests
+
+def named_ranges_in_place(requests, named):
+    """addNamedRange requests for names the sheet already has, as updateNamedRange."""
+    result = []
+    for request in requests:
+        add = request.get("addNamedRange", {}).get("namedRange")
+        if add and add["name"] in named:
+            request = {"updateNamedRange": {
+                "namedRange": dict(add, namedRangeId=named[add["name"]]["namedRangeId"]),
+                "fields": "range"
+            }}
+        result.append(request)
+    return result
+
+def _range_end(named_range):
+    return named_range["range"].get("endRowIndex", 0) if named_range else 0
+
+def _not_found(error):
+    resp = getattr(error, "resp", None)
+    return resp is not None and int(getattr(resp, "status", 0) or 0) == 404
+
+
+# ================= MAIN =================
+def load_ledger_tables(db_path=ledger_store.DEFAULT_DB):
+    """Loads all 5 tables from the local ledger, seeding it on first run."""
+    with ledger_store.LedgerStore(db_path) as store:
+        if store.is_empty():
+            store.import_tables(*create_test_data())
+        return store.load_tables()
+
+def build_layout(plan, expenses, budget, last_row, snapshot_kpis=False,
+                 use_budget_engine=False, monthly_sheets=False, reference=None,
+                 precomputed_flags=False, sheet_rows=None, rollup_summaries=False,
+                 budget_last_row=None, cube=None):
+    """
+    Queues every formula, format, rule and chart of the workbook, one named
+    section per builder group, in the order they have always been applied.
+    sheet_rows (see sheet_rows_after_sync) places precomputed flags on a
+    sheet whose row order differs from the ledger's; budget_last_row keeps
+    the Monthly_Budget ranges of an existing sheet (default: sized to budget).
+    cube passes in a RollupCube of expenses the caller already built.
+    """
+    # Rollup mode: every summary is read from one cube
+    if rollup_summaries and cube is None:
+        cube = rollup_cube.RollupCube.from_expenses(expenses)
+    elif not rollup_summaries:
+        cube = None
 
     # 2️ Apply Month & Year formulas (already fixed)
-    apply_month_year_formula(sheets, spreadsheet_id)
-
-    create_dashboard(sheets, spreadsheet_id)
-
-    add_highest_expense_value(sheets, spreadsheet_id)
-    # add_current_month_total(sheets, spreadsheet_id)
-
-    add_budget_actual_helper(sheets, spreadsheet_id)
-    add_budget_vs_actual(sheets, spreadsheet_id)
-    add_dashboard_section_titles(sheets, spreadsheet_id)
-    
-    add_for_whom_summary(sheets, spreadsheet_id)
-    format_total_expense_card(sheets, spreadsheet_id)
-
-    apply_conditional_formatting(sheets, spreadsheet_id)
-    highlight_highest_expense(sheets, spreadsheet_id)
-    highlight_budget_overrun(sheets, spreadsheet_id)
-
-    add_dropdowns(sheets, spreadsheet_id)
-    add_dashboard_charts(sheets, spreadsheet_id)
-
-    # # 6️Monthly summary sheets (optional, already working)
-    # for m in ["Jan-2026","Feb-2026"]:
-    #     create_monthly_sheet(sheets, spreadsheet_id, m)
+    with plan.section("month_year"):
+        apply_month_year_formula(plan, last_row)
+
+    # Snapshot mode: KPI cards as plain values computed from the DataFrame
+    with plan.section("dashboard"):
+        snapshot = compute_kpi_snapshot(expenses, cube) if snapshot_kpis else None
+        create_dashboard(plan, snapshot, cube)
+
+        if not snapshot:
+            add_highest_expense_value(plan)
+        # add_current_month_total(plan)
+
+    # Budget engine mode: variance for every month computed locally
+    variance = None
+    with plan.section("budget"):
+        clear_budget_tables(plan)
+        if use_budget_engine:
+            variance = budget_engine.BudgetEngine.from_expenses(expenses).variance_table(budget)
+            add_budget_variance_table(plan, variance)
+        else:
+            add_budget_actual_helper(plan, cube)
+            add_budget_vs_actual(plan, budget_last_row or expense_formulas.extent_for(
+                len(budget), expense_formulas.BUDGET_MARGIN))
+    with plan.section("titles"):
+        add_dashboard_section_titles(plan, all_months=use_budget_engine)
+
+    with plan.section("for_whom"):
+        add_for_whom_summary(plan, cube)
+    with plan.section("card"):
+        format_total_expense_card(plan)
+
+    # Precomputed flags replace the per-cell custom-formula rules
+    if precomputed_flags:
+        with plan.section("flags"):
+            apply_expense_flags(plan, expense_flags.compute_flags(expenses), sheet_rows,
+                                clear=sheet_rows is not None)
+    else:
+        with plan.section("conditional_formatting"):
+            apply_conditional_formatting(plan, last_row)
+        with plan.section("highest"):
+            highlight_highest_expense(plan, last_row)
+    with plan.section("overrun"):
+        highlight_budget_overrun(plan, variance)
+
+    with plan.section("dropdowns"):
+        add_dropdowns(plan, last_row, reference)
+    with plan.section("charts"):
+        add_dashboard_charts(plan)
+
+    # 6️ Monthly summary sheets (optional) – all months in the same batch
+    if monthly_sheets:
+        with plan.section("monthly_sheets"):
+            create_monthly_sheets(plan, expenses, formula=cube is None)
+        if cube is not None:
+            with plan.section("monthly_values"):
+                write_monthly_summaries(plan, cube, ledger_months(expenses))
+
+def publish_new(drive, sheets, tables, chunk_size, layout, tracer=None, target=None):
+    """Uploads the ledger as a new spreadsheet and builds the whole layout on it."""
+    expenses, categories, family, payment, budget = tables
+
+    with tracing.phase(tracer, "export_excel", local=True):
+        if len(expenses) >= STREAMING_EXPORT_ROWS:
+            # Large ledgers: streamed to a temp file, so neither the cells
+            # nor the finished workbook are held in memory. The ledger
+            # itself is (the layout and the hashes need it), so this saves
+            # the writer's copies only, not the ledger's footprint
+            fd, path = tempfile.mkstemp(suffix=".xlsx")
+            os.close(fd)
+            workbook = None
+            export_excel_streaming(expenses, categories, family, payment, budget, target=path)
+        else:
+            path = None
+            workbook = export_excel_buffer(expenses, categories, family, payment, budget)
 
-    print("SUCCESS")
+    # 1️ Create Google Sheet
+    with tracing.phase(tracer, "upload_sheet"):
+        if path is None:
+            spreadsheet_id = upload_sheet(drive, workbook, chunk_size=chunk_size, target=target)
+        else:
+            try:
+                with open(path, "rb") as f:
+                    spreadsheet_id = upload_sheet(drive, f, chunk_size=chunk_size, target=target)
+            finally:
+                os.remove(path)
+
+    # Every builder below only queues requests; plan.execute() sends them
+    # (the only API call while building is the one sheet metadata fetch)
+    with tracing.phase(tracer, "build_requests", local=True):
+        plan = RequestPlan(sheets, spreadsheet_id)
+
+        # Formulas and rules cover the real data extent plus a growth margin
+        last_row = expense_formulas.extent_for(len(expenses))
+        build_layout(plan, expenses, budget, last_row, **layout)
+
+        # Content hashes, so a later --upsert can skip what did not change
+        hashes = {"ledger": ledger_hashes(*tables), "sections": plan.section_hashes(),
+                  "objects": section_objects(plan)}
+        plan.request(*publish_metadata_requests(hashes, replace=False))
+
+    # 3️ Send everything: one batchUpdate + one values().batchUpdate
+    with tracing.phase(tracer, "execute_plan"):
+        plan.execute()
+    return spreadsheet_id
+
+def upsert_spreadsheet(drive, sheets, tables, chunk_size, layout, tracer=None, target=None):
+    """
+    Re-publishes into the existing spreadsheet instead of creating a copy.
+
+    The spreadsheet is found through the local ID cache (or by name and
+    folder), and one metadata fetch returns its sheets, named ranges and
+    the hashes stored by the last publish. Only a changed ledger is synced
+    and only changed layout sections are sent; a run with nothing changed
+    costs that single fetch.
+
+    Changes are found at the extents the sheet has now. A ledger that
+    outgrew them is resized in place by sync_expenses (named ranges,
+    rules, dropdowns) and the hashes stored are those of the layout at the
+    new extents. Before a changed section is re-sent, and when a section
+    is no longer built (e.g. rules replaced by flags), the rules and charts
+    it added last time are deleted and its named ranges updated or deleted
+    (see section_objects). Only a sheet published before those were
+    recorded gets a new copy instead. Returns (spreadsheet_id, what happened).
+    """
+    expenses, categories, family, payment, budget = tables
+
+    with tracing.phase(tracer, "find_spreadsheet"):
+        spreadsheet_id = load_cached_spreadsheet_id(target) or find_spreadsheet(drive, target)
+        stored = None
+        if spreadsheet_id:
+            try:
+                stored = published_hashes(sheets, spreadsheet_id)
+            except Exception as e:
+                if not _not_found(e):
+                    raise
+                spreadsheet_id = None
+
+    if not stored:
+        spreadsheet_id = publish_new(drive, sheets, tables, chunk_size, layout, tracer, target)
+        return spreadsheet_id, "created"
+
+    ledger = ledger_hashes(*tables)
+    stored_ledger = stored.get("ledger", {})
+    stored_sections = stored.get("sections", {})
+    stored_objects = stored.get("objects")
+    rows_changed = ledger.get("expenses") != stored_ledger.get("expenses")
+
+    # Precomputed flags follow the sheet's row order, known once the
+    # remote rows are read (only needed when the rows changed)
+    remote_rows = sheet_rows = None
+    if rows_changed and layout.get("precomputed_flags"):
+        with tracing.phase(tracer, "sync_expenses"):
+            remote_rows = read_remote_expenses(sheets, spreadsheet_id)
+        sheet_rows = sheet_rows_after_sync(expenses, remote_rows)
+
+    with tracing.phase(tracer, "build_requests", local=True):
+        # The extents the sheet was built with, and the ones the data needs
+        named = get_named_ranges(sheets, spreadsheet_id)
+        last_row = (_range_end(named.get(expense_formulas.TABLE_RANGE))
+                    or expense_formulas.extent_for(len(expenses)))
+        budget_last_row = _range_end(named.get("Budget_Category")) or expense_formulas.extent_for(
+            len(budget), expense_formulas.BUDGET_MARGIN)
+        new_last_row, new_budget_last_row = last_row, budget_last_row
+        if expense_formulas.needs_resize(len(expenses), last_row):
+            new_last_row = expense_formulas.extent_for(len(expenses))
+        if expense_formulas.needs_resize(len(budget), budget_last_row):
+            new_budget_last_row = expense_formulas.extent_for(len(budget),
+                                                              expense_formulas.BUDGET_MARGIN)
+
+        # Built once here when the layout is built twice (below)
+        cube = (rollup_cube.RollupCube.from_expenses(expenses)
+                if layout.get("rollup_summaries") else None)
+        recorded = RequestPlan(sheets, spreadsheet_id)
+        build_layout(recorded, expenses, budget, last_row, sheet_rows=sheet_rows,
+                     budget_last_row=budget_last_row, cube=cube, **layout)
+        changed = set()
+        for name, digest in recorded.section_hashes().items():
+            if name in INCREMENTAL_SECTIONS:
+                changed.add(name)
+            elif name in DATA_SECTIONS:
+                if rows_changed or name not in stored_sections:
+                    changed.add(name)
+            elif stored_sections.get(name) != digest:
+                changed.add(name)
+
+        final = recorded
+        if (new_last_row, new_budget_last_row) != (last_row, budget_last_row):
+            final = RequestPlan(sheets, spreadsheet_id)
+            build_layout(final, expenses, budget, new_last_row, sheet_rows=sheet_rows,
+                         budget_last_row=new_budget_last_row, cube=cube, **layout)
+            # The Budget_* ranges have no resizer: re-sending the section
+            # updates them (see named_ranges_in_place)
+            if new_budget_last_row != budget_last_row and "budget" in final.sections:
+                changed.add("budget")
+        hashes = final.section_hashes()
+        removed = sorted(set(stored_sections) - set(hashes) - INCREMENTAL_SECTIONS)
+
+    if stored_objects is None:
+        # Published before section_objects were stored: what the sections
+        # added cannot be found to delete, so they cannot be re-sent
+        unsafe = [
+            name for name in changed if name not in INCREMENTAL_SECTIONS and any(
+                kind == "request" and NON_IDEMPOTENT_REQUESTS & set(args[0])
+                for kind, *args in final.sections[name]
+            )
+        ] + removed
+        if unsafe:
+            spreadsheet_id = publish_new(drive, sheets, tables, chunk_size, layout, tracer, target)
+            return spreadsheet_id, "layout changed (" + ", ".join(sorted(unsafe)) + "), published a new copy"
+
+    if rows_changed:
+        with tracing.phase(tracer, "sync_expenses"):
+            sync_expenses(sheets, spreadsheet_id, expenses, remote_rows)
+
+    plan = final.replay(changed)
+    objects = section_objects(final)
+    cleanup = remove_section_objects(
+        sheets, spreadsheet_id,
+        {name: found for name, found in (stored_objects or {}).items()
+         if name in changed or name in removed},
+        keep_names={n for found in objects.values() for n in found.get("names", [])}
+    )
+    if "flags" in removed:
+        cleanup.append(reset_backgrounds(expense_rows_range(plan.sheet_id("Expenses"))))
+    plan.requests = cleanup + named_ranges_in_place(plan.requests,
+                                                    get_named_ranges(sheets, spreadsheet_id))
+    if ledger.get("reference") != stored_ledger.get("reference"):
+        rewrite_reference_sheets(plan, (categories, family, payment, budget))
+
+    if not (plan.structure or plan.requests or plan.values or plan.formats) and ledger == stored_ledger:
+        return spreadsheet_id, "up to date"
+
+    renamed = any("updateNamedRange" in r or "deleteNamedRange" in r for r in plan.requests)
+    plan.request(*publish_metadata_requests(
+        {"ledger": ledger, "sections": hashes, "objects": objects}, replace=True
+    ))
+    with tracing.phase(tracer, "execute_plan"):
+        plan.execute()
+    if renamed:
+        invalidate_sheet_metadata(spreadsheet_id)
+    updated = sorted([n for n in changed if final.sections[n]] + removed)
+    return spreadsheet_id, "updated " + (", ".join(updated) if updated else "data")
+
+def main(sync_spreadsheet_id=None, chunk_size=UPLOAD_CHUNK_SIZE, snapshot_kpis=False,
+         db_path=ledger_store.DEFAULT_DB, monthly_sheets=False, use_budget_engine=False,
+         tracer=None, upsert=False, validate=True, rejects_path=None, precomputed_flags=False,
+         rollup_summaries=False):
+    # tracer (tracing.Tracer) is optional: times each step and API call
+    try:
+        _run(sync_spreadsheet_id, chunk_size, snapshot_kpis, db_path, monthly_sheets,
+             use_budget_engine, tracer, upsert, validate, rejects_path, precomputed_flags,
+             rollup_summaries)
+    finally:
+        get_executor().tracer = None
+
+def prepare_tables(db_path, validate=True, tracer=None):
+    """
+    Ledger tables with failing expense rows removed, the reference index
+    and the rejection report (empty when validation is off).
+    """
+    # The local ledger is the source of truth; the sheet is published from it
+    with tracing.phase(tracer, "load_ledger", local=True):
+        expenses, categories, family, payment, budget = load_ledger_tables(db_path)
+
+    # Rows that fail validation never leave the machine
+    with tracing.phase(tracer, "validate", local=True):
+        reference = expense_validation.ReferenceIndex(categories, family, payment)
+        rejects = pd.DataFrame(columns=expense_validation.REPORT_COLUMNS)
+        if validate:
+            expenses, rejects = expense_validation.validate_expenses(
+                expenses, reference, required=expense_validation.LEDGER_REQUIRED_COLUMNS
+            )
+    return (expenses, categories, family, payment, budget), reference, rejects
+
+def sync_spreadsheet(sheets, spreadsheet_id, expenses, monthly_sheets=False,
+                     precomputed_flags=False, tracer=None, rollup_summaries=False,
+                     snapshot_kpis=False, budget=None):
+    """
+    Sync mode: pushes new / changed rows. Returns (added, updated, months added).
+    The options name the modes the sheet was published with, whose values
+    are refreshed for the new data; budget (the Monthly_Budget table) is
+    given for a sheet published with the budget engine.
+    """
+    with tracing.phase(tracer, "sync_expenses"):
+        remote_rows = read_remote_expenses(sheets, spreadsheet_id)
+        added, updated = sync_expenses(sheets, spreadsheet_id, expenses, remote_rows)
+
+    plan = RequestPlan(sheets, spreadsheet_id)
+    # Precomputed flags: recolour the flagged rows for the new data
+    if precomputed_flags:
+        apply_expense_flags(plan, expense_flags.compute_flags(expenses),
+                            sheet_rows_after_sync(expenses, remote_rows), clear=True)
+    cube = rollup_cube.RollupCube.from_expenses(expenses) if rollup_summaries else None
+    if snapshot_kpis:
+        write_kpi_snapshot(plan, compute_kpi_snapshot(expenses, cube))
+    if budget is not None:
+        variance = budget_engine.BudgetEngine.from_expenses(expenses).variance_table(budget)
+        clear_budget_tables(plan)
+        add_budget_variance_table(plan, variance)
+        highlight_budget_overrun(plan, variance)
+    if rollup_summaries:
+        # Summaries are values in this mode, so they are refreshed here
+        if budget is None:
+            add_budget_actual_helper(plan, cube)
+        months = write_rollup_summaries(plan, cube, monthly_sheets, expenses)
+    else:
+        months = create_monthly_sheets(plan, expenses) if monthly_sheets else []
+    with tracing.phase(tracer, "execute_plan"):
+        plan.execute()
+    return added, updated, months
+
+def publish(drive, sheets, tables, chunk_size, layout, tracer=None, upsert=False, target=None):
+    """Publishes a new spreadsheet, or upserts it. Returns (spreadsheet_id, what happened)."""
+    if not upsert:
+        return publish_new(drive, sheets, tables, chunk_size, layout, tracer, target), "created"
+    spreadsheet_id, outcome = upsert_spreadsheet(drive, sheets, tables, chunk_size,
+                                                 layout, tracer, target)
+    save_cached_spreadsheet_id(spreadsheet_id, target)
+    return spreadsheet_id, outcome
+
+def _run(sync_spreadsheet_id, chunk_size, snapshot_kpis, db_path, monthly_sheets,
+         use_budget_engine, tracer, upsert, validate, rejects_path, precomputed_flags,
+         rollup_summaries):
+    tables, reference, rejects = prepare_tables(db_path, validate, tracer)
+    expense_validation.print_report(rejects, rejects_path)
+    for column, count in expense_validation.missing_counts(tables[0]).items():
+        print(f"WARNING: {count} expenses without {column} (highlighted in the sheet)")
+
+    with tracing.phase(tracer, "credentials"):
+        drive, sheets = connect()
+    get_executor().tracer = tracer
+
+    # Sync mode: only push new / changed expense rows to an existing sheet
+    if sync_spreadsheet_id:
+        added, updated, months = sync_spreadsheet(
+            sheets, sync_spreadsheet_id, tables[0], monthly_sheets, precomputed_flags, tracer,
+            rollup_summaries, snapshot_kpis, budget=tables[4] if use_budget_engine else None
+        )
+        print(f"SYNCED: {added} new, {updated} changed")
+        if monthly_sheets:
+            print(f"MONTHLY SHEETS: {len(months)} added")
+        print("https://docs.google.com/spreadsheets/d/" + sync_spreadsheet_id)
+        return
+
+    layout = {"snapshot_kpis": snapshot_kpis, "use_budget_engine": use_budget_engine,
+              "monthly_sheets": monthly_sheets, "reference": reference,
+              "precomputed_flags": precomputed_flags, "rollup_summaries": rollup_summaries}
+
+    # Upsert mode: reuse the existing spreadsheet, send only what changed
+    spreadsheet_id, outcome = publish(drive, sheets, tables, chunk_size, layout, tracer, upsert)
+    print("UPSERT: " + outcome if upsert else "SUCCESS")
     print("https://docs.google.com/spreadsheets/d/" + spreadsheet_id)
 
-
 if __name__ == "__main__":
-    main()
+    import expense_cli
+    expense_cli.main()
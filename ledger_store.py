@@ -0,0 +1,265 @@
+"""
+Local SQLite ledger – the source of truth for the tracker.
+
+Holds the Expenses, Categories, Family, Payment_Modes and Monthly_Budget
+tables. The Google Sheet is published from here (load_tables returns the
+same 5 DataFrames as create_test_data), and month / category reports run
+as indexed queries without any network access.
+
+pandas (and the modules built on it) is imported inside the methods that
+need it, so offline reports (month_totals) start without loading it.
+"""
+
+import sqlite3
+
+DEFAULT_DB = "expenses.db"
+
+# Sheet column -> SQL column
+EXPENSE_SQL_COLUMNS = {
+    "Date": "date",
+    "Month": "month",
+    "Year": "year",
+    "Category": "category",
+    "Sub-Category": "sub_category",
+    "Description": "description",
+    "Amount": "amount_paise",
+    "Payment Mode": "payment_mode",
+    "Account": "account",
+    "Paid By": "paid_by",
+    "For Whom": "for_whom",
+    "Expense Type": "expense_type",
+    "Frequency": "frequency",
+    "Vendor": "vendor",
+    "Bill?": "bill",
+    "Reimbursable": "reimbursable",
+    "Tags": "tags",
+    "Notes": "notes",
+}
+
+# Sheet name -> (SQL table, {sheet column -> SQL column})
+REFERENCE_TABLES = {
+    "Categories": ("categories", {"Category": "category", "Sub-Category": "sub_category"}),
+    "Family": ("family", {"Member Name": "member_name", "Role": "role"}),
+    "Payment_Modes": ("payment_modes", {"Payment Mode": "payment_mode", "Account": "account"}),
+    "Monthly_Budget": ("monthly_budget", {"Month": "month", "Category": "category",
+                                          "Budget Amount": "budget_amount"}),
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY,
+    date TEXT, month TEXT, year INTEGER,
+    category TEXT, sub_category TEXT, description TEXT,
+    amount_paise INTEGER,
+    payment_mode TEXT, account TEXT, paid_by TEXT, for_whom TEXT,
+    expense_type TEXT, frequency TEXT, vendor TEXT,
+    bill TEXT, reimbursable TEXT, tags TEXT, notes TEXT,
+    content_hash INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(date);
+CREATE INDEX IF NOT EXISTS idx_expenses_month ON expenses(month);
+CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses(category);
+CREATE INDEX IF NOT EXISTS idx_expenses_paid_by ON expenses(paid_by);
+CREATE INDEX IF NOT EXISTS idx_expenses_content_hash ON expenses(content_hash);
+
+CREATE TABLE IF NOT EXISTS categories (category TEXT, sub_category TEXT);
+CREATE TABLE IF NOT EXISTS family (member_name TEXT, role TEXT);
+CREATE TABLE IF NOT EXISTS payment_modes (payment_mode TEXT, account TEXT);
+CREATE TABLE IF NOT EXISTS monthly_budget (month TEXT, category TEXT, budget_amount REAL);
+CREATE INDEX IF NOT EXISTS idx_budget_month ON monthly_budget(month);
+"""
+
+
+class LedgerStore:
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self._add_content_hash_column()
+        self.conn.executescript(SCHEMA)
+
+    def _add_content_hash_column(self):
+        """Upgrades ledgers created before duplicate detection existed."""
+        columns = [r[1] for r in self.conn.execute("PRAGMA table_info(expenses)")]
+        if not columns or "content_hash" in columns:
+            return
+        with self.conn:
+            self.conn.execute("ALTER TABLE expenses ADD COLUMN content_hash INTEGER")
+        import dedup
+
+        expenses = self.load_expenses(with_ids=True)
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE expenses SET content_hash = ? WHERE id = ?",
+                zip(dedup.row_hashes(expenses).tolist(), expenses["id"].tolist())
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def is_empty(self):
+        return self.conn.execute("SELECT 1 FROM expenses LIMIT 1").fetchone() is None
+
+    # ----- writes -----
+    def append_expenses(self, expenses):
+        """
+        Appends rows given in sheet layout. Month / Year are recomputed from
+        Date and amounts are stored as integer paise.
+        """
+        import pandas as pd
+
+        import dedup
+        import expense_schema
+
+        if expenses.empty:
+            return 0
+        typed = expense_schema.to_typed(expenses)
+        rows = pd.DataFrame({
+            "date": typed["Date"].dt.strftime("%Y-%m-%d"),
+            "month": expense_schema.month_of(typed),
+            "year": expense_schema.year_of(typed).astype("Int64"),
+            "amount_paise": typed[expense_schema.AMOUNT_PAISE],
+        })
+        for col, sql_col in EXPENSE_SQL_COLUMNS.items():
+            if sql_col not in rows:
+                rows[sql_col] = expenses[col].astype(object) if col in expenses else None
+        columns = list(EXPENSE_SQL_COLUMNS.values()) + ["content_hash"]
+        rows["content_hash"] = dedup.row_hashes(expenses)
+        rows = rows[columns].astype(object)
+        rows = rows.where(rows.notna(), None)
+
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO expenses ({','.join(columns)}) "
+                f"VALUES ({','.join('?' * len(columns))})",
+                rows.itertuples(index=False, name=None)
+            )
+        return len(rows)
+
+    def replace_reference(self, sheet_name, frame):
+        """Replaces one reference table (Categories, Family, ...) wholesale."""
+        table, columns = REFERENCE_TABLES[sheet_name]
+        rows = frame[list(columns)].astype(object)
+        rows = rows.where(rows.notna(), None)
+        with self.conn:
+            self.conn.execute(f"DELETE FROM {table}")
+            self.conn.executemany(
+                f"INSERT INTO {table} ({','.join(columns.values())}) "
+                f"VALUES ({','.join('?' * len(columns))})",
+                rows.itertuples(index=False, name=None)
+            )
+
+    def add_reference_rows(self, sheet_name, frame):
+        """Appends rows to one reference table (e.g. a new account in Payment_Modes)."""
+        table, columns = REFERENCE_TABLES[sheet_name]
+        rows = frame[list(columns)].astype(object)
+        rows = rows.where(rows.notna(), None)
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT INTO {table} ({','.join(columns.values())}) "
+                f"VALUES ({','.join('?' * len(columns))})",
+                rows.itertuples(index=False, name=None)
+            )
+
+    def import_tables(self, expenses, categories, family, payment, budget):
+        self.append_expenses(expenses)
+        self.replace_reference("Categories", categories)
+        self.replace_reference("Family", family)
+        self.replace_reference("Payment_Modes", payment)
+        self.replace_reference("Monthly_Budget", budget)
+
+    # ----- reads -----
+    def load_expenses(self, month=None, with_ids=False):
+        """Expenses in sheet layout, optionally only one month (indexed)."""
+        query, params = self._select_expenses(with_ids), ()
+        if month:
+            query += " WHERE month = ?"
+            params = (month,)
+        return self._read_expenses(query + " ORDER BY date, id", params)
+
+    def iter_expenses(self, chunk_rows=10000):
+        """All expenses in sheet layout, as DataFrame chunks of chunk_rows (ledger order)."""
+        import pandas as pd
+
+        query = self._select_expenses() + " ORDER BY date, id"
+        for frame in pd.read_sql_query(query, self.conn, chunksize=chunk_rows):
+            yield self._amounts_in_rupees(frame)
+
+    def load_expenses_between(self, start, end):
+        """Expenses with start <= Date <= end (ISO dates, indexed)."""
+        return self._read_expenses(
+            self._select_expenses() + " WHERE date BETWEEN ? AND ? ORDER BY date, id",
+            (start, end)
+        )
+
+    def content_hashes(self):
+        """All stored row hashes, for duplicate detection."""
+        return {h for (h,) in self.conn.execute(
+            "SELECT content_hash FROM expenses WHERE content_hash IS NOT NULL"
+        )}
+
+    def _select_expenses(self, with_ids=False):
+        select = ", ".join(f'{sql} AS "{col}"' for col, sql in EXPENSE_SQL_COLUMNS.items())
+        if with_ids:
+            select = "id, " + select
+        return f"SELECT {select} FROM expenses"
+
+    def _read_expenses(self, query, params):
+        import pandas as pd
+
+        return self._amounts_in_rupees(pd.read_sql_query(query, self.conn, params=params))
+
+    def _amounts_in_rupees(self, frame):
+        frame["Amount"] = frame["Amount"] / 100
+        if (frame["Amount"].dropna() % 1 == 0).all():
+            frame["Amount"] = frame["Amount"].astype("Int64")
+        return frame
+
+    def load_reference(self, sheet_name):
+        import pandas as pd
+
+        table, columns = REFERENCE_TABLES[sheet_name]
+        select = ", ".join(f'{sql} AS "{col}"' for col, sql in columns.items())
+        return pd.read_sql_query(f"SELECT {select} FROM {table} ORDER BY rowid", self.conn)
+
+    def load_tables(self):
+        """Same 5 tables, in the same order, as create_test_data()."""
+        return (
+            self.load_expenses(),
+            self.load_reference("Categories"),
+            self.load_reference("Family"),
+            self.load_reference("Payment_Modes"),
+            self.load_reference("Monthly_Budget"),
+        )
+
+    def months(self):
+        return [m for (m,) in self.conn.execute(
+            "SELECT month FROM expenses WHERE month IS NOT NULL "
+            "GROUP BY month ORDER BY MIN(date)"
+        )]
+
+    def month_totals(self, month):
+        """
+        [(category, total paise)] for one month, largest first – the local
+        twin of create_monthly_sheet. Plain sqlite, no pandas.
+        """
+        return self.conn.execute(
+            "SELECT category, SUM(amount_paise) FROM expenses WHERE month = ? "
+            "GROUP BY category ORDER BY 2 DESC",
+            (month,)
+        ).fetchall()
+
+    def month_summary(self, month):
+        """month_totals as a DataFrame (Category, Total Amount in rupees)."""
+        import pandas as pd
+
+        return pd.DataFrame(
+            [(c, t / 100) for c, t in self.month_totals(month)],
+            columns=["Category", "Total Amount"]
+        )
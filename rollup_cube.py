@@ -0,0 +1,177 @@
+"""
+Rollup cube of expense amounts.
+
+Totals are kept in integer paise per day for every member of each
+dimension (Category, Payment Mode, For Whom, Paid By, Account) and for
+the ledger as a whole, built from the ledger with one group-by per
+dimension (from_expenses; add_expenses folds in further batches). Months
+and years are ranges of days: each series also keeps its days in order
+with running (prefix) sums, so the total over any date range is two
+binary searches and a subtraction, however large the ledger. Prefix sums
+are extended in place while batches arrive in date order, and rebuilt
+lazily for a series that gets an older date.
+
+The Dashboard summaries, the budget actuals and the monthly tabs are
+written from the cube as plain values (see summary / breakdown /
+month_summary) instead of QUERY formulas that rescan the whole Expenses
+sheet. The cube is built once per run.
+"""
+
+import datetime
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from itertools import accumulate
+
+import numpy as np
+import pandas as pd
+
+import expense_schema
+
+DIMENSIONS = ["Category", "Payment Mode", "For Whom", "Paid By", "Account"]
+TOTAL = (None, None)        # series key of the ledger-wide totals
+
+_EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+
+def _day(date):
+    """Date (Timestamp, date or ISO text) -> days since 1970-01-01."""
+    if isinstance(date, str):
+        return datetime.date.fromisoformat(date[:10]).toordinal() - _EPOCH
+    return pd.Timestamp(date).toordinal() - _EPOCH
+
+def _date(day):
+    return datetime.date.fromordinal(day + _EPOCH)
+
+def _label(value):
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return ""
+    return str(value).strip()
+
+def month_bounds(month):
+    """'Jan-2026' (or a Period) -> (first day, last day) of the month."""
+    period = pd.Period(pd.to_datetime(month, format=expense_schema.MONTH_FORMAT), freq="M") \
+        if isinstance(month, str) else month
+    return period.start_time.date(), period.end_time.date()
+
+def rupees(paise):
+    paise = int(paise)
+    return paise // 100 if paise % 100 == 0 else paise / 100
+
+
+class RollupCube:
+
+    def __init__(self):
+        self.totals = defaultdict(dict)     # (dimension, member) -> {day: paise}
+        self._prefix = {}                   # (dimension, member) -> (days, running sums)
+
+    # ----- updates -----
+    def _bump(self, key, day, paise):
+        days = self.totals[key]
+        days[day] = days.get(day, 0) + paise
+        if days[day] == 0:
+            del days[day]
+            if not days:
+                del self.totals[key]
+                self._prefix.pop(key, None)
+                return
+
+        prefix = self._prefix.get(key)
+        if prefix is None:
+            return
+        ordered, running = prefix
+        if ordered and day < ordered[-1]:
+            del self._prefix[key]           # out of order: rebuilt on the next query
+        elif ordered and day == ordered[-1]:
+            running[-1] += paise
+        else:
+            ordered.append(day)
+            running.append((running[-1] if running else 0) + paise)
+
+    def add_expenses(self, expenses):
+        """Folds a batch of expenses (sheet layout) in with one group-by per dimension."""
+        typed = expense_schema.to_typed(expenses)
+        valid = typed["Date"].notna() & typed[expense_schema.AMOUNT_PAISE].notna()
+        typed = typed[valid]
+        if typed.empty:
+            return self
+        frame = pd.DataFrame({
+            "day": typed["Date"].to_numpy().astype("datetime64[D]").astype(np.int64),
+            "paise": typed[expense_schema.AMOUNT_PAISE].astype(np.int64),
+        })
+        for day, paise in frame.groupby("day")["paise"].sum().items():
+            self._bump(TOTAL, int(day), int(paise))
+        for dimension in DIMENSIONS:
+            labels = (typed[dimension].astype(object) if dimension in typed
+                      else pd.Series("", index=typed.index))
+            frame["member"] = labels.fillna("").astype(str).str.strip().to_numpy()
+            grouped = frame.groupby(["day", "member"])["paise"].sum()
+            for (day, member), paise in grouped.items():
+                self._bump((dimension, member), int(day), int(paise))
+        return self
+
+    @classmethod
+    def from_expenses(cls, expenses):
+        return cls().add_expenses(expenses)
+
+    # ----- queries -----
+    def _series(self, key):
+        if key not in self._prefix:
+            days = self.totals.get(key, {})
+            ordered = sorted(days)
+            self._prefix[key] = (ordered, list(accumulate(days[d] for d in ordered)))
+        return self._prefix[key]
+
+    def total(self, start=None, end=None, dimension=None, member=None):
+        """Paise spent from start to end (inclusive dates; None = open)."""
+        key = TOTAL if dimension is None else (dimension, _label(member))
+        if key not in self.totals:
+            return 0
+        ordered, running = self._series(key)
+        lo = 0 if start is None else bisect_left(ordered, _day(start))
+        hi = len(ordered) if end is None else bisect_right(ordered, _day(end))
+        if hi <= lo:
+            return 0
+        return running[hi - 1] - (running[lo - 1] if lo else 0)
+
+    def members(self, dimension):
+        return sorted(member for dim, member in self.totals if dim == dimension)
+
+    def breakdown(self, dimension, start=None, end=None):
+        """{member: paise} over a date range, members with no spend left out."""
+        totals = {}
+        for member in self.members(dimension):
+            paise = self.total(start, end, dimension, member)
+            if paise:
+                totals[member] = paise
+        return totals
+
+    def first_day(self):
+        return _date(self._series(TOTAL)[0][0]) if TOTAL in self.totals else None
+
+    def last_day(self):
+        return _date(self._series(TOTAL)[0][-1]) if TOTAL in self.totals else None
+
+    def months(self):
+        """Month labels (Jan-2026) with spend, oldest first."""
+        if TOTAL not in self.totals:
+            return []
+        periods = pd.period_range(self.first_day(), self.last_day(), freq="M")
+        return [p.strftime(expense_schema.MONTH_FORMAT) for p in periods
+                if self.total(p.start_time.date(), p.end_time.date())]
+
+    def summary(self, dimension, label=None, start=None, end=None, limit=None):
+        """
+        [[label, 'Amount'], [member, rupees], ...] largest first – the same
+        table as expense_formulas.summary_query. With a limit, members past
+        limit - 1 are folded into one 'Other' row.
+        """
+        totals = self.breakdown(dimension, start, end)
+        rows = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        if limit and len(rows) > limit:
+            rows = rows[:limit - 1] + [("Other", sum(p for _, p in rows[limit - 1:]))]
+        return [[label or dimension, "Amount"]] + [[m, rupees(p)] for m, p in rows]
+
+    def month_summary(self, month, dimension="Category"):
+        """[[dimension, 'Total Amount'], ...] for one month, as expense_formulas.monthly_summary."""
+        totals = self.breakdown(dimension, *month_bounds(month))
+        return [[dimension, "Total Amount"]] + [[m, rupees(p)] for m, p in sorted(totals.items())]
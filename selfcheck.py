@@ -0,0 +1,698 @@
+"""
+Offline behaviour checks for the tracker.
+
+Like the benchmarks, these run against the fake Google services
+(fake_google) with an injectable clock, so they need no credentials or
+network and never really wait:
+
+    python expense_cli.py self-check
+
+Checks
+- backoff           5xx / dropped connection / 429 retried with exponential
+                    backoff, Retry-After honoured
+- retry_limit       a request that keeps failing is given up after max_retries
+- non_idempotent    appends and batches adding sheets / charts / rules / named
+                    ranges / metadata are not re-sent after a 5xx or a lost
+                    response, only on 429
+- token_bucket      the request rate is capped at the configured quota
+- format_card       the six-cell KPI card compacts to two requests
+- format_overlap    overlapping ranges merge into one format per cell
+- format_cells      replaying the compacted requests gives every cell its
+                    declared format, and no two requests touch the same cell
+- sync_occurrences  identical expenses on the same day are told apart by the
+                    occurrence counter (new / unchanged / changed rows)
+- sync_derived      Month / Year are sent as null so their formulas survive
+- sync_twice        a second sync of the same ledger sends nothing, in a sheet
+                    that displays dates dd/mm, and a retried write of the new
+                    rows does not duplicate them
+- sync_refresh      sync rewrites the snapshot KPI values and the budget-engine
+                    table of a sheet published with them
+- upsert_growth     a ledger outgrowing the margin is resized in the same
+                    spreadsheet (named ranges and rules regrown)
+- upsert_modes      switching to engine + flags mode and back removes and
+                    restores the rules and Budget ranges in place
+- upsert_shrink     a shorter engine variance table leaves no stale rows
+- rollup_cube       month / category totals and the budget actuals match
+                    pandas, also after a batch older than the cube's data
+- budget_engine     the variance table matches pandas; a blank budget cell is
+                    no budget, unbudgeted spend is listed with Budget 0
+- validation        each bad row is rejected with its reasons, and a day-first
+                    date next to ISO dates is accepted without a warning
+- sheet_reader      paged read_back of serial / typed dates matches the ledger,
+                    indexed by sheet row, cleared rows dropped
+- dedup_exact       a ledger row as a statement spells it, and a repeat inside
+                    the chunk, are duplicates; appended rows stay known
+- dedup_fuzzy       a near-duplicate is found within the date window even with
+                    another same-account, same-amount row in between
+- import_statement  a statement for an account Payment_Modes does not list
+                    yet (SBI) is imported, and its rows pass publish validation
+
+Each check raises AssertionError with what differed; run() collects them.
+"""
+
+import contextlib
+import io
+import os
+import random
+import tempfile
+import warnings
+
+import api_executor
+import budget_engine
+import dedup
+import expense_formulas
+import expense_schema
+import expense_validation
+import fake_google
+import final_expense_tracker_query_based as tracker
+import ledger_store
+import rollup_cube
+import sheet_reader
+import sheet_styles
+import statement_importer
+import synthetic_ledger
+
+
+class FakeClock:
+    """monotonic() / sleep() pair where sleeping only advances the clock."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _executor(clock, requests_per_minute=10 ** 9, burst=10 ** 9, **options):
+    # rng() == 1.0: full jitter at its upper bound, so waits are exact
+    return api_executor.ApiExecutor(requests_per_minute=requests_per_minute, burst=burst,
+                                    clock=clock.time, sleep=clock.sleep, rng=lambda: 1.0,
+                                    **options)
+
+def _spreadsheet(fake):
+    return fake._files_create({})["id"]
+
+def _attempts(fake, method):
+    return fake.summary()["by_method"].get(method, 0)
+
+def _check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+# ----- ApiExecutor -----
+def check_backoff():
+    fake, clock = fake_google.FakeGoogle(), FakeClock()
+    executor = _executor(clock)
+    spreadsheet_id = _spreadsheet(fake)
+    fake.fail("spreadsheets.get", 503, times=2)
+    fake.fail("spreadsheets.get", 0)
+    fake.fail("spreadsheets.get", 429, retry_after=7)
+
+    executor.execute(fake.service().spreadsheets().get(spreadsheetId=spreadsheet_id))
+    _check(_attempts(fake, "spreadsheets.get") == 5,
+           f"expected 5 attempts, got {_attempts(fake, 'spreadsheets.get')}")
+    _check(executor.retries == 4, f"expected 4 retries, got {executor.retries}")
+    _check(clock.sleeps == [1.0, 2.0, 4.0, 7.0], f"waits {clock.sleeps}, expected 1/2/4 then 7")
+    return "503, 503, dropped, 429: waited 1 / 2 / 4 s, then Retry-After 7 s"
+
+def check_retry_limit():
+    fake, clock = fake_google.FakeGoogle(), FakeClock()
+    executor = _executor(clock, max_retries=2)
+    spreadsheet_id = _spreadsheet(fake)
+    fake.fail("spreadsheets.get", 503, times=5)
+
+    try:
+        executor.execute(fake.service().spreadsheets().get(spreadsheetId=spreadsheet_id))
+    except fake_google.FakeHttpError:
+        pass
+    else:
+        raise AssertionError("a request failing 5 times succeeded with max_retries=2")
+    _check(_attempts(fake, "spreadsheets.get") == 3,
+           f"expected 3 attempts, got {_attempts(fake, 'spreadsheets.get')}")
+    return "gave up after 1 + 2 attempts"
+
+def _append(fake, spreadsheet_id):
+    return fake.service().spreadsheets().values().append(
+        spreadsheetId=spreadsheet_id, range="Expenses!A1:R", valueInputOption="USER_ENTERED",
+        insertDataOption="INSERT_ROWS", body={"values": [["2026-01-01"]]}
+    )
+
+def check_non_idempotent():
+    fake, clock = fake_google.FakeGoogle(), FakeClock()
+    executor = _executor(clock)
+    spreadsheet_id = _spreadsheet(fake)
+    method = "spreadsheets.values.append"
+
+    # Applied, then the response is lost: sending it again would duplicate rows
+    for status in (503, 0):
+        fake.reset()
+        fake.fail(method, status, applied=True)
+        try:
+            executor.execute(_append(fake, spreadsheet_id), idempotent=False)
+        except (fake_google.FakeHttpError, OSError):
+            pass
+        else:
+            raise AssertionError(f"append retried after status {status}")
+        _check(fake.applied[method] == 1, f"append applied {fake.applied[method]} times")
+
+    # 429 means the request was rejected unprocessed: safe to retry
+    fake.reset()
+    fake.fail(method, 429)
+    executor.execute(_append(fake, spreadsheet_id), idempotent=False)
+    _check(fake.applied[method] == 1 and _attempts(fake, method) == 2,
+           "append not retried exactly once after 429")
+
+    # Through the tracker: batches adding a chart or a sheet
+    fake.reset()
+    with fake.installed(tracker), contextlib.redirect_stdout(io.StringIO()):
+        tracker.get_executor().sleep = lambda seconds: None
+        plan = tracker.RequestPlan(fake.service(), spreadsheet_id)
+        plan.request({"addChart": {"chart": {"spec": {"title": "check"}}}})
+        fake.fail("spreadsheets.batchUpdate", 503, applied=True)
+        with contextlib.suppress(fake_google.FakeHttpError):
+            plan.execute()
+        _check(fake.applied["spreadsheets.batchUpdate"] == 1, "addChart batch was re-sent")
+
+        plan = tracker.RequestPlan(fake.service(), spreadsheet_id)
+        plan.add_sheet("Check")
+        fake.fail("spreadsheets.batchUpdate", 503, applied=True)
+        with contextlib.suppress(fake_google.FakeHttpError):
+            plan.execute()
+        _check(fake.applied["spreadsheets.batchUpdate"] == 2, "addSheet batch was re-sent")
+
+        plan = tracker.RequestPlan(fake.service(), spreadsheet_id)
+        plan.request({"updateSheetProperties": {"properties": {"sheetId": 0},
+                                                "fields": "title"}})
+        fake.fail("spreadsheets.batchUpdate", 503)
+        plan.execute()
+        _check(fake.applied["spreadsheets.batchUpdate"] == 3, "idempotent batch not retried")
+    return "append / addChart / addSheet batch sent once after 503 or a lost connection; retried on 429"
+
+def check_token_bucket():
+    fake, clock = fake_google.FakeGoogle(), FakeClock()
+    executor = _executor(clock, requests_per_minute=60, burst=10)
+    spreadsheet_id = _spreadsheet(fake)
+
+    for _ in range(25):
+        executor.execute(fake.service().spreadsheets().get(spreadsheetId=spreadsheet_id))
+    # 10 from the burst, then one per second for the other 15
+    _check(abs(clock.now - 15.0) < 1e-6, f"25 requests at 60/min took {clock.now:.2f} s, expected 15")
+    return "25 requests at 60/min with a burst of 10: 15 s"
+
+# ----- sheet_styles.FormatMap -----
+def _replay(requests):
+    """
+    Applies compacted format requests to an empty grid. Returns the
+    resulting {(row, col): format} and the cells written more than once.
+    """
+    cells, twice = {}, set()
+    for request in requests:
+        kind, body = next(iter(request.items()))
+        grid = body["range"]
+        for row in range(grid["startRowIndex"], grid["endRowIndex"]):
+            for col in range(grid["startColumnIndex"], grid["endColumnIndex"]):
+                if kind == "repeatCell":
+                    fmt = body["cell"]["userEnteredFormat"]
+                else:
+                    line = body["rows"][row - grid["startRowIndex"]]["values"]
+                    fmt = line[col - grid["startColumnIndex"]]["userEnteredFormat"]
+                _check(body["fields"] == sheet_styles.fields_mask(fmt),
+                       f"fields {body['fields']} do not match the format at {(row, col)}")
+                if (row, col) in cells:
+                    twice.add((row, col))
+                cells[(row, col)] = fmt
+    return cells, twice
+
+def _format_map(formats):
+    format_map = sheet_styles.FormatMap()
+    format_map.update(formats)
+    return format_map
+
+def _random_formats(rng, count=60):
+    styles = [{"textFormat": {"bold": True}}, {"textFormat": {"fontSize": 13}},
+              {"backgroundColor": {"red": 1.0, "green": 0.9, "blue": 0.9}},
+              {"textFormat": {"italic": True}, "backgroundColor": {"red": 0.9}}]
+    formats = {}
+    for _ in range(count):
+        r0, c0 = rng.randrange(20), rng.randrange(8)
+        r1, c1 = r0 + rng.randrange(4), c0 + rng.randrange(3)
+        formats[f"{chr(65 + c0)}{r0 + 1}:{chr(65 + c1)}{r1 + 1}"] = rng.choice(styles)
+    return formats
+
+def check_format_card():
+    requests = _format_map(tracker.TOTAL_EXPENSE_CARD_FORMATS).requests(0)
+    _check(len(requests) == 2, f"card compacted to {len(requests)} requests, expected 2")
+    return "6 cells -> 2 updateCells"
+
+def check_format_overlap():
+    bold, size = {"textFormat": {"bold": True}}, {"textFormat": {"fontSize": 12}}
+    format_map = _format_map({"A1:C1": bold, "B1": size})
+    _check(format_map.cells[(0, 1)] == {"textFormat": {"bold": True, "fontSize": 12}},
+           f"B1 is {format_map.cells[(0, 1)]}, expected bold + fontSize 12")
+    cells, twice = _replay(format_map.requests(0))
+    _check(cells == format_map.cells and not twice, "overlapping ranges replay differently")
+    return "A1:C1 bold + B1 fontSize -> B1 carries both, no cell written twice"
+
+def check_format_cells():
+    rng = random.Random(0)
+    maps = [tracker.TOTAL_EXPENSE_CARD_FORMATS, tracker.DASHBOARD_TITLE_FORMATS,
+            # a column of alternating formats, folded by MERGE_CELLS_PER_REQUEST
+            {f"A{row}": {"textFormat": {"bold": row % 2 == 0}} for row in range(1, 40)}]
+    maps += [_random_formats(rng) for _ in range(50)]
+    requests = 0
+    for formats in maps:
+        format_map = _format_map(formats)
+        cells, twice = _replay(format_map.requests(0))
+        _check(cells == format_map.cells, f"cells lost or changed by compacting {formats}")
+        _check(not twice, f"cells {sorted(twice)[:3]} written by more than one request")
+        requests += len(format_map.requests(0))
+    return f"{len(maps)} format maps, {requests} requests, every cell kept"
+
+# ----- incremental sync diff -----
+def _ledger_rows(expenses):
+    """Expenses as the sheet returns them: serial dates, Month / Year filled in by formula."""
+    epoch = tracker.pd.Timestamp(expense_schema.SHEETS_EPOCH)
+    serial = (expense_schema.parse_dates(expenses["Date"]) - epoch).dt.days
+    rows = expenses.assign(Date=serial).astype(object).values.tolist()
+    return [[tracker._cell_value(v) for v in row] for row in rows]
+
+def check_sync_occurrences():
+    expenses = tracker.create_test_data()[0]
+    # The same EMI twice on the same day: equal in every key column
+    expenses = tracker.pd.concat([expenses, expenses.iloc[[1]]], ignore_index=True)
+    remote = _ledger_rows(expenses)
+
+    new_rows, changed = tracker.diff_expenses(expenses, remote[:3])
+    _check(len(new_rows) == 1 and not changed,
+           f"second identical EMI: {len(new_rows)} new, {len(changed)} changed, expected 1 / 0")
+    new_rows, changed = tracker.diff_expenses(expenses, remote)
+    _check(not new_rows and not changed, "an unchanged ledger produced writes")
+
+    edited = expenses.copy()
+    edited.loc[3, "Amount"] = 4400
+    new_rows, changed = tracker.diff_expenses(edited, remote)
+    _check(not new_rows and list(changed) == [5],
+           f"editing the second occurrence changed rows {list(changed)}, expected sheet row 5")
+    return "1st / 2nd occurrence keyed apart; an edit of the 2nd rewrites only its row"
+
+def check_sync_derived():
+    expenses = tracker.create_test_data()[0]
+    columns = list(expenses.columns)
+    derived = [columns.index("Month"), columns.index("Year")]
+
+    remote = _ledger_rows(expenses)
+    remote[0][columns.index("Amount")] = 1
+    new_rows, changed = tracker.diff_expenses(expenses, remote[:2])
+    sent = new_rows + list(changed.values())
+    _check(len(new_rows) == 1 and list(changed) == [2], "expected 1 new and sheet row 2 changed")
+    _check(all(row[i] is None for row in sent for i in derived),
+           "Month / Year were sent with a value")
+    _check(all(row[i] is not None for row in sent for i in range(len(columns)) if i not in derived),
+           "a non-derived column was sent as null")
+    return "new and changed rows carry null Month / Year"
+
+def check_sync_twice():
+    fake = fake_google.FakeGoogle()
+    spreadsheet_id = _spreadsheet(fake)
+    expenses = tracker.create_test_data()[0]
+    fake.load_grid(spreadsheet_id, "Expenses",
+                   [list(expenses.columns)] + _ledger_rows(expenses.iloc[:1]))
+
+    with fake.installed(tracker), contextlib.redirect_stdout(io.StringIO()):
+        tracker.get_executor().sleep = lambda seconds: None
+        # The write lands but its response is lost: the retry must not add rows twice
+        fake.fail("spreadsheets.values.batchUpdate", 503, applied=True)
+        first = tracker.sync_expenses(fake.service(), spreadsheet_id, expenses)
+        second = tracker.sync_expenses(fake.service(), spreadsheet_id, expenses)
+
+    grid = fake.spreadsheets[spreadsheet_id]["grids"]["Expenses"]
+    _check(first == (len(expenses) - 1, 0),
+           f"first sync wrote {first}, expected ({len(expenses) - 1}, 0)")
+    _check(second == (0, 0), f"second sync wrote {second[0]} new / {second[1]} changed rows")
+    _check(len(grid) == len(expenses) + 1,
+           f"{len(grid) - 1} rows in the sheet for {len(expenses)} expenses")
+    return (f"{first[0]} rows written once despite a lost response; the dd/mm sheet "
+            "re-syncs with nothing to send")
+
+# ----- upsert -----
+@contextlib.contextmanager
+def _upserts():
+    """Yields (fake, upsert(tables, **layout) -> (spreadsheet_id, outcome)), state in a temp dir."""
+    fake = fake_google.FakeGoogle()
+    saved = tracker.PUBLISH_STATE_FILE
+    with tempfile.TemporaryDirectory() as tmp:
+        tracker.PUBLISH_STATE_FILE = os.path.join(tmp, "publish_state.json")
+        try:
+            with fake.installed(tracker), contextlib.redirect_stdout(io.StringIO()):
+                yield fake, lambda tables, **layout: tracker.publish(
+                    fake.service("drive", "v3"), fake.service(), tables,
+                    tracker.UPLOAD_CHUNK_SIZE, layout, upsert=True
+                )
+        finally:
+            tracker.PUBLISH_STATE_FILE = saved
+
+def _rule_counts(spreadsheet):
+    return {sheet_id: len(rules) for sheet_id, rules in spreadsheet["conditionalFormats"].items()}
+
+def check_upsert_growth():
+    tables = tracker.create_test_data()
+    expenses = tables[0]
+    grown = (tracker.pd.concat([expenses] + [
+        expenses.assign(Description=expenses["Description"] + f" {i}") for i in range(400)
+    ], ignore_index=True),) + tables[1:]
+
+    with _upserts() as (fake, upsert):
+        spreadsheet_id, _ = upsert(tables)
+        upsert(grown)
+        _, outcome = upsert(grown)
+    spreadsheet = fake.spreadsheets[spreadsheet_id]
+    last_row = expense_formulas.extent_for(len(grown[0]))
+
+    _check(len(fake.spreadsheets) == 1, f"growth published {len(fake.spreadsheets) - 1} new copies")
+    named = {n["name"]: n["range"]["endRowIndex"] for n in spreadsheet["namedRanges"]}
+    _check(named[expense_formulas.TABLE_RANGE] == last_row,
+           f"{expense_formulas.TABLE_RANGE} ends at {named[expense_formulas.TABLE_RANGE]}, "
+           f"expected {last_row}")
+    rules = spreadsheet["conditionalFormats"][0]
+    _check(len(rules) == 3 and all(r["ranges"][0]["endRowIndex"] == last_row for r in rules),
+           f"Expenses rules after growth: {[r['ranges'][0].get('endRowIndex') for r in rules]}")
+    _check(outcome == "up to date", f"re-run after growth: {outcome}")
+    return f"{len(grown[0])} rows: ranges and rules regrown to row {last_row} in place; rerun no-op"
+
+def check_upsert_modes():
+    tables = tracker.create_test_data()
+    with _upserts() as (fake, upsert):
+        spreadsheet_id, _ = upsert(tables)
+        spreadsheet = fake.spreadsheets[spreadsheet_id]
+        published = (_rule_counts(spreadsheet), len(spreadsheet["namedRanges"]))
+
+        upsert(tables, use_budget_engine=True, precomputed_flags=True)
+        names = {n["name"] for n in spreadsheet["namedRanges"]}
+        _check(not any(_rule_counts(spreadsheet).values()),
+               f"rules left after switching to engine + flags: {_rule_counts(spreadsheet)}")
+        _check(not {n for n in names if n.startswith("Budget_")},
+               f"Budget ranges left in engine mode: {sorted(names)}")
+        _check(len(spreadsheet["charts"]) == 3, f"{len(spreadsheet['charts'])} charts, expected 3")
+
+        upsert(tables)
+        switched_back = (_rule_counts(spreadsheet), len(spreadsheet["namedRanges"]))
+    _check(len(fake.spreadsheets) == 1, "a mode switch published a new copy")
+    _check(switched_back == published,
+           f"rules / named ranges after switching back {switched_back}, published {published}")
+    return "formula -> engine + flags -> formula in place: rules and Budget ranges dropped, restored"
+
+def check_upsert_shrink():
+    tables = tracker.create_test_data()
+    budget = tables[4]
+    with _upserts() as (fake, upsert):
+        spreadsheet_id, _ = upsert(tables, use_budget_engine=True)
+        upsert(tables[:4] + (budget.iloc[:1],), use_budget_engine=True)
+    dashboard = fake.spreadsheets[spreadsheet_id]["grids"]["Dashboard"]
+    rows = [row[:5] for row in dashboard[20:20 + len(budget)]]     # Dashboard!A21:E
+
+    _check(rows[0][1] == budget["Category"].iloc[0], f"first variance row is {rows[0]}")
+    _check(all(v == "" for row in rows[1:] for v in row), f"stale variance rows left: {rows[1:]}")
+    return f"variance table {len(budget)} -> 1 rows, the rows below cleared"
+
+def check_sync_refresh():
+    tables = tracker.create_test_data()
+    expenses, budget = tables[0], tables[4]
+    # A Health expense over its Feb-2026 budget of 3000
+    added = expenses.iloc[[0]].assign(Date="2026-02-10", Month="Feb-2026", Category="Health",
+                                      Description="Clinic", Amount=4000)
+    synced = tracker.pd.concat([expenses, added], ignore_index=True)
+
+    with _upserts() as (fake, upsert):
+        spreadsheet_id, _ = upsert(tables, snapshot_kpis=True, use_budget_engine=True)
+        tracker.sync_spreadsheet(fake.service(), spreadsheet_id, synced,
+                                 snapshot_kpis=True, budget=budget)
+    dashboard = fake.spreadsheets[spreadsheet_id]["grids"]["Dashboard"]
+    variance = {(row[0], row[1]): row[4] for row in dashboard[20:20 + len(budget)]}
+
+    _check(dashboard[1][0] == synced["Amount"].sum(),
+           f"Total Expense card {dashboard[1][0]}, ledger total {synced['Amount'].sum()}")
+    _check(dashboard[1][3].endswith(f"({len(synced)} rows)"),
+           f"snapshot version not refreshed: {dashboard[1][3]}")
+    _check(variance.get(("Feb-2026", "Health")) == -1000,
+           f"Feb-2026 Health variance {variance.get(('Feb-2026', 'Health'))}, expected -1000")
+    return "snapshot KPIs and the engine variance table rewritten for the synced rows"
+
+# ----- rollup cube -----
+def check_rollup_cube():
+    expenses = synthetic_ledger.generate(3000, 0)[0]
+    typed = expense_schema.to_typed(expenses)
+    paise = typed[expense_schema.AMOUNT_PAISE]
+    category = typed["Category"].astype(object).fillna("").astype(str).str.strip()
+    month = expense_schema.month_of(typed)
+    expected = paise.groupby([month, category]).sum()
+
+    # Newest half first, queried so its prefix sums exist, then the older
+    # half, which arrives out of date order
+    order = typed["Date"].sort_values(kind="stable").index
+    half = len(order) // 2
+    cube = rollup_cube.RollupCube.from_expenses(expenses.loc[order[half:]])
+    for (m, c) in expected.index:
+        cube.total(*rollup_cube.month_bounds(m), "Category", c)
+    cube.add_expenses(expenses.loc[order[:half]])
+
+    wrong = [(m, c) for (m, c), total in expected.items()
+             if cube.total(*rollup_cube.month_bounds(m), "Category", c) != total]
+    _check(not wrong, f"month / category totals differ from pandas for {wrong[:3]}")
+    _check(cube.total() == paise[typed["Date"].notna()].sum(), "ledger total differs from pandas")
+
+    # Budget actuals at Dashboard!J20 are the latest month's totals
+    plan = tracker.RequestPlan(None, "check")
+    tracker.add_budget_actual_helper(plan, cube)
+    (range_name, values), = plan.values.items()
+    latest = month[typed["Date"].idxmax()]
+    actual = {c: rollup_cube.rupees(p) for (m, c), p in expected.items() if m == latest and p > 0}
+    written = {row[0]: row[1] for row in values[1:] if row[0]}
+    _check(written == actual, f"{range_name} actuals {written}, pandas {actual}")
+    return (f"{len(expected)} month / category totals match pandas after an out-of-order "
+            f"batch; {latest} actuals match")
+
+# ----- budget engine -----
+def check_budget_engine():
+    frame = tracker.pd.DataFrame
+    tables = synthetic_ledger.generate(3000, 1)
+    expenses, budget = tables[0], tables[4]
+    month = expenses["Month"].iloc[0]
+    # Spend in a category with a blank budget cell, and a blank budget with no spend
+    gift = _expense(expenses["Date"].iloc[0], "Gift", 1234.5)
+    gift.update({"Month": month, "Category": "Gifts"})
+    expenses = tracker.pd.concat([expenses, frame([gift])], ignore_index=True)
+    budget = tracker.pd.concat([budget, frame([
+        {"Month": month, "Category": "Gifts", "Budget Amount": ""},
+        {"Month": month, "Category": "Travel", "Budget Amount": None},
+    ])], ignore_index=True)
+
+    typed = expense_schema.to_typed(expenses)
+    spent = typed[expense_schema.AMOUNT_PAISE].groupby(
+        [expense_schema.month_of(typed), typed["Category"].astype(object)]).sum()
+    planned = expense_schema.to_paise(budget["Budget Amount"])
+    planned = planned[planned.notna()].groupby(
+        [budget["Month"][planned.notna()], budget["Category"][planned.notna()]]).sum()
+
+    table = budget_engine.BudgetEngine.from_expenses(expenses).variance_table(budget)
+    keys = list(zip(table["Month"], table["Category"]))
+    _check(sorted(keys) == sorted(set(spent.index) | set(planned.index)),
+           "variance rows are not the budgeted and spent (Month, Category) pairs")
+    wrong = [key for key, row in zip(keys, table.itertuples(index=False))
+             if (round(row.Budget * 100), round(row.Actual * 100), round(row.Variance * 100))
+             != (planned.get(key, 0), spent.get(key, 0), planned.get(key, 0) - spent.get(key, 0))]
+    _check(not wrong, f"budget / actual / variance differ from pandas for {wrong[:3]}")
+    gifts = table[table["Category"] == "Gifts"].iloc[0]
+    _check((gifts["Budget"], gifts["Actual"], gifts["Variance"]) == (0, 1234.5, -1234.5),
+           f"blank Gifts budget with spend: {gifts.tolist()}")
+    _check(not (table["Category"] == "Travel").any(), "blank budget without spend listed")
+    months = tracker.pd.to_datetime(table["Month"], format=expense_schema.MONTH_FORMAT)
+    _check(months.is_monotonic_increasing, "variance table not in month order")
+    return f"{len(table)} variance rows match pandas; blank budget = no budget"
+
+# ----- statement import -----
+@contextlib.contextmanager
+def _seeded_store():
+    """A ledger seeded with the test data, in a temporary directory."""
+    with tempfile.TemporaryDirectory() as tmp:
+        with ledger_store.LedgerStore(os.path.join(tmp, "ledger.db")) as store:
+            store.import_tables(*tracker.create_test_data())
+            yield store, tmp
+
+def _write_statement(tmp, name, lines):
+    path = os.path.join(tmp, name)
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+def check_import_statement():
+    with _seeded_store() as (store, tmp):
+        sbi = _write_statement(tmp, "sbi.csv", [
+            "Txn Date,Description,Debit,Credit",
+            "13/01/2026,UPI/Swiggy/123456789,450.00,",
+            "14/01/2026,NEFT salary,,50000",
+            "15/01/2026,ATM WDL,\"2,000.00\",",
+        ])
+        counts = statement_importer.import_statement(store, sbi, "SBI", "Chandru")
+        _check(counts == (2, 0, 0),
+               f"SBI statement: imported / skipped / rejected {counts}, expected 2 / 0 / 0")
+        payment = store.load_reference("Payment_Modes")
+        added = payment[payment["Account"] == "SBI"]["Payment Mode"].tolist()
+        _check(added == ["Bank Transfer"], f"SBI added to Payment_Modes as {added}")
+
+        counts = statement_importer.import_statement(store, sbi, "SBI", "Chandru")
+        _check(counts == (0, 2, 0), f"re-import: {counts}, expected 0 / 2 / 0")
+
+        expenses, categories, family, payment, _ = store.load_tables()
+        imported = expenses[expenses["Account"] == "SBI"]
+        _check(imported["Date"].tolist() == ["2026-01-13", "2026-01-15"],
+               f"dates {imported['Date'].tolist()}, expected day-first 13 / 15 Jan")
+        reference = expense_validation.ReferenceIndex(categories, family, payment)
+        _, rejects = expense_validation.validate_expenses(
+            expenses, reference, required=expense_validation.LEDGER_REQUIRED_COLUMNS)
+        _check(rejects.empty, f"publish rejects imported rows: {rejects['Reason'].tolist()}")
+    return "2 SBI debits imported, SBI added to Payment_Modes, re-import skipped, publish accepts them"
+
+def _expense(date, description, amount, account="SBI"):
+    row = dict.fromkeys(tracker.expense_schema.EXPENSE_COLUMNS, "")
+    row.update({"Date": date, "Description": description, "Amount": amount,
+                "Account": account, "Paid By": "Chandru"})
+    return row
+
+def check_dedup_fuzzy():
+    frame = tracker.pd.DataFrame
+    with _seeded_store() as (store, _):
+        store.append_expenses(frame([
+            _expense("2026-02-01", "SWIGGY ORDER 4471123456", 450),
+            _expense("2026-02-02", "Zomato", 450),     # same account and amount, in between
+        ]))
+        index = dedup.DedupIndex(store, fuzzy=True)
+        chunk = frame([
+            _expense("2026-02-03", "Swiggy order 4471999999", 450),    # 2 days after the first
+            _expense("2026-02-03", "Swiggy order", 450, account="PhonePe"),
+            _expense("2026-02-09", "Swiggy order", 450),               # outside the window
+            _expense("2026-02-10", "SWIGGY ORDER.", 450),              # near the row above
+        ])
+        new_rows, duplicates = index.filter(chunk)
+    _check(duplicates.index.tolist() == [0, 3],
+           f"near-duplicates {duplicates.index.tolist()}, expected rows 0 and 3")
+    return "match 2 days back past an unrelated row; other account / outside the window kept"
+
+# ----- validation / read-back -----
+def check_validation():
+    expenses, categories, family, payment, _ = tracker.create_test_data()
+    reference = expense_validation.ReferenceIndex(categories, family, payment)
+    rows = expenses.iloc[[0] * 7].reset_index(drop=True).astype(object)
+    rows.loc[1, "Date"] = "13/01/2026"         # day first, next to ISO dates
+    rows.loc[2, "Date"] = "31/31/2026"
+    rows.loc[3, "Amount"] = "5,000 rs"
+    rows.loc[4, ["Category", "Account"]] = ["Gifts", "Paytm"]
+    rows.loc[5, "Category"] = " "
+    rows.loc[6, "Amount"] = ""
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")          # no "could not infer format" fallback
+        valid, report = expense_validation.validate_expenses(rows, reference)
+    reasons = dict(zip(report["Row"], report["Reason"]))
+    expected = {3: "bad date", 4: "non-numeric amount", 5: "unknown category; unknown account",
+                6: "missing Category", 7: "missing Amount"}
+    _check(reasons == expected, f"rejections {reasons}, expected {expected}")
+    _check(valid.index.tolist() == [0, 1], f"valid rows {valid.index.tolist()}")
+    dates = expense_schema.parse_dates(valid["Date"]).dt.strftime("%Y-%m-%d").tolist()
+    _check(dates == ["2026-01-04", "2026-01-13"], f"dates parsed as {dates}")
+    return f"{len(report)} rows rejected with their reasons; 13/01/2026 next to ISO accepted"
+
+def check_sheet_reader():
+    fake = fake_google.FakeGoogle()
+    spreadsheet_id = fake._files_create({})["id"]
+    tables = synthetic_ledger.generate(250, 2)
+    expenses = tables[0]
+    serial = (tracker.pd.to_datetime(expenses["Date"])
+              - tracker.pd.Timestamp(expense_schema.SHEETS_EPOCH)).dt.days
+    grid = expenses.assign(Date=serial).astype(object).values.tolist()
+    grid[7][0] = "13/01/2026"                   # a date a user typed over the serial
+    grid[40] = [""] * len(expenses.columns)     # a row cleared in the sheet
+    fake.load_grid(spreadsheet_id, "Expenses", [list(expenses.columns)] + grid)
+    for title, table in zip(tracker.REFERENCE_SHEETS, tables[1:]):
+        fake.load_grid(spreadsheet_id, title, [list(table.columns)]
+                       + table.astype(object).values.tolist())
+
+    with fake.installed(tracker):
+        typed, reference = sheet_reader.read_back(fake.service(), spreadsheet_id, page_rows=64)
+    expected = expense_schema.to_typed(expenses.assign(
+        Date=expenses["Date"].where(expenses.index != 7, "2026-01-13")).drop(index=40))
+    expected.index = expected.index + 2          # sheet rows, after the header
+    for column in ["Date", expense_schema.AMOUNT_PAISE, "Category", "Description"]:
+        _check(typed[column].astype(object).tolist() == expected[column].astype(object).tolist(),
+               f"{column} read back differs from the ledger")
+    _check(typed.index.tolist() == expected.index.tolist(), "sheet row numbers differ")
+    shapes = {title: reference[title].shape for title in tracker.REFERENCE_SHEETS}
+    _check(shapes == {t: table.shape for t, table in zip(tracker.REFERENCE_SHEETS, tables[1:])},
+           f"reference tabs read back as {shapes}")
+    return f"{len(typed)} rows over {-(-len(grid) // 64)} pages match the ledger, by sheet row"
+
+def check_dedup_exact():
+    frame = tracker.pd.DataFrame
+    with _seeded_store() as (store, _):
+        index = dedup.DedupIndex(store)
+        chunk = frame([
+            # Ledger row 2 (Kotak Due) as a statement spells it
+            _expense("05/01/2026", "KOTAK  DUE 99812345", "4313.00", account="kotak811 "),
+            _expense("2026-02-01", "Swiggy", 450),
+            _expense("2026-02-01", "swiggy", 450),                     # repeat inside the chunk
+            _expense("2026-02-01", "Swiggy", 451),
+        ])
+        new_rows, duplicates = index.filter(chunk)
+        _check(duplicates.index.tolist() == [0, 2],
+               f"duplicates {duplicates.index.tolist()}, expected rows 0 and 2")
+        store.append_expenses(new_rows)
+        hashes = store.content_hashes()
+        _check(set(dedup.row_hashes(new_rows)) <= hashes, "appended rows lack their hash")
+        new_rows, _ = dedup.DedupIndex(store).filter(chunk)
+        _check(new_rows.empty, f"rows {new_rows.index.tolist()} new again after the append")
+    return "statement spelling of a ledger row and a repeat inside the chunk skipped"
+
+CHECKS = {
+    "backoff": check_backoff,
+    "retry_limit": check_retry_limit,
+    "non_idempotent": check_non_idempotent,
+    "token_bucket": check_token_bucket,
+    "format_card": check_format_card,
+    "format_overlap": check_format_overlap,
+    "format_cells": check_format_cells,
+    "sync_occurrences": check_sync_occurrences,
+    "sync_derived": check_sync_derived,
+    "sync_twice": check_sync_twice,
+    "sync_refresh": check_sync_refresh,
+    "upsert_growth": check_upsert_growth,
+    "upsert_modes": check_upsert_modes,
+    "upsert_shrink": check_upsert_shrink,
+    "rollup_cube": check_rollup_cube,
+    "budget_engine": check_budget_engine,
+    "validation": check_validation,
+    "sheet_reader": check_sheet_reader,
+    "dedup_exact": check_dedup_exact,
+    "dedup_fuzzy": check_dedup_fuzzy,
+    "import_statement": check_import_statement,
+}
+
+def run(names=None):
+    """Runs the checks; returns [(name, passed, detail)]."""
+    results = []
+    for name, check in CHECKS.items():
+        if names and name not in names:
+            continue
+        try:
+            results.append((name, True, check()))
+        except AssertionError as e:
+            results.append((name, False, str(e)))
+    return results
+
+def main(names=None):
+    results = run(names)
+    for name, passed, detail in results:
+        print(f"{name:<16} {'ok' if passed else 'FAIL':<5} {detail}")
+    return all(passed for _, passed, _ in results)
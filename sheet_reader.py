@@ -0,0 +1,125 @@
+"""
+Bulk read-back of a live spreadsheet into DataFrames.
+
+Family members edit the sheet directly, so the local ledger is not the
+only copy that matters. read_back() pulls the Expenses tab (and the
+reference tabs) with values().batchGet:
+- UNFORMATTED_VALUE / SERIAL_NUMBER, so amounts and dates arrive as plain
+  numbers instead of display strings that would need parsing,
+- majorDimension=COLUMNS, so every column of a page is one JSON list that
+  becomes one array directly – no per-row Python lists are built and
+  transposed,
+- Expenses split into row-range pages of PAGE_ROWS, fetched concurrently
+  on the ApiExecutor's pool (rate limited and retried like every call).
+
+Pages are fetched a window (one per executor worker) at a time and each
+page is converted into the typed schema (expense_schema.to_typed) as it
+arrives, so memory holds at most one window of raw responses plus the
+compact typed result. The frame is indexed by sheet row number.
+"""
+
+import numpy as np
+import pandas as pd
+
+import expense_schema
+import final_expense_tracker_query_based as tracker
+
+PAGE_ROWS = 20000
+LAST_COLUMN = "R"               # Expenses has 18 columns (A:R)
+REFERENCE_COLUMNS = "A:Z"
+
+
+def _batch_get(sheets, spreadsheet_id, ranges):
+    return sheets.spreadsheets().values().batchGet(
+        spreadsheetId=spreadsheet_id,
+        ranges=ranges,
+        majorDimension="COLUMNS",
+        valueRenderOption="UNFORMATTED_VALUE",
+        dateTimeRenderOption="SERIAL_NUMBER"
+    )
+
+def _column(values, length):
+    """One column as an object array; blanks the API left out become ''."""
+    array = np.full(length, "", dtype=object)
+    if values:
+        array[:len(values)] = values
+    return array
+
+def _header(value_range):
+    return [c[0] if c else "" for c in value_range.get("values", [])]
+
+def _frame(header, columns, start=0):
+    """DataFrame from COLUMNS-major values; index = sheet row numbers from `start`."""
+    length = max((len(c) for c in columns), default=0)
+    columns = list(columns) + [[]] * (len(header) - len(columns))
+    return pd.DataFrame(
+        {name: _column(values, length) for name, values in zip(header, columns) if name},
+        index=pd.RangeIndex(start, start + length, name="Row")
+    )
+
+def _typed_page(header, columns, start):
+    page = _frame(header, columns, start)
+    page = page[(page != "").any(axis=1)]       # rows cleared in the sheet
+    return expense_schema.to_typed(page.assign(Date=expense_schema.sheet_dates(page["Date"])))
+
+def _concat_typed(chunks):
+    """Concatenates typed pages; categoricals get the union of their categories."""
+    if not chunks:
+        return expense_schema.to_typed(pd.DataFrame(columns=expense_schema.EXPENSE_COLUMNS))
+    for col in expense_schema.CATEGORICAL_COLUMNS:
+        if col not in chunks[0]:
+            continue
+        categories = pd.Index([])
+        for chunk in chunks:
+            categories = categories.union(chunk[col].cat.categories)
+        for chunk in chunks:
+            chunk[col] = chunk[col].cat.set_categories(categories)
+    return pd.concat(chunks)
+
+def read_back(sheets, spreadsheet_id, page_rows=PAGE_ROWS, reference=True):
+    """
+    Returns (expenses in the typed schema, {reference tab: DataFrame}).
+    The Expenses extent comes from the cached sheet metadata (rowCount);
+    without it pages are read until one comes back short.
+    """
+    executor = tracker.get_executor()
+    properties = tracker.load_sheet_metadata(sheets, spreadsheet_id)["Expenses"]
+    row_count = properties.get("gridProperties", {}).get("rowCount")
+
+    # Header row and the (small) reference tabs in one request
+    first = [f"Expenses!A1:{LAST_COLUMN}1"]
+    if reference:
+        first += [f"{title}!{REFERENCE_COLUMNS}" for title in tracker.REFERENCE_SHEETS]
+    first = executor.submit(_batch_get(sheets, spreadsheet_id, first))
+
+    header = None
+    chunks = []
+    start = 2
+    while row_count is None or start <= row_count:
+        starts = [start + i * page_rows for i in range(executor.max_workers)]
+        if row_count is not None:
+            starts = [s for s in starts if s <= row_count]
+        futures = [
+            executor.submit(_batch_get(
+                sheets, spreadsheet_id, [f"Expenses!A{s}:{LAST_COLUMN}{s + page_rows - 1}"]
+            )) for s in starts
+        ]
+        if header is None:
+            header = _header(first.result()["valueRanges"][0])
+
+        short = False
+        for s, future in zip(starts, futures):
+            columns = future.result()["valueRanges"][0].get("values", [])
+            if max((len(c) for c in columns), default=0) < page_rows:
+                short = True
+            if columns:
+                chunks.append(_typed_page(header, columns, s))
+        if row_count is None and short:
+            break
+        start = starts[-1] + page_rows
+
+    tables = {}
+    for title, value_range in zip(tracker.REFERENCE_SHEETS, first.result()["valueRanges"][1:]):
+        columns = value_range.get("values", [])
+        tables[title] = _frame(_header(value_range), [c[1:] for c in columns]).reset_index(drop=True)
+    return _concat_typed(chunks), tables
@@ -0,0 +1,214 @@
+"""
+Streaming importer for bank / UPI statement exports (CSV or XLSX).
+
+Statements are read in fixed-size chunks (pandas chunked CSV reader, or
+openpyxl read-only rows for XLSX), each chunk is mapped onto the 18-column
+Expenses layout and appended to the local ledger before the next chunk is
+read, so memory stays bounded however large the archive is.
+"""
+
+import pandas as pd
+
+import dedup
+import expense_schema
+import expense_validation
+
+CHUNK_ROWS = 10_000
+
+# Ledger column -> header names used by the statement exports we see
+HEADER_ALIASES = {
+    "Date": ["Date", "Txn Date", "Transaction Date", "Value Date", "Tran Date"],
+    "Description": ["Description", "Narration", "Particulars", "Remarks",
+                    "Transaction Details", "Details"],
+    "Debit": ["Debit", "Withdrawal Amt.", "Withdrawal Amount", "Withdrawal Amount (INR )",
+              "Debit Amount", "Dr Amount"],
+    "Credit": ["Credit", "Deposit Amt.", "Deposit Amount", "Credit Amount", "Cr Amount"],
+    "Amount": ["Amount", "Amount (INR)", "Transaction Amount"],
+    "Type": ["Type", "Dr / Cr", "Dr/Cr", "Cr/Dr", "Transaction Type"],
+    "Reference": ["Ref No./Cheque No.", "Reference", "UTR", "Transaction ID", "Chq / Ref No."],
+}
+
+# Account -> Payment Mode, for accounts the Payment_Modes table does not
+# list yet (register_account adds them with this mode)
+ACCOUNT_PAYMENT_MODES = {
+    "Cash": "Cash",
+    "SBI": "Bank Transfer",
+    "Kotak811": "Bank Transfer",
+    "Imobile": "Bank Transfer",
+    "Navi": "UPI",
+    "PhonePe": "UPI",
+    "Paytm": "UPI",
+    "CRED": "Credit Card",
+}
+
+
+def _resolve_headers(columns):
+    """Maps statement headers to the keys of HEADER_ALIASES (case-insensitive)."""
+    normalized = {str(c).strip().lower(): c for c in columns}
+    resolved = {}
+    for key, aliases in HEADER_ALIASES.items():
+        for alias in aliases:
+            if alias.lower() in normalized:
+                resolved[key] = normalized[alias.lower()]
+                break
+    if "Date" not in resolved or not ({"Debit", "Amount"} & set(resolved)):
+        raise ValueError(f"Unrecognised statement headers: {list(columns)}")
+    return resolved
+
+def _to_number(series):
+    cleaned = series.astype(str).str.replace(r"[,₹\s]|INR", "", regex=True)
+    return pd.to_numeric(cleaned, errors="coerce")
+
+def payment_mode_for(account, payment=None):
+    """
+    Payment Mode of an account as the Payment_Modes table pairs them (so it
+    passes validation and the sheet's dropdown), else ACCOUNT_PAYMENT_MODES.
+    """
+    if payment is not None and not payment.empty:
+        accounts = payment["Account"].astype(str).str.strip()
+        modes = payment.loc[accounts == account.strip(), "Payment Mode"].dropna()
+        if not modes.empty:
+            return str(modes.iloc[0]).strip()
+    return ACCOUNT_PAYMENT_MODES.get(account, "")
+
+def register_account(store, account):
+    """
+    Adds the statement's account to Payment_Modes when the table does not
+    list it, so its rows pass the Account check here and at publish and
+    fit the sheet's dropdown. Returns the Payment Mode it was added with,
+    or None if the account was already known.
+    """
+    payment = store.load_reference("Payment_Modes")
+    if (payment["Account"].astype(str).str.strip() == account.strip()).any():
+        return None
+    mode = payment_mode_for(account)
+    store.add_reference_rows("Payment_Modes", pd.DataFrame({"Payment Mode": [mode],
+                                                            "Account": [account.strip()]}))
+    return mode
+
+def map_statement_chunk(chunk, headers, account, paid_by="", payment_mode=None):
+    """
+    Maps one statement chunk to the Expenses layout. Only debits are kept;
+    credits (refunds, salary, transfers in) are not expenses.
+    """
+    if "Debit" in headers:
+        amount = _to_number(chunk[headers["Debit"]])
+    else:
+        amount = _to_number(chunk[headers["Amount"]])
+        if "Type" in headers:
+            is_credit = chunk[headers["Type"]].astype(str).str.strip().str.upper().str.startswith("CR")
+            amount = amount.mask(is_credit)
+        elif headers.get("signed"):
+            # signed amounts: negative means money out
+            amount = -amount.where(amount < 0)
+
+    keep = amount.notna() & (amount > 0)
+    chunk, amount = chunk[keep], amount[keep]
+
+    dates = expense_schema.parse_dates(chunk[headers["Date"]])
+    description = (
+        chunk[headers["Description"]].astype(str).str.strip()
+        if "Description" in headers else ""
+    )
+    notes = chunk[headers["Reference"]].astype(str) if "Reference" in headers else ""
+
+    mapped = pd.DataFrame({
+        "Date": dates.dt.strftime("%Y-%m-%d"),
+        "Month": dates.dt.strftime(expense_schema.MONTH_FORMAT),
+        "Year": dates.dt.year.astype("Int64"),
+        "Category": "",
+        "Sub-Category": "",
+        "Description": description,
+        "Amount": amount,
+        "Payment Mode": payment_mode if payment_mode is not None else payment_mode_for(account),
+        "Account": account,
+        "Paid By": paid_by,
+        "For Whom": "",
+        "Expense Type": "",
+        "Frequency": "One-time",
+        "Vendor": "",
+        "Bill?": "No",
+        "Reimbursable": "No",
+        "Tags": "",
+        "Notes": notes,
+    }, index=chunk.index)
+    return mapped[expense_schema.EXPENSE_COLUMNS]
+
+def _iter_xlsx_chunks(path, chunk_rows, sheet_name=None):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        batch, start = [], 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) == chunk_rows:
+                # row numbers continue across chunks, like read_csv(chunksize=...)
+                yield pd.DataFrame(batch, columns=header,
+                                   index=pd.RangeIndex(start, start + len(batch)))
+                start += len(batch)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header,
+                               index=pd.RangeIndex(start, start + len(batch)))
+    finally:
+        workbook.close()
+
+def iter_statement_chunks(path, account, paid_by="", chunk_rows=CHUNK_ROWS, sheet_name=None,
+                          payment_mode=None):
+    """Yields the statement as Expenses-layout DataFrames of at most chunk_rows rows."""
+    if str(path).lower().endswith((".xlsx", ".xlsm")):
+        raw_chunks = _iter_xlsx_chunks(path, chunk_rows, sheet_name)
+    else:
+        raw_chunks = pd.read_csv(path, dtype=str, chunksize=chunk_rows, skipinitialspace=True)
+
+    headers = None
+    for raw in raw_chunks:
+        if headers is None:
+            headers = _resolve_headers(raw.columns)
+            if "Debit" not in headers and "Type" not in headers:
+                # decided once per file so every chunk is read the same way
+                headers["signed"] = bool((_to_number(raw[headers["Amount"]]) < 0).any())
+        mapped = map_statement_chunk(raw, headers, account, paid_by, payment_mode)
+        if not mapped.empty:
+            yield mapped
+
+def import_statement(store, path, account, paid_by="", chunk_rows=CHUNK_ROWS, sheet_name=None,
+                     fuzzy=False, rejects=None):
+    """
+    Streams a statement file into the ledger store, skipping rows already in
+    the ledger (see dedup) and rows that fail validation (unparseable date
+    or amount, unknown Paid By). An account Payment_Modes does not list yet
+    is added first (see register_account). Category is left blank, to be
+    filled in on the sheet, so it is not required here (nor at publish).
+    Rejection reports of every chunk are appended to the `rejects` list
+    when one is given.
+    Returns (rows imported, duplicates skipped, rows rejected).
+    """
+    index = dedup.DedupIndex(store, fuzzy=fuzzy)
+    register_account(store, account)
+    payment = store.load_reference("Payment_Modes")
+    reference = expense_validation.ReferenceIndex(
+        store.load_reference("Categories"),
+        store.load_reference("Family"),
+        payment,
+    )
+    imported = skipped = rejected = 0
+    for chunk in iter_statement_chunks(path, account, paid_by, chunk_rows, sheet_name,
+                                       payment_mode_for(account, payment)):
+        chunk, report = expense_validation.validate_expenses(
+            chunk, reference, required=expense_validation.LEDGER_REQUIRED_COLUMNS
+        )
+        if not report.empty:
+            rejected += len(report)
+            if rejects is not None:
+                rejects.append(report)
+        new_rows, duplicates = index.filter(chunk)
+        imported += store.append_expenses(new_rows)
+        skipped += len(duplicates)
+    return imported, skipped, rejected
@@ -0,0 +1,109 @@
+"""
+Seeded synthetic ledgers for benchmarks.
+
+generate(rows, seed) returns the same 5 tables as create_test_data()
+(Expenses in the 18-column sheet layout, Categories, Family,
+Payment_Modes, Monthly_Budget), from 1k up to 1M rows. Columns are built
+with numpy in one pass, so even 1M rows take a few seconds. The same seed
+always gives the same ledger.
+"""
+
+import numpy as np
+import pandas as pd
+
+import expense_schema
+
+# Category -> (sub-categories, vendors, median amount in rupees, weight)
+CATEGORY_PROFILES = {
+    "Food": (["Groceries", "Dining", "Snacks"], ["BigBasket", "Swiggy", "Zomato", "Local Kirana"], 450, 0.30),
+    "Transport": (["Fuel", "Auto", "Train"], ["Indian Oil", "Ola", "IRCTC"], 300, 0.18),
+    "Health": (["Medicines", "Doctor"], ["Apollo Pharmacy", "MedPlus", "Clinic"], 600, 0.08),
+    "Utilities": (["Electricity", "Mobile", "Internet"], ["TNEB", "Jio", "Airtel"], 900, 0.10),
+    "Shopping": (["Clothes", "Home"], ["Amazon", "Flipkart", "Reliance Trends"], 1200, 0.12),
+    "Education": (["Fees", "Books"], ["School", "Coaching Centre"], 2500, 0.04),
+    "Loans": (["EMI", "Repayments"], ["Kotak Due", "Apty Kalanchiam", "Veni Anni Sangam"], 5000, 0.08),
+    "Entertainment": (["Movies", "Subscriptions"], ["PVR", "Netflix", "Hotstar"], 350, 0.10),
+}
+
+FAMILY = [("Chandru", "Self"), ("Karthi", "Brother"), ("Appa", "Father"),
+          ("Amma", "Mother"), ("Pothu", "Anni"), ("Deiva", "Mother")]
+
+PAYMENT_MODES = [("Cash", "Cash"), ("UPI", "GPay"), ("UPI", "PhonePe"),
+                 ("Card", "Credit Card"), ("Bank Transfer", "Kotak811"), ("Bank Transfer", "SBI")]
+
+FOR_WHOM = ["Family", "Self", "Mother", "Father", "Anna", "Kids"]
+EXPENSE_TYPES = ["Need", "Want", "Loan"]
+FREQUENCIES = ["One-time", "Monthly", "Weekly"]
+TAGS = ["Family", "Personal", "Festival", "Travel"]
+
+
+def _pick(rng, choices, rows, p=None):
+    return np.asarray(choices, dtype=object)[rng.choice(len(choices), size=rows, p=p)]
+
+def generate(rows=1000, seed=0, start="2025-01-01", months=12):
+    rng = np.random.default_rng(seed)
+
+    names = list(CATEGORY_PROFILES)
+    weights = np.array([CATEGORY_PROFILES[c][3] for c in names])
+    cat_idx = rng.choice(len(names), size=rows, p=weights / weights.sum())
+    category = np.asarray(names, dtype=object)[cat_idx]
+
+    # Sub-category / vendor from each category's own list
+    sub_category = np.empty(rows, dtype=object)
+    vendor = np.empty(rows, dtype=object)
+    median = np.empty(rows)
+    for i, name in enumerate(names):
+        subs, vendors, med, _ = CATEGORY_PROFILES[name]
+        mask = cat_idx == i
+        n = int(mask.sum())
+        sub_category[mask] = _pick(rng, subs, n)
+        vendor[mask] = _pick(rng, vendors, n)
+        median[mask] = med
+
+    # Log-normal amounts around each category's median, whole rupees
+    amount = np.maximum(1, np.round(median * rng.lognormal(0.0, 0.6, rows))).astype(np.int64)
+
+    first = pd.Timestamp(start)
+    days = (first + pd.DateOffset(months=months) - first).days
+    dates = pd.to_datetime(np.sort(rng.integers(0, days, rows)), unit="D", origin=first)
+
+    mode_idx = rng.choice(len(PAYMENT_MODES), size=rows)
+    members = [m for m, _ in FAMILY]
+    refs = rng.integers(100000, 999999, rows).astype(str)
+
+    expenses = pd.DataFrame({
+        "Date": dates.strftime("%Y-%m-%d"),
+        "Month": dates.strftime(expense_schema.MONTH_FORMAT),
+        "Year": dates.year,
+        "Category": category,
+        "Sub-Category": sub_category,
+        "Description": vendor + " " + sub_category + " #" + refs.astype(object),
+        "Amount": amount,
+        "Payment Mode": np.asarray([m for m, _ in PAYMENT_MODES], dtype=object)[mode_idx],
+        "Account": np.asarray([a for _, a in PAYMENT_MODES], dtype=object)[mode_idx],
+        "Paid By": _pick(rng, members, rows, p=[0.4, 0.2, 0.1, 0.1, 0.1, 0.1]),
+        "For Whom": _pick(rng, FOR_WHOM, rows),
+        "Expense Type": _pick(rng, EXPENSE_TYPES, rows, p=[0.6, 0.3, 0.1]),
+        "Frequency": _pick(rng, FREQUENCIES, rows, p=[0.7, 0.2, 0.1]),
+        "Vendor": vendor,
+        "Bill?": _pick(rng, ["Yes", "No"], rows),
+        "Reimbursable": _pick(rng, ["Yes", "No"], rows, p=[0.1, 0.9]),
+        "Tags": _pick(rng, TAGS, rows),
+        "Notes": _pick(rng, ["", "PAID", "Pending", "Split"], rows, p=[0.7, 0.1, 0.1, 0.1]),
+    }, columns=expense_schema.EXPENSE_COLUMNS)
+
+    categories = pd.DataFrame(
+        [(c, s) for c, (subs, _, _, _) in CATEGORY_PROFILES.items() for s in subs],
+        columns=["Category", "Sub-Category"]
+    )
+    family = pd.DataFrame(FAMILY, columns=["Member Name", "Role"])
+    payment = pd.DataFrame(PAYMENT_MODES, columns=["Payment Mode", "Account"])
+
+    # Budget per (month, category): typical monthly spend, rounded to 500,
+    # so roughly a third of the cells come out as overruns
+    spend = expenses.groupby(["Month", "Category"], sort=False)["Amount"].sum()
+    budget = (
+        (spend * rng.uniform(0.8, 1.3, len(spend)) / 500).round().clip(lower=1) * 500
+    ).astype(np.int64).rename("Budget Amount").reset_index()
+
+    return expenses, categories, family, payment, budget
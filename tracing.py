@@ -0,0 +1,156 @@
+"""
+Opt-in tracing for the provisioning pipeline.
+
+A Tracer records
+- phases: each step of main() with wall time (and, when asked, the peak
+  memory allocated by Python code during the step, via tracemalloc),
+- calls: every API request sent through ApiExecutor.execute with its
+  phase, method, latency, request / response size, retries and outcome.
+
+summary() renders a table for the terminal, to_json() the same data for
+tracking runs over time. With profile=True the local (pandas) phases run
+under one cProfile.Profile; the stats can be dumped with dump_profile().
+
+Nothing is recorded unless a tracer is passed to main().
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+
+def _size(obj):
+    if obj is None:
+        return 0
+    if isinstance(obj, (bytes, bytearray)):
+        return len(obj)
+    if isinstance(obj, str):
+        return len(obj.encode("utf-8"))
+    return len(json.dumps(obj, default=str, separators=(",", ":")).encode("utf-8"))
+
+def request_method(request):
+    """googleapiclient methodId (sheets.spreadsheets.get), or the fake's name."""
+    return getattr(request, "methodId", None) or getattr(request, "method", None) or "request"
+
+def request_size(request):
+    body = getattr(request, "body", None)
+    if body is None and hasattr(request, "kwargs"):     # fake_google request
+        body = {k: v for k, v in request.kwargs.items() if k != "media_body"}
+    return _size(body)
+
+
+class Tracer:
+
+    def __init__(self, profile=False, memory=False):
+        self.profile = cProfile.Profile() if profile else None
+        self.memory = memory
+        self.phases = []
+        self.calls = []
+        self._phase = None
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name, local=False):
+        """Times one pipeline step; `local` steps are profiled when enabled."""
+        outer, self._phase = self._phase, name
+        record = {"phase": name, "ms": 0.0}
+        profiling = local and self.profile is not None
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        if profiling:
+            self.profile.enable()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["ms"] = (time.perf_counter() - start) * 1000
+            if profiling:
+                self.profile.disable()
+            if self.memory:
+                record["peak_kib"] = (tracemalloc.get_traced_memory()[1] - base) / 1024
+            self._phase = outer
+            with self._lock:
+                self.phases.append(record)
+
+    def record_call(self, request, ms, response=None, retries=0, error=None,
+                    request_bytes=None):
+        """request_bytes overrides the body size (e.g. one media upload chunk)."""
+        if request_bytes is None:
+            request_bytes = request_size(request)
+        with self._lock:
+            self.calls.append({
+                "phase": self._phase,
+                "method": request_method(request),
+                "ms": ms,
+                "request_bytes": request_bytes,
+                "response_bytes": _size(response),
+                "retries": retries,
+                "ok": error is None,
+            })
+
+    def close(self):
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    # ----- reports -----
+    def to_json(self, path=None):
+        data = {"phases": self.phases, "calls": self.calls}
+        if path:
+            with open(path, "w") as f:
+                json.dump(data, f, indent=2)
+        return data
+
+    def summary(self, top=15):
+        calls = defaultdict(lambda: [0, 0.0, 0, 0, 0])     # count, ms, sent, received, retries
+        by_method = defaultdict(lambda: [0, 0.0, 0, 0, 0])
+        for call in self.calls:
+            for key, table in ((call["phase"], calls), (call["method"], by_method)):
+                row = table[key]
+                row[0] += 1
+                row[1] += call["ms"]
+                row[2] += call["request_bytes"]
+                row[3] += call["response_bytes"]
+                row[4] += call["retries"]
+
+        lines = [f"{'phase':<22} {'ms':>10} {'calls':>6} {'api ms':>10} {'sent KiB':>10} "
+                 f"{'recv KiB':>10} {'retries':>7}" + ("  peak KiB" if self.memory else "")]
+        for record in self.phases:
+            count, ms, sent, received, retries = calls.get(record["phase"], [0, 0.0, 0, 0, 0])
+            line = (f"{record['phase']:<22} {record['ms']:>10,.1f} {count:>6} {ms:>10,.1f} "
+                    f"{sent / 1024:>10,.1f} {received / 1024:>10,.1f} {retries:>7}")
+            if self.memory:
+                line += f"  {record.get('peak_kib', 0):>8,.0f}"
+            lines.append(line)
+
+        lines.append("")
+        lines.append(f"{'method':<44} {'calls':>6} {'ms':>10} {'sent KiB':>10} {'retries':>7}")
+        for method, (count, ms, sent, _, retries) in sorted(by_method.items(),
+                                                            key=lambda i: -i[1][1]):
+            lines.append(f"{method:<44} {count:>6} {ms:>10,.1f} {sent / 1024:>10,.1f} {retries:>7}")
+
+        if self.profile is not None:
+            out = io.StringIO()
+            pstats.Stats(self.profile, stream=out).sort_stats("cumulative").print_stats(top)
+            lines.append("")
+            lines.append(out.getvalue().rstrip())
+        return "\n".join(lines)
+
+    def dump_profile(self, path):
+        if self.profile is not None:
+            self.profile.dump_stats(path)
+
+
+def phase(tracer, name, local=False):
+    """tracer.phase(), or a no-op when tracing is off."""
+    if tracer is None:
+        return contextlib.nullcontext()
+    return tracer.phase(name, local)